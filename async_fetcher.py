@@ -0,0 +1,258 @@
+# -*- encoding: UTF-8 -*-
+
+import asyncio
+import concurrent.futures
+import inspect
+import logging
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+# 异步行情下载：
+#   - 并发数由AIMD控制器根据请求耗时和失败率动态调整（成功则缓慢增加，超时/失败则减半）
+#   - 每个请求有超时时间，失败后按带随机抖动的指数退避重试
+#   - 全部完成后对失败的股票再降低并发重试一轮
+#   - 普通函数在线程池中执行，超时后线程无法中止：同一只股票上一次的请求还在执行时，
+#     重试等待这次请求的结果，不会再发起一次同时写本地库的下载
+# transport 为 (代码, 名称) -> DataFrame 的函数，可以是普通函数或协程函数，
+# 默认使用 data_fetcher.fetch，压测时可以换成 stub_transport
+
+
+class AIMDController:
+    def __init__(
+        self,
+        initial=8,
+        minimum=1,
+        maximum=32,
+        target_latency=3.0,
+        decrease=0.5,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self._last_decrease = 0.0
+
+    def record(self, latency, ok):
+        """记录一次请求结果：成功且不慢时加性增加，失败或变慢时乘性减小"""
+        now = time.monotonic()
+        if ok and latency <= self.target_latency:
+            # 每完成约limit个请求并发数加1
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        elif now - self._last_decrease >= self.target_latency:
+            # 同一批并发请求的失败只减一次
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            self._last_decrease = now
+
+    @property
+    def concurrency(self):
+        return max(self.minimum, int(self.limit))
+
+
+class Fetcher:
+    def __init__(
+        self,
+        transport,
+        timeout=15.0,
+        retries=3,
+        backoff=0.5,
+        max_backoff=10.0,
+        controller=None,
+    ):
+        self.transport = transport
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.controller = controller or AIMDController()
+        self.latencies = []
+        self.errors = 0
+        self._in_flight = 0
+        self._condition = None
+        self._executor = None
+        # 线程池中的请求 (代码, 名称) -> concurrent.futures.Future
+        self._running = {}
+        # 最后一轮重试后仍失败的股票 (代码, 名称) -> 异常
+        self.failed = {}
+
+    async def _call(self, code_name):
+        if inspect.iscoroutinefunction(self.transport):
+            return await self.transport(code_name)
+        future = self._running.get(code_name)
+        if future is None or future.done():
+            future = self._executor.submit(self.transport, code_name)
+            self._running[code_name] = future
+        try:
+            # 超时取消时只取消还没有开始执行的请求，正在执行的请求留给重试继续等待
+            return await asyncio.wrap_future(future)
+        finally:
+            if future.done():
+                self._running.pop(code_name, None)
+
+    async def _acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self._in_flight < self.controller.concurrency
+            )
+            self._in_flight += 1
+
+    async def _release(self):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    async def fetch(self, code_name, retries=None):
+        """下载一只股票，超时或异常时退避重试，全部失败时抛出最后一次的异常"""
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            await self._acquire()
+            start = time.monotonic()
+            try:
+                data = await asyncio.wait_for(self._call(code_name), self.timeout)
+            except Exception as exc:
+                latency = time.monotonic() - start
+                self.controller.record(latency, False)
+                self.errors += 1
+                error = exc
+            else:
+                latency = time.monotonic() - start
+                self.controller.record(latency, True)
+                self.latencies.append(latency)
+                return data
+            finally:
+                await self._release()
+
+            if attempt < retries:
+                delay = min(self.max_backoff, self.backoff * 2**attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+        raise error
+
+    async def run(self, stocks):
+        self._condition = asyncio.Condition()
+        # 超时的请求仍会占用线程，线程数留出余量
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.controller.maximum * 2
+        )
+        try:
+            stocks_data, failed = await self._run_pass(stocks)
+            if failed:
+                logging.info("重试下载失败的 {} 只股票".format(len(failed)))
+                self.controller.limit = self.controller.minimum
+                retried, failed = await self._run_pass(list(failed))
+                stocks_data.update(retried)
+        finally:
+            hung = [
+                stock for stock, future in self._running.items() if not future.done()
+            ]
+            if hung:
+                logging.warning(
+                    "{} 只股票的下载线程超时后仍未结束: {}".format(len(hung), hung[:10])
+                )
+            self._running.clear()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+        # 按输入顺序返回，结果与下载完成的先后无关
+        stocks_data = {
+            stock: stocks_data[stock] for stock in stocks if stock in stocks_data
+        }
+
+        self.failed = failed
+        for stock, exc in failed.items():
+            logging.error(
+                "%s(%r) generated an exception: %s" % (stock[1], stock[0], exc)
+            )
+        return stocks_data
+
+    async def _run_pass(self, stocks):
+        """最多maximum个协程从队列取股票下载，实际并发数由控制器限制"""
+        queue = asyncio.Queue()
+        for stock in stocks:
+            queue.put_nowait(stock)
+        stocks_data = {}
+        failed = {}
+        progress = {"completed": 0, "total": len(stocks)}
+
+        async def worker():
+            while not queue.empty():
+                stock = queue.get_nowait()
+                try:
+                    data = await self.fetch(stock)
+                except Exception as exc:
+                    failed[stock] = exc
+                else:
+                    if data is not None:
+                        stocks_data[stock] = data
+
+                progress["completed"] += 1
+                if progress["completed"] % 50 == 0:
+                    logging.info(
+                        "数据获取进度: {}/{} 并发数: {}".format(
+                            progress["completed"],
+                            progress["total"],
+                            self.controller.concurrency,
+                        )
+                    )
+
+        await asyncio.gather(*(worker() for _ in range(self.controller.maximum)))
+        return stocks_data, failed
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        return float(np.percentile(self.latencies, q))
+
+
+def run(stocks, transport, config=None, failed=None):
+    """
+    按配置创建Fetcher并下载全部股票，返回 {(代码, 名称): DataFrame}；
+    failed 为列表时追加下载失败（不含没有数据）的股票
+    """
+    config = config or {}
+    controller = AIMDController(
+        initial=config.get("concurrency", 8),
+        minimum=config.get("min_concurrency", 2),
+        maximum=config.get("max_concurrency", 32),
+        target_latency=config.get("target_latency", 3.0),
+    )
+    fetcher = Fetcher(
+        transport,
+        timeout=config.get("timeout", 15.0),
+        retries=config.get("retries", 3),
+        controller=controller,
+    )
+    stocks_data = asyncio.run(fetcher.run(stocks))
+    if failed is not None:
+        failed.extend(stock for stock in stocks if stock in fetcher.failed)
+    logging.info(
+        "请求耗时 p50={:.2f}s p95={:.2f}s p99={:.2f}s，失败 {} 次".format(
+            fetcher.percentile(50),
+            fetcher.percentile(95),
+            fetcher.percentile(99),
+            fetcher.errors,
+        )
+    )
+    return stocks_data
+
+
+def stub_transport(latency=0.05, error_rate=0.0, hang_rate=0.0, seed=None):
+    """离线压测用的模拟接口：随机延迟、随机失败、随机挂起不返回"""
+    rng = random.Random(seed)
+
+    async def transport(code_name):
+        if rng.random() < hang_rate:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(rng.expovariate(1.0 / latency))
+        if rng.random() < error_rate:
+            raise ConnectionError("模拟接口错误")
+        return pd.DataFrame(
+            {
+                "日期": pd.bdate_range(end="2025-12-31", periods=5).date,
+                "收盘": [10.0] * 5,
+                "成交量": [1000] * 5,
+            }
+        )
+
+    return transport
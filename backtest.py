@@ -0,0 +1,190 @@
+# -*- encoding: UTF-8 -*-
+
+import importlib
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+import panel
+import settings
+import store
+import trade_calendar
+import utils
+import work_flow
+from strategy import registry
+
+# 区间回测：在一个行情面板上逐个交易日计算策略信号，统计信号之后的收益、胜率和回撤
+# 使用示例：python backtest.py wyckoff_divergence.check 2023-01-01 2025-12-31
+#          python backtest.py 威克夫-缩量不跌 2023-01-01 2025-12-31
+
+HORIZONS = (1, 5, 20)
+
+
+def signals(market, strategy_func, start, end, liquid_only=True):
+    """
+    计算[start, end]内每个交易日的策略信号，返回 (日期轴位置数组, 股票 × 交易日 布尔数组)
+    有面板实现的策略每天一组向量运算；有信号序列的策略每只股票计算一次全部交易日；
+    其余策略逐只股票调用check
+    """
+    first = int(np.searchsorted(market.dates, _day(start), side="left"))
+    last = market.date_index(end)
+    days = np.arange(first, last + 1)
+    # 只在交易日历中的交易日计算，个别股票在休市日的异常K线不会产生信号
+    trading = trade_calendar.trading_days_between(start, end)
+    days = days[np.isin(market.dates[days], trading)]
+
+    panel_func = registry.panel_func(strategy_func)
+    series_func = registry.signal_series(strategy_func)
+    frames = None
+    by_day = None
+    if panel_func is None:
+        frames = {stock: market.frame(stock[0]) for stock in market.stocks}
+        if series_func is not None:
+            by_day = _series_by_day(market, frames, series_func)
+
+    result = np.zeros((len(market), len(days)), dtype=bool)
+    for j, end_index in enumerate(days):
+        end_date = market.dates[end_index].astype(object)
+        if panel_func is not None:
+            selected = panel_func(market, end_date=end_date)
+        elif by_day is not None:
+            selected = by_day[:, end_index].copy()
+        else:
+            m_filter = work_flow.check_enter(
+                end_date=end_date, strategy_fun=strategy_func
+            )
+            selected = np.array(
+                [bool(m_filter((stock, frames[stock]))) for stock in market.stocks]
+            )
+        # 只有当天有K线的股票才能产生信号
+        selected &= ~np.isnan(market.field("收盘")[:, end_index])
+        if liquid_only:
+            selected &= work_flow.is_liquid_enough_panel(market, end_index)
+        result[:, j] = selected
+    return days, result
+
+
+def _series_by_day(market, frames, series_func):
+    """把每只股票的信号序列按日期对齐到面板的交易日轴，停牌日为False"""
+    result = np.zeros((len(market), len(market.dates)), dtype=bool)
+    for i, stock in enumerate(market.stocks):
+        frame = frames[stock]
+        dates = utils.to_datetime64(frame["日期"])
+        result[i, np.searchsorted(market.dates, dates)] = series_func(stock, frame)
+    return result
+
+
+def trades(market, days, selected, horizons=HORIZONS):
+    """每个信号之后 1/5/20 根K线的收益，以及持有期内相对信号日收盘价的最大回撤"""
+    records = []
+    window = max(horizons)
+    for j, end_index in enumerate(days):
+        rows = np.flatnonzero(selected[:, j])
+        if len(rows) == 0:
+            continue
+        close = market.field("收盘")[rows, end_index].astype(np.float64)
+        future_close = market.ahead("收盘", window, end_index)[rows]
+        future_low = market.ahead("最低", window, end_index)[rows]
+        record = pd.DataFrame(
+            {
+                "日期": market.dates[end_index].astype(object),
+                "代码": [market.stocks[i][0] for i in rows],
+                "名称": [market.stocks[i][1] for i in rows],
+                "收盘": close,
+            }
+        )
+        for horizon in horizons:
+            record["ret_{}".format(horizon)] = future_close[:, horizon - 1] / close - 1
+        with np.errstate(invalid="ignore"):
+            lowest = np.fmin.reduce(future_low, axis=1)
+        record["max_drawdown"] = np.minimum(lowest / close - 1, 0)
+        records.append(record)
+    if not records:
+        return pd.DataFrame(
+            columns=["日期", "代码", "名称", "收盘"]
+            + ["ret_{}".format(h) for h in horizons]
+            + ["max_drawdown"]
+        )
+    return pd.concat(records, ignore_index=True)
+
+
+def summarize(result, days_count, horizons=HORIZONS):
+    """汇总信号数、各持有期平均收益和胜率、回撤统计"""
+    stats = {"交易日数": days_count, "信号数": len(result)}
+    for horizon in horizons:
+        returns = result["ret_{}".format(horizon)].dropna()
+        stats["{}日平均收益".format(horizon)] = (
+            returns.mean() if len(returns) else np.nan
+        )
+        stats["{}日胜率".format(horizon)] = (
+            (returns > 0).mean() if len(returns) else np.nan
+        )
+    stats["平均最大回撤"] = result["max_drawdown"].mean() if len(result) else np.nan
+    stats["最差回撤"] = result["max_drawdown"].min() if len(result) else np.nan
+
+    # 每天等权持有当天全部信号1天的净值曲线的最大回撤
+    daily = result.groupby("日期")["ret_1"].mean().dropna()
+    equity = (1 + daily).cumprod()
+    if len(equity):
+        stats["净值最大回撤"] = float((equity / equity.cummax() - 1).min())
+    else:
+        stats["净值最大回撤"] = np.nan
+    return stats
+
+
+def backtest(strategy_func, start, end, market=None, liquid_only=True):
+    """对一个策略在[start, end]区间回测，返回 (每笔信号明细, 统计)"""
+    if market is None:
+        market = load_market()
+    days, selected = signals(market, strategy_func, start, end, liquid_only)
+    result = trades(market, days, selected)
+    return result, summarize(result, len(days))
+
+
+def load_market():
+    """优先打开保存的行情面板，没有时从本地库构建"""
+    market = panel.load()
+    if market is not None:
+        return market
+    # 没有保存名称的代码以代码代替名称
+    names = store.names()
+    stocks_data = {}
+    for code in store.codes():
+        stock = (code, names.get(code) or code)
+        data = data_fetcher.load(stock)
+        if data is not None:
+            stocks_data[stock] = data
+    return panel.build(stocks_data)
+
+
+def resolve(name):
+    """把登记的策略名或 'wyckoff_divergence.check' 解析为策略函数"""
+    if "." not in name:
+        return registry.get(name).func
+    module_name, func_name = name.rsplit(".", 1)
+    module = importlib.import_module("strategy." + module_name)
+    return getattr(module, func_name)
+
+
+def _day(value):
+    return np.datetime64(pd.Timestamp(value).date(), "D")
+
+
+def main(argv):
+    if len(argv) != 3:
+        print("用法: python backtest.py <策略名|模块.函数> <开始日期> <结束日期>")
+        return 1
+    logging.basicConfig(format="%(asctime)s %(message)s", level=logging.WARNING)
+    settings.init()
+    strategy_name, start, end = argv
+    result, stats = backtest(resolve(strategy_name), start, end)
+    for key, value in stats.items():
+        print("{}: {}".format(key, value))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,75 @@
+# -*- encoding: UTF-8 -*-
+
+import pandas as pd
+
+# 只读K线数据：同一只股票的数据由全部策略共享，也可能同时在多个线程中被读取。
+# 策略只能读取，均线等派生数据从 indicators 缓存获取，不能写回数据表；
+# 写入列、修改单元格、替换索引或原地修改都会抛出 TypeError。
+# 切片、tail 等操作返回普通 DataFrame，写时复制保证修改它们不会影响共享的数据。
+# pandas 3 总是写时复制；pandas 2 默认关闭，导入本模块时打开，否则切片可能与共享的数据共用内存
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+def _readonly(*args, **kwargs):
+    raise TypeError("K线数据只读，派生数据请使用 indicators 缓存")
+
+
+class _ReadOnlyIndexer:
+    """loc/iloc/at/iat 的只读包装，取值照常，赋值抛出异常"""
+
+    def __init__(self, indexer):
+        self._indexer = indexer
+
+    def __getitem__(self, key):
+        return self._indexer[key]
+
+    __setitem__ = _readonly
+
+    def __call__(self, axis=None):
+        return _ReadOnlyIndexer(self._indexer(axis))
+
+    def __getattr__(self, name):
+        return getattr(self._indexer, name)
+
+
+class FrozenBars(pd.DataFrame):
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    insert = _readonly
+    pop = _readonly
+    update = _readonly
+    # fillna、drop、sort_values 等 inplace=True 时都经过这里
+    _update_inplace = _readonly
+
+    def __setattr__(self, name, value):
+        if name in ("index", "columns") or name in self.columns:
+            _readonly()
+        super().__setattr__(name, value)
+
+    @property
+    def loc(self):
+        return _ReadOnlyIndexer(super().loc)
+
+    @property
+    def iloc(self):
+        return _ReadOnlyIndexer(super().iloc)
+
+    @property
+    def at(self):
+        return _ReadOnlyIndexer(super().at)
+
+    @property
+    def iat(self):
+        return _ReadOnlyIndexer(super().iat)
+
+
+def freeze(data):
+    """返回data的只读视图，不复制数据"""
+    if data is None or isinstance(data, FrozenBars):
+        return data
+    return FrozenBars(data)
@@ -0,0 +1,32 @@
+# -*- encoding: UTF-8 -*-
+import pytest
+
+import work_flow
+from strategy import registry
+
+
+def run_strategy(strategy_func, universe):
+    return [stock for stock, data in universe.items() if strategy_func(stock, data)]
+
+
+@pytest.mark.parametrize(
+    "strategy", registry.STRATEGIES, ids=[s.name for s in registry.STRATEGIES]
+)
+def test_strategy(throughput, universe, top_list, strategy):
+    selected = throughput(
+        strategy.name, run_strategy, len(universe), strategy.func, universe
+    )
+    assert len(selected) < len(universe)
+
+
+def run_liquidity(universe):
+    return [
+        stock
+        for stock, data in universe.items()
+        if work_flow.is_liquid_enough(stock, data)
+    ]
+
+
+def test_is_liquid_enough(throughput, universe):
+    liquid = throughput("is_liquid_enough", run_liquidity, len(universe), universe)
+    assert 0 < len(liquid) < len(universe)
@@ -0,0 +1,22 @@
+# -*- encoding: UTF-8 -*-
+import data_fetcher
+import push
+import work_flow
+from strategy import registry
+
+
+def test_process(throughput, universe, top_list, monkeypatch):
+    """完整的 work_flow.process：不下载行情、不推送，其余与每日选股相同"""
+    pushed = []
+    monkeypatch.setattr(data_fetcher, "run", lambda stocks, lookback=None: universe)
+    monkeypatch.setattr(push, "strategy", pushed.append)
+    strategies = registry.enabled()
+
+    throughput(
+        "work_flow.process",
+        work_flow.process,
+        len(universe),
+        list(universe),
+        strategies,
+    )
+    assert pushed
@@ -0,0 +1,128 @@
+# -*- encoding: UTF-8 -*-
+
+import json
+import os
+
+import pytest
+
+import indicators
+import settings
+from benchmarks import synthetic
+from strategy import registry
+
+# 吞吐量（股票数/秒）记录在 --throughput-json 指定的文件中；
+# 有基线时（--throughput-baseline），低于基线 (1 - 容差) 的用例失败。
+# 在基准机器上加 --save-throughput-baseline 运行一次即可生成或更新基线
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+_throughput = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("sequoia", "Sequoia 基准测试")
+    group.addoption("--stocks", type=int, default=6000, help="模拟股票数量，默认6000")
+    group.addoption(
+        "--throughput-json",
+        default=os.path.join(DIRECTORY, "throughput.json"),
+        help="本次运行的吞吐量结果",
+    )
+    group.addoption(
+        "--throughput-baseline",
+        default=os.path.join(DIRECTORY, "baseline.json"),
+        help="吞吐量基线",
+    )
+    group.addoption(
+        "--throughput-tolerance",
+        type=float,
+        default=0.2,
+        help="允许低于基线的比例，默认0.2",
+    )
+    group.addoption(
+        "--save-throughput-baseline",
+        action="store_true",
+        help="把本次结果写入基线文件",
+    )
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _dump(path, results):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _throughput:
+        return
+    option = session.config.option
+    results = {
+        "stocks": option.stocks,
+        "stocks_per_second": dict(_throughput),
+    }
+    _dump(option.throughput_json, results)
+    if option.save_throughput_baseline:
+        _dump(option.throughput_baseline, results)
+
+
+@pytest.fixture(scope="session")
+def config():
+    """不读取config.yaml，基准测试需要的配置项直接写入这个字典"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        config = {"end_date": None}
+        monkeypatch.setattr(settings, "config", config, raising=False)
+        yield config
+
+
+@pytest.fixture(scope="session")
+def universe(request, config):
+    """按全部登记策略的最长窗口处理好的模拟全市场数据 {(代码, 名称): 只读DataFrame}"""
+    strategies = registry.enabled([strategy.name for strategy in registry.STRATEGIES])
+    raw = synthetic.generate(n_stocks=request.config.option.stocks)
+    return synthetic.frames(raw, registry.lookback(strategies))
+
+
+@pytest.fixture(scope="session")
+def top_list(universe):
+    """龙虎榜：模拟数据中每10只股票取一只"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        codes = [stock[0] for stock in list(universe)[::10]]
+        monkeypatch.setattr(settings, "load_top_list", lambda today=None: codes)
+        yield codes
+
+
+@pytest.fixture
+def throughput(request, benchmark):
+    """
+    throughput(name, func, stocks, *args)：每轮开始前清空指标缓存后调用func(*args)，
+    按 stocks / 平均耗时 计算吞吐量，以name记录并与基线比较
+    """
+    option = request.config.option
+    baseline = _load(option.throughput_baseline).get("stocks_per_second", {})
+
+    def run(name, func, stocks, *args, rounds=3):
+        result = benchmark.pedantic(
+            func, args=args, setup=indicators.clear, rounds=rounds, iterations=1
+        )
+        if benchmark.stats is None:  # --benchmark-disable
+            return result
+        rate = stocks / benchmark.stats.stats.mean
+        benchmark.extra_info["stocks"] = stocks
+        benchmark.extra_info["stocks_per_second"] = rate
+        _throughput[name] = rate
+
+        expected = baseline.get(name)
+        if expected and rate < expected * (1 - option.throughput_tolerance):
+            pytest.fail(
+                "{}: 吞吐量 {:.0f} 股/秒，低于基线 {:.0f} 股/秒".format(
+                    name, rate, expected
+                )
+            )
+        return result
+
+    return run
@@ -0,0 +1,177 @@
+# -*- encoding: UTF-8 -*-
+
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+
+# 离线基准测试用的模拟A股日线：固定随机种子，同样的参数总是生成同样的数据。
+# 每只股票由若干走势阶段拼接而成，包含涨跌停、停牌、次新股，
+# 以及能触发威克夫各形态的量价阶段（吸筹箱体、弹簧、恐慌抛售、缩量不跌）
+
+# 代码前缀和涨跌停幅度：创业板、科创板为20%，其余为10%
+BOARDS = [
+    ("600", 0.10),
+    ("601", 0.10),
+    ("603", 0.10),
+    ("000", 0.10),
+    ("002", 0.10),
+    ("300", 0.20),
+    ("688", 0.20),
+]
+
+# 走势阶段：(名称, 出现权重, 最短天数, 最长天数)
+REGIMES = [
+    ("walk", 0.30, 10, 40),
+    ("trend", 0.14, 10, 40),
+    ("decline", 0.10, 5, 30),
+    ("accumulation", 0.12, 64, 80),
+    ("spring", 0.08, 30, 45),
+    ("climax", 0.07, 12, 16),
+    ("quiet", 0.08, 10, 25),
+    ("limitup", 0.06, 1, 4),
+    ("limitdown", 0.05, 1, 2),
+]
+
+_WEIGHTS = np.array([regime[1] for regime in REGIMES])
+_WEIGHTS = _WEIGHTS / _WEIGHTS.sum()
+
+# 以形态结尾的股票比例：策略只看最后一天，这些股票保证选股结果不为空
+PATTERN_ENDING = 0.35
+PATTERNS = ["accumulation", "spring", "climax", "quiet", "limitup", "limitdown"]
+
+
+def _box(rng, change, volume, amplitude):
+    """箱体震荡：价格在±amplitude内来回波动，成交量逐渐萎缩"""
+    n = len(change)
+    wave = amplitude * np.sin(np.linspace(0, rng.uniform(2.5, 4.5) * np.pi, n + 1))
+    change[:] = change * 0.15 + np.diff(wave)
+    volume *= np.linspace(1.0, 0.45, n)
+
+
+def _regime(name, rng, change, volume, limit):
+    """按阶段修改日涨跌幅change和相对成交量volume（原地修改）"""
+    n = len(change)
+    if name == "trend":
+        change += 0.006
+        volume *= 1.2
+    elif name == "decline":
+        change -= 0.006
+    elif name == "accumulation":
+        # 吸筹：长期横盘缩量后放量突破箱体顶部
+        _box(rng, change[:-1], volume[:-1], rng.uniform(0.05, 0.09))
+        change[-1] = rng.uniform(0.05, limit)
+        volume[-1] *= 2.5
+    elif name == "spring":
+        # 弹簧：横盘后缩量跌破箱底，随即放量收回
+        _box(rng, change[:-3], volume[:-3], rng.uniform(0.04, 0.07))
+        change[-3] = -rng.uniform(0.03, 0.05)
+        volume[-3] *= 0.6
+        change[-2] = 0.01
+        change[-1] = rng.uniform(0.03, 0.06)
+        volume[-1] *= 1.8
+    elif name == "climax":
+        # 恐慌抛售：连续下跌后放巨量大跌，自动反弹，缩量回测低点，再放量上涨
+        drop = n - 9
+        change[:drop] = -rng.uniform(0.02, 0.04, drop)
+        change[drop] = -limit * rng.uniform(0.8, 1.0)
+        volume[drop] *= 4.0
+        change[drop + 1] = rng.uniform(0.055, 0.08)
+        volume[drop + 1] *= 2.0
+        change[drop + 2 : drop + 4] = -0.025
+        volume[drop + 2 : drop + 4] *= 0.8
+        change[drop + 4 :] = rng.uniform(0.025, 0.04, n - drop - 4)
+        volume[drop + 4 :] *= 1.2
+    elif name == "quiet":
+        # 缩量不跌
+        change *= 0.3
+        change += 0.001
+        volume *= 0.5
+    elif name == "limitup":
+        change[:] = limit
+        volume *= 2.0
+    elif name == "limitdown":
+        change[:] = -limit
+        volume *= 5.0
+
+
+def stock(rng, dates, code, limit):
+    """生成一只股票的不复权日线，列与 ak.stock_zh_a_hist 一致"""
+    n = len(dates)
+    change = rng.normal(0.0003, 0.018, n)
+    volume = np.ones(n)
+    day = 0
+    while day < n:
+        index = rng.choice(len(REGIMES), p=_WEIGHTS)
+        name, _, shortest, longest = REGIMES[index]
+        end = min(day + int(rng.integers(shortest, longest + 1)), n)
+        if end - day >= shortest:
+            _regime(name, rng, change[day:end], volume[day:end], limit)
+        day = end
+    if rng.random() < PATTERN_ENDING:
+        name = PATTERNS[int(rng.integers(len(PATTERNS)))]
+        _, _, shortest, longest = next(r for r in REGIMES if r[0] == name)
+        length = min(int(rng.integers(shortest, longest + 1)), n)
+        _regime(name, rng, change[n - length :], volume[n - length :], limit)
+    change = np.clip(change, -limit, limit)
+
+    close = (rng.uniform(4, 60) * np.cumprod(1 + change)).round(2)
+    close = np.maximum(close, 0.5)
+    prev_close = np.concatenate(([close[0]], close[:-1]))
+    upper = (prev_close * (1 + limit)).round(2)
+    lower = (prev_close * (1 - limit)).round(2)
+    open_ = np.clip(prev_close * (1 + rng.normal(0, 0.006, n)), lower, upper).round(2)
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, n)))
+    high = np.minimum(high, upper).round(2)
+    low = np.maximum(low, lower).round(2)
+
+    # 日均成交额呈对数正态分布，大约一半的股票能通过流动性筛选
+    amount = np.exp(rng.normal(np.log(3e8), 1.0))
+    hands = amount / (close[0] * 100) * volume * rng.lognormal(0, 0.25, n)
+    hands = np.maximum(hands.round(), 1)
+
+    data = pd.DataFrame(
+        {
+            "日期": [date.date() for date in dates],
+            "股票代码": code,
+            "开盘": open_,
+            "收盘": close,
+            "最高": high,
+            "最低": low,
+            "成交量": hands,
+            "成交额": (hands * close * 100).round(2),
+            "涨跌幅": ((close / prev_close - 1) * 100).round(2),
+            "涨跌额": (close - prev_close).round(2),
+        }
+    )
+
+    # 停牌：删除一段连续的交易日
+    if rng.random() < 0.08:
+        start = int(rng.integers(1, n - 1))
+        length = int(rng.integers(5, 60))
+        data = data.drop(index=range(start, min(start + length, n - 1)))
+    # 次新股：上市时间晚于第一个交易日
+    if rng.random() < 0.10:
+        data = data.iloc[int(rng.integers(20, n // 2)) :]
+    return data.reset_index(drop=True)
+
+
+def generate(n_stocks=6000, n_days=400, seed=0, end="2024-12-31"):
+    """生成 {(代码, 名称): 不复权日线} 的模拟全市场行情"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end, periods=n_days)
+    universe = {}
+    for i in range(n_stocks):
+        prefix, limit = BOARDS[i % len(BOARDS)]
+        code = "{}{:03d}".format(prefix, i // len(BOARDS))
+        universe[(code, "模拟" + code)] = stock(rng, dates, code, limit)
+    return universe
+
+
+def frames(universe, lookback=None):
+    """按 data_fetcher.finish 处理成策略读取的只读数据（截取窗口、计算涨跌幅、紧凑格式）"""
+    return {
+        stock: data_fetcher.finish(data.copy(), None, lookback)
+        for stock, data in universe.items()
+    }
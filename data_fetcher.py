@@ -1,32 +1,200 @@
 # -*- encoding: UTF-8 -*-
 
 import concurrent.futures
+import datetime
+import functools
 import logging
+import os
+import queue
+import threading
 import time
 
-import akshare as ak
-import talib as tl
+import pandas as pd
 
+import async_fetcher
+import bars
+import datasource
+import metrics
+import schema
+import settings
+import store
+import trade_calendar
+import utils
 
-def fetch(code_name):
+tl = utils.lazy_import("talib")
+
+START_DATE = "20220101"
+# 按交易日历计算下载窗口时多留的交易日数，停牌的股票需要更早的起始日期
+HISTORY_MARGIN = 20
+# 收盘后等待数据稳定的时间，此后写入本地库的最后一根K线即为最终数据
+SETTLE_DELAY = datetime.timedelta(minutes=30)
+
+
+def fetch(code_name, lookback=None):
+    """
+    增量下载并返回复权后的行情；lookback为启用策略需要的K线数，
+    本地没有数据时只下载这个窗口，返回的数据也只保留这个窗口
+    """
+    with metrics.timed("sequoia_fetch_seconds"):
+        return _fetch(code_name, lookback)
+
+
+def _fetch(code_name, lookback=None):
     stock = code_name[0]
-    data = ak.stock_zh_a_hist(
-        symbol=stock, period="daily", start_date="20220101", adjust="qfq"
+    # 本地已有数据时只下载最后一根K线及之后的数据，最后一根可能是盘中数据，需要覆盖
+    data = store.load(stock)
+    factors = store.load_factors(stock)
+    start_date = history_start(lookback)
+    backfill = True
+    if data is not None and not data.empty:
+        # 本地历史比窗口短时（启用了需要更长历史的策略）补齐窗口内的数据；
+        # lookback为None时需要自START_DATE起的全部历史，之前按窗口下载的要重新下载。
+        # 以前从更早的日期下载过时，本地的第一根K线就是上市日，不需要再补
+        first_date = data["日期"].iloc[0].strftime("%Y%m%d")
+        requested = store.requested_from(stock)
+        if (
+            (lookback is not None and len(data) >= lookback)
+            or first_date <= start_date
+            or (requested is not None and requested <= start_date)
+        ):
+            backfill = False
+            start_date = data["日期"].iloc[-1].strftime("%Y%m%d")
+            # 本地已有最近一个交易日收盘后的数据，没有缺少的K线，不需要请求
+            if factors is not None and up_to_date(stock, data["日期"].iloc[-1]):
+                return finish(data, factors, lookback)
+
+    new_data = datasource.call(
+        "stock_zh_a_hist",
+        symbol=stock,
+        period="daily",
+        start_date=start_date,
+        adjust="",
     )
 
+    if new_data is not None and not new_data.empty:
+        # 先刷新复权因子再写入K线，因子获取失败时下次运行还能重新识别出除权
+        if factors is None or store.has_ex_rights(data, new_data):
+            factors = fetch_factors(stock)
+            store.write_factors(stock, factors)
+        data = store.append(stock, new_data, data)
+    if backfill:
+        store.record_requested(stock, start_date)
+
     if data is None or data.empty:
         logging.debug("股票：" + stock + " 没有数据，略过...")
         return
 
+    return finish(data, factors, lookback)
+
+
+def load(code_name, lookback=None, compact=None):
+    """只读取本地库中的数据，不访问网络"""
+    stock = code_name[0]
+    data = store.load(stock)
+    if data is None or data.empty:
+        return None
+    return finish(data, store.load_factors(stock), lookback, compact)
+
+
+def history_start(lookback=None):
+    """
+    覆盖lookback根K线的下载起始日期：截至end_date（没有时为今天，含当天）的第lookback个交易日，
+    再多留 HISTORY_MARGIN 个交易日；lookback为None时从START_DATE开始
+    """
+    if lookback is None:
+        return START_DATE
+    end_date = utils.ensure_date(
+        settings.config.get("end_date") or datetime.date.today()
+    )
+    start = trade_calendar.previous_trading_day(
+        end_date + datetime.timedelta(days=1), lookback + HISTORY_MARGIN
+    )
+    return start.strftime("%Y%m%d")
+
+
+def up_to_date(stock, last_date, now=None):
+    """本地最后一根K线是最近一个交易日的，并且是在收盘数据稳定之后写入的"""
+    close = trade_calendar.last_close(now)
+    if utils.ensure_date(last_date) != close.date():
+        return False
+    written = datetime.datetime.fromtimestamp(os.path.getmtime(store.path(stock)))
+    return written >= close + SETTLE_DELAY
+
+
+def window(data, lookback=None):
+    """只保留截至end_date的最后lookback根K线，以及end_date之后的K线"""
+    if lookback is None:
+        return data
+    end = utils.end_index(data, settings.config.get("end_date"))
+    start = max(0, end - lookback)
+    if start == 0:
+        return data
+    return data.iloc[start:].reset_index(drop=True)
+
+
+def finish(data, factors, lookback=None, compact=None):
+    """
+    截取窗口，复权并计算涨跌幅，返回以日期为索引的只读数据；
+    compact 为空时按配置决定是否转换为 schema 中的紧凑格式
+    """
+    data = window(data, lookback)
+    data = store.adjust(data, factors, settings.config.get("adjust", "qfq"))
+
     data["p_change"] = tl.ROC(data["收盘"], 1)
+    if compact is None:
+        compact = settings.config.get("compact", True)
+    if compact:
+        data = schema.compact(data)
+    else:
+        data = data.astype({"成交量": "double"})
+
+    return bars.freeze(utils.index_by_date(data))
+
+
+def fetch_factors(stock):
+    """从新浪获取后复权因子，没有除权记录的股票返回空表"""
+    try:
+        factors = datasource.call(
+            "stock_zh_a_daily", symbol=market_symbol(stock), adjust="hfq-factor"
+        )
+    except ValueError:
+        logging.debug("股票：" + stock + " 没有复权因子")
+        return pd.DataFrame({"日期": [], "hfq_factor": []})
+
+    return pd.DataFrame(
+        {
+            "日期": pd.to_datetime(factors["date"]).dt.date,
+            "hfq_factor": factors["hfq_factor"].astype(float),
+        }
+    ).sort_values("日期", ignore_index=True)
+
+
+def market_symbol(stock):
+    """代码加上交易所前缀，如 600000 -> sh600000"""
+    if stock.startswith(("6", "9")) and not stock.startswith("92"):
+        return "sh" + stock
+    if stock.startswith(("4", "8", "92")):
+        return "bj" + stock
+    return "sz" + stock
 
-    return data
 
+def run(stocks, lookback=None, failed=None):
+    """
+    下载全部股票，返回 {(代码, 名称): 数据}，没有数据的股票不在其中；
+    failed 为列表时追加下载出错的股票，以便与没有数据的股票区分
+    """
+    fetch_config = settings.config.get("fetch") or {}
+    if fetch_config.get("engine") == "async":
+        transport = functools.partial(fetch, lookback=lookback)
+        stocks_data = async_fetcher.run(stocks, transport, fetch_config, failed)
+        logging.info(f"成功获取 {len(stocks_data)}/{len(stocks)} 只股票的数据")
+        return stocks_data
 
-def run(stocks):
     stocks_data = {}
     with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-        future_to_stock = {executor.submit(fetch, stock): stock for stock in stocks}
+        future_to_stock = {
+            executor.submit(fetch, stock, lookback): stock for stock in stocks
+        }
 
         completed = 0
         total = len(stocks)
@@ -36,7 +204,6 @@ def run(stocks):
             try:
                 data = future.result()
                 if data is not None:
-                    data = data.astype({"成交量": "double"})
                     stocks_data[stock] = data
                 
                 # 打印进度
@@ -45,9 +212,60 @@ def run(stocks):
                     logging.info(f"数据获取进度: {completed}/{total}")
 
             except Exception as exc:
+                if failed is not None:
+                    failed.append(stock)
                 logging.error("%s(%r) generated an exception: %s" % (stock[1], stock[0], exc))
                 # 在发生错误后添加短暂延迟
                 time.sleep(0.5)
 
     logging.info(f"成功获取 {len(stocks_data)}/{len(stocks)} 只股票的数据")
     return stocks_data
+
+
+def stream(stocks, queue_size=64, lookback=None):
+    """
+    边下载边产出 (stock, data)：下载线程把完成的结果放入有界队列，
+    队列满时下载线程阻塞，调用方处理多快下载就多快，内存中最多保留queue_size只股票的数据
+    """
+    results = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+
+    def download(stock):
+        if stopped.is_set():
+            return
+        try:
+            item = (stock, fetch(stock, lookback), None)
+        except Exception as exc:
+            item = (stock, None, exc)
+        # 调用方提前结束时不再等待队列空位
+        while not stopped.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+    try:
+        for stock in stocks:
+            executor.submit(download, stock)
+
+        succeeded = 0
+        total = len(stocks)
+        for completed in range(1, total + 1):
+            stock, data, exc = results.get()
+            if exc is not None:
+                logging.error(
+                    "%s(%r) generated an exception: %s" % (stock[1], stock[0], exc)
+                )
+            elif data is not None:
+                succeeded += 1
+                yield stock, data
+
+            if completed % 50 == 0:
+                logging.info(f"数据获取进度: {completed}/{total}")
+
+        logging.info(f"成功获取 {succeeded}/{len(stocks)} 只股票的数据")
+    finally:
+        stopped.set()
+        executor.shutdown(wait=True)
@@ -0,0 +1,179 @@
+# -*- encoding: UTF-8 -*-
+
+import builtins
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import pandas as pd
+
+import metrics
+import settings
+import utils
+
+ak = utils.lazy_import("akshare")
+
+# 行情数据源：所有 akshare 接口都通过 call(接口名, **参数) 调用，由配置中的 datasource.mode 选择实现
+#   live    直接调用 akshare
+#   record  调用 akshare，并把返回结果保存为 directory 下的压缩 parquet 文件
+#   replay  只读取保存的结果，不访问网络；可以注入延迟和错误，模拟真实网络环境
+# 录制一次完整的每日选股（data_dir 为空时会下载整个窗口），之后可以在离线机器上反复回放和分析性能
+
+# 日线接口按代码保存全部K线，回放时再按起止日期筛选，
+# 这样增量下载的起始日期变化时仍能命中
+DATE_RANGE = {"stock_zh_a_hist": ("start_date", "end_date")}
+# 录制时保存的接口错误（如没有复权因子时的ValueError），回放时原样抛出；
+# 网络错误（ConnectionError、TimeoutError 等 OSError）和其他异常是暂时的，不记录
+RECORDED_ERRORS = (ValueError, KeyError)
+
+
+class Live:
+    def call(self, endpoint, **kwargs):
+        return getattr(ak, endpoint)(**kwargs)
+
+
+class Recorder:
+    def __init__(self, directory, source=None):
+        self.directory = directory
+        self.source = source or Live()
+        self._lock = threading.Lock()
+
+    def call(self, endpoint, **kwargs):
+        try:
+            result = self.source.call(endpoint, **kwargs)
+        except Exception as exc:
+            if type(exc) in RECORDED_ERRORS:
+                with self._lock:
+                    _write_error(fixture_path(self.directory, endpoint, kwargs), exc)
+            raise
+        with self._lock:
+            _write(fixture_path(self.directory, endpoint, kwargs), endpoint, result)
+        return result
+
+
+class Replayer:
+    def __init__(self, directory, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.directory = directory
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self, endpoint, **kwargs):
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise ConnectionError("模拟网络错误: {}".format(endpoint))
+
+        path = fixture_path(self.directory, endpoint, kwargs)
+        if os.path.exists(path + ".error.json"):
+            with open(path + ".error.json", "r", encoding="utf-8") as file:
+                error = json.load(file)
+            exception = getattr(builtins, error["type"], None)
+            if not isinstance(exception, type) or not issubclass(exception, Exception):
+                exception = RuntimeError
+            raise exception(error["message"])
+        if not os.path.exists(path + ".parquet"):
+            raise LookupError("没有录制的数据: {} {}".format(endpoint, kwargs))
+        result = pd.read_parquet(path + ".parquet")
+        return _date_range(endpoint, result, kwargs)
+
+
+def fixture_path(directory, endpoint, kwargs):
+    """录制文件路径（不含扩展名）：directory/接口名/参数"""
+    ignored = DATE_RANGE.get(endpoint, ())
+    name = "-".join(
+        "{}={}".format(key, value)
+        for key, value in sorted(kwargs.items())
+        if key not in ignored
+    )
+    name = (name or "default").replace(os.sep, "_")
+    return os.path.join(directory, endpoint, name)
+
+
+def _write(path, endpoint, result):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if endpoint in DATE_RANGE and os.path.exists(path + ".parquet"):
+        result = pd.concat([pd.read_parquet(path + ".parquet"), result])
+        result = result.drop_duplicates(subset="日期", keep="last")
+        result = result.sort_values("日期", ignore_index=True)
+    tmp = path + ".parquet.tmp"
+    result.to_parquet(tmp, index=False, compression="zstd")
+    os.replace(tmp, path + ".parquet")
+    if os.path.exists(path + ".error.json"):
+        os.remove(path + ".error.json")
+
+
+def _write_error(path, exc):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".error.json", "w", encoding="utf-8") as file:
+        json.dump(
+            {"type": type(exc).__name__, "message": str(exc)},
+            file,
+            ensure_ascii=False,
+        )
+
+
+def _date_range(endpoint, result, kwargs):
+    """日线接口按 start_date / end_date（YYYYMMDD）筛选K线"""
+    if endpoint not in DATE_RANGE or result.empty:
+        return result
+    start_key, end_key = DATE_RANGE[endpoint]
+    dates = pd.to_datetime(result["日期"]).dt.strftime("%Y%m%d")
+    keep = dates >= kwargs.get(start_key, "00000000")
+    keep &= dates <= kwargs.get(end_key, "99999999")
+    return result.loc[keep].reset_index(drop=True)
+
+
+def directory(config=None):
+    """录制文件目录，相对路径以项目根目录为基准"""
+    path = (config or {}).get("directory") or "fixtures"
+    if not os.path.isabs(path):
+        project_dir = os.path.dirname(os.path.abspath(__file__))
+        path = os.path.join(project_dir, path)
+    return path
+
+
+def create(config=None):
+    config = config or {}
+    mode = config.get("mode") or "live"
+    if mode == "live":
+        return Live()
+    if mode == "record":
+        return Recorder(directory(config))
+    if mode == "replay":
+        return Replayer(
+            directory(config),
+            latency=config.get("latency") or 0.0,
+            jitter=config.get("jitter") or 0.0,
+            error_rate=config.get("error_rate") or 0.0,
+            seed=config.get("seed"),
+        )
+    raise ValueError("未知的数据源: {}".format(mode))
+
+
+_source = None
+_source_config = None
+
+
+def get():
+    """按当前配置创建的数据源，配置变化时重新创建"""
+    global _source, _source_config
+    config = settings.config.get("datasource") or {}
+    if _source is None or config != _source_config:
+        _source = create(config)
+        _source_config = dict(config)
+        logging.info("数据源: {}".format(type(_source).__name__))
+    return _source
+
+
+def call(endpoint, **kwargs):
+    with metrics.timed("sequoia_request_seconds", endpoint=endpoint):
+        return get().call(endpoint, **kwargs)
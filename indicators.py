@@ -0,0 +1,125 @@
+# -*- encoding: UTF-8 -*-
+
+import collections
+import contextlib
+import threading
+
+import numpy as np
+
+import settings
+import utils
+
+tl = utils.lazy_import("talib")
+
+# 指标缓存：以 (代码, 指标, 参数, 数据版本) 为键缓存计算结果，
+# 同一只股票的同一指标在一次运行中只计算一次；按占用内存做LRU淘汰
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_cache = collections.OrderedDict()
+_lock = threading.Lock()
+_bytes = 0
+_hits = 0
+_misses = 0
+# 当前线程正在判断的股票：id(data) -> (data, 版本)，见 prepared()
+_prepared = threading.local()
+
+
+def max_bytes():
+    size = settings.config.get("indicator_cache_mb")
+    return DEFAULT_MAX_BYTES if size is None else int(size) * 1024 * 1024
+
+
+def version(data):
+    """数据版本：K线数以及最后一根K线的日期、收盘价、成交量，追加或修改最后一根K线都会改变版本"""
+    if len(data) == 0:
+        return (0,)
+    return (
+        len(data),
+        data["日期"].iat[-1],
+        data["收盘"].iat[-1],
+        data["成交量"].iat[-1],
+    )
+
+
+@contextlib.contextmanager
+def prepared(data):
+    """
+    同一只股票依次运行多个策略时，预先计算一次数据版本，
+    with 块内对同一个 data 对象取指标不再重复计算版本
+    """
+    versions = getattr(_prepared, "versions", None)
+    if versions is None:
+        versions = _prepared.versions = {}
+    key = id(data)
+    versions[key] = (data, version(data))
+    try:
+        yield data
+    finally:
+        versions.pop(key, None)
+
+
+def _version(data):
+    entry = getattr(_prepared, "versions", {}).get(id(data))
+    if entry is not None and entry[0] is data:
+        return entry[1]
+    return version(data)
+
+
+def get(code_name, name, params, data, compute):
+    """取缓存的指标，没有时调用compute()计算并缓存，返回只读的numpy数组"""
+    global _bytes, _hits, _misses
+    code = code_name[0] if isinstance(code_name, tuple) else code_name
+    key = (code, name, params, _version(data))
+    with _lock:
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+            _hits += 1
+            return value
+        _misses += 1
+
+    value = np.asarray(compute())
+    value.flags.writeable = False
+
+    with _lock:
+        if key not in _cache:
+            _cache[key] = value
+            _bytes += value.nbytes
+        limit = max_bytes()
+        while _bytes > limit and len(_cache) > 1:
+            _, evicted = _cache.popitem(last=False)
+            _bytes -= evicted.nbytes
+    return value
+
+
+def ma(code_name, data, column, period):
+    """简单移动平均，与 tl.MA(data[column].values, period) 相同"""
+    return get(
+        code_name,
+        "MA",
+        (column, period),
+        data,
+        lambda: tl.MA(data[column].to_numpy(dtype=np.float64), period),
+    )
+
+
+def stats():
+    with _lock:
+        total = _hits + _misses
+        return {
+            "hits": _hits,
+            "misses": _misses,
+            "hit_rate": _hits / total if total else 0.0,
+            "entries": len(_cache),
+            "bytes": _bytes,
+        }
+
+
+def clear():
+    global _bytes, _hits, _misses
+    with _lock:
+        _cache.clear()
+        _bytes = 0
+        _hits = 0
+        _misses = 0
@@ -0,0 +1,212 @@
+# -*- encoding: UTF-8 -*-
+
+import datetime
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import bars
+import data_fetcher
+import datasource
+import metrics
+import push
+import settings
+import store
+import trade_calendar
+import utils
+import work_flow
+from strategy import registry
+
+# 盘中选股：每个周期只调用一次 stock_zh_a_spot_em，不下载历史行情。
+# 用快照中的今开、最高、最低、最新价、成交量合成当天的临时K线，追加到本地库中截至昨天的历史后重新判断。
+#   - 本地历史在当天第一次用到时读取，之后保存在内存中，日期变化时清空；
+#   - 只有当天K线变化才可能改变结果，先用各策略的快照条件（与 work_flow.plan 相同）排除不可能选中的股票；
+#   - 临时K线不写入本地库，收盘后的每日选股会下载正式数据；
+#   - 本地历史没有更新到上一个交易日时（例如被下推条件排除或预取失败），先下载补齐，下载失败则略过该股票；
+#   - 同一天内每只股票只推送第一次被选中的结果。
+# 当天除权除息的股票，临时K线使用最近一次的复权因子，与正式数据可能略有差异
+
+# 快照列 -> K线列
+SPOT_COLUMNS = {
+    "今开": "开盘",
+    "最新价": "收盘",
+    "最高": "最高",
+    "最低": "最低",
+    "成交量": "成交量",
+    "成交额": "成交额",
+    "涨跌额": "涨跌额",
+}
+
+_lock = threading.Lock()
+_day = None
+_history = {}
+_pushed = {}
+
+
+def today_bars(spot, today=None):
+    """从快照合成当天的不复权K线，以代码为索引；停牌（没有成交）的股票没有当天K线"""
+    today = today or datetime.date.today()
+    columns = [column for column in SPOT_COLUMNS if column in spot]
+    traded = spot.dropna(subset=["最新价", "今开", "最高", "最低"])
+    traded = traded[traded["成交量"] > 0]
+    frame = traded[columns].rename(columns=SPOT_COLUMNS)
+    frame.insert(0, "日期", today)
+    frame.index = traded["代码"].to_numpy()
+    return frame
+
+
+def history(code, lookback=None, today=None):
+    """
+    截至昨天的历史K线，按每日选股相同的方式复权并转换格式，当天内只读取和计算一次。
+    返回 ({列: 数组}, 日期索引, 昨天的复权收盘价, 当天不复权价格乘以的复权系数)，本地没有数据时返回None
+    """
+    global _day
+    today = today or datetime.date.today()
+    with _lock:
+        if _day != today:
+            _day = today
+            _history.clear()
+            _pushed.clear()
+        key = (code, lookback)
+        if key not in _history:
+            _history[key] = _prepare(code, lookback, today)
+        return _history[key]
+
+
+def _load_before(code, today):
+    data = store.load(code)
+    if data is None:
+        return None
+    # 之前的运行可能保存了当天的盘中数据
+    data = data[pd.to_datetime(data["日期"]) < pd.Timestamp(today)]
+    return None if data.empty else data
+
+
+def _prepare(code, lookback, today):
+    data = _load_before(code, today)
+    if data is None:
+        return None
+    # 临时K线必须紧接在上一个交易日之后，否则涨跌幅、均线等都会跨过缺少的K线计算
+    previous = trade_calendar.previous_trading_day(today)
+    last_date = utils.ensure_date(data["日期"].iloc[-1])
+    if last_date < previous:
+        logging.warning(
+            "{} 本地历史截至 {}，缺少 {} 的K线，先下载补齐".format(
+                code, last_date, previous
+            )
+        )
+        try:
+            data_fetcher.fetch((code, ""))
+        except Exception as exc:
+            logging.warning("{} 下载失败，盘中略过: {}".format(code, exc))
+            return None
+        data = _load_before(code, today)
+        if data is None:
+            return None
+        last_date = utils.ensure_date(data["日期"].iloc[-1])
+        if last_date < previous:
+            # 下载成功但仍没有上一个交易日的K线，说明当时停牌
+            logging.info("{} 自 {} 之后停牌".format(code, last_date))
+    factors = store.load_factors(code)
+    # 当天沿用最近一次的复权因子：前复权时当天价格不变，后复权时乘以最近的因子
+    scale = 1.0
+    if settings.config.get("adjust", "qfq") == "hfq" and factors is not None:
+        if not factors.empty:
+            scale = float(factors["hfq_factor"].iloc[-1])
+    # 加上当天的K线后仍保留lookback根
+    window = None if lookback is None else lookback - 1
+    base = data_fetcher.finish(data.reset_index(drop=True), factors, window)
+    # 每个周期只需要在各列末尾加一个值，保存为数组，不再经过pandas取列
+    columns = {column: base[column].to_numpy() for column in base.columns}
+    last_close = float(data["收盘"].iloc[-1]) * scale
+    return columns, base.index.to_numpy(), last_close, scale
+
+
+def combine(code, bar, lookback=None, today=None):
+    """历史K线加上当天的临时K线（{列: 值}，不复权），返回与每日选股格式相同的只读数据"""
+    today = today or datetime.date.today()
+    prepared = history(code, lookback, today)
+    if prepared is None:
+        return None
+    base, index, last_close, scale = prepared
+    day = np.datetime64(today, "D")
+
+    columns = {}
+    for column, values in base.items():
+        if column == "日期":
+            # 紧凑格式中为1970-01-01起的天数
+            value = day.astype(np.int64) if values.dtype.kind == "i" else today
+        elif column in store.PRICE_COLUMNS:
+            value = bar[column] * scale
+        elif column == "p_change":
+            # 与 tl.ROC(收盘, 1) 相同
+            value = (bar["收盘"] * scale / last_close - 1) * 100
+        else:
+            value = bar.get(column, np.nan)
+        columns[column] = np.append(values, np.array([value], dtype=values.dtype))
+    index = pd.DatetimeIndex(np.append(index, day.astype(index.dtype)))
+    return bars.freeze(pd.DataFrame(columns, index=index))
+
+
+def screen(strategies=None, today=None):
+    """盘中选股一次，返回 {策略名: [(代码, 名称), ...]}"""
+    if strategies is None:
+        strategies = registry.enabled(settings.config.get("strategies"))
+    start = time.perf_counter()
+    with metrics.timed("sequoia_stage_seconds", stage="intraday_spot"):
+        spot = datasource.call("stock_zh_a_spot_em")
+    stocks = [tuple(x) for x in spot[["代码", "名称"]].values]
+    # 盘中不回测，快照条件总是适用
+    candidates = work_flow.plan(spot, stocks, strategies)
+
+    spot_bars = today_bars(spot, today).to_dict("index")
+    lookback = registry.lookback(strategies)
+    stocks_data = {}
+    with metrics.timed("sequoia_stage_seconds", stage="intraday_combine"):
+        for stock in candidates:
+            if stock[0] not in spot_bars:
+                continue
+            data = combine(stock[0], spot_bars[stock[0]], lookback, today)
+            if data is not None:
+                stocks_data[stock] = data
+
+    with metrics.timed("sequoia_stage_seconds", stage="intraday_evaluate"):
+        results = work_flow.evaluate(stocks_data, strategies)
+    logging.info(
+        "盘中选股完成: {}/{} 只股票, 耗时 {:.1f} 秒".format(
+            len(stocks_data), len(stocks), time.perf_counter() - start
+        )
+    )
+    return results
+
+
+def run(strategies=None, today=None):
+    """盘中选股并推送当天新选中的股票"""
+    try:
+        results = screen(strategies, today)
+    finally:
+        metrics.finish()
+    for strategy, selected in results.items():
+        with _lock:
+            pushed = _pushed.setdefault(strategy, set())
+            new = [stock for stock in selected if stock not in pushed]
+            pushed.update(new)
+        if new:
+            push.strategy(
+                '**************"{0}"(盘中)**************\n{1}\n**************"{0}"(盘中)**************\n'.format(
+                    strategy, new
+                )
+            )
+    return results
+
+
+def in_session(now=None):
+    """当前时间是否在配置的盘中选股时段内（intraday.start ~ intraday.end）"""
+    config = settings.config.get("intraday") or {}
+    now = now or datetime.datetime.now()
+    start = config.get("start") or "09:30"
+    end = config.get("end") or "15:00"
+    return start <= now.strftime("%H:%M") <= end
@@ -1,32 +1,147 @@
 # -*- encoding: UTF-8 -*-
 
+import argparse
 import logging
 import time
 
 import schedule
 
 import settings
-import utils
-import work_flow
+
+# pandas、akshare 等模块导入较慢，启动时只读取配置，
+# 到真正执行任务时才导入 work_flow 等模块，定时模式可以立即开始等待
+
+
+def two_phase():
+    """配置了收盘后预取时间时，选股时间只在预取的数据上选股"""
+    return bool(settings.config["schedule"].get("prefetch_time"))
 
 
 def job():
-    if utils.is_weekday():
-        work_flow.prepare()
+    import trade_calendar
+    import work_flow
+
+    if trade_calendar.is_trading_day():
+        if two_phase():
+            work_flow.screen()
+        else:
+            work_flow.prepare()
+
+
+def prefetch_job():
+    import trade_calendar
+    import work_flow
+
+    if trade_calendar.is_trading_day():
+        work_flow.prefetch()
+
+
+def intraday_job():
+    import intraday
+    import trade_calendar
+
+    if trade_calendar.is_trading_day() and intraday.in_session():
+        intraday.run()
+
 
+def memory_report():
+    """读取本地库中的全部股票，打印紧凑格式前后的内存占用"""
+    import data_fetcher
+    import schema
+    import store
+
+    stocks_data = {}
+    compacted = {}
+    for code in store.codes():
+        data = data_fetcher.load((code, code), compact=False)
+        if data is None:
+            continue
+        stocks_data[(code, code)] = data
+        compacted[(code, code)] = schema.compact(data)
+    report = schema.memory_report(stocks_data, compacted)
+    print("股票数: {stocks}  K线数: {bars}".format(**report))
+    print(
+        "压缩前: {before_bytes} 字节（每只股票 {before_bytes_per_stock:.0f}）".format(
+            **report
+        )
+    )
+    print(
+        "压缩后: {after_bytes} 字节（每只股票 {after_bytes_per_stock:.0f}）".format(
+            **report
+        )
+    )
+    print("压缩比: {ratio:.2%}".format(**report))
+
+
+parser = argparse.ArgumentParser(description="Sequoia 选股")
+parser.add_argument(
+    "--memory-report",
+    action="store_true",
+    help="打印本地行情在紧凑格式前后的内存占用后退出",
+)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="分析各策略的性能，结果写入配置中的 profile.directory",
+)
+parser.add_argument(
+    "--prefetch",
+    action="store_true",
+    help="收盘后预取行情和龙虎榜，之后的选股直接使用预取的数据",
+)
+parser.add_argument(
+    "--intraday",
+    action="store_true",
+    help="立即用全市场快照和本地历史做一次盘中选股",
+)
+args = parser.parse_args()
 
 logging.basicConfig(format="%(asctime)s %(message)s", filename="sequoia.log")
 logging.getLogger().setLevel(logging.INFO)
 settings.init()
 
-if settings.config["schedule"]["enable"]:
-    EXEC_TIME = settings.config["schedule"]["time"]
-    if not EXEC_TIME:
-        raise ValueError("Schedule time is not set in the config file.")
-    schedule.every().day.at(EXEC_TIME).do(job)
+if args.profile:
+    settings.config["profile"] = dict(settings.config.get("profile") or {}, enable=True)
+
+if args.memory_report:
+    memory_report()
+    raise SystemExit(0)
+
+if args.prefetch:
+    import work_flow
+
+    work_flow.prefetch()
+    raise SystemExit(0)
+
+if args.intraday:
+    import intraday
+
+    intraday.run()
+    raise SystemExit(0)
+
+intraday_config = settings.config.get("intraday") or {}
+if settings.config["schedule"]["enable"] or intraday_config.get("enable"):
+    if settings.config["schedule"]["enable"]:
+        EXEC_TIME = settings.config["schedule"]["time"]
+        if not EXEC_TIME:
+            raise ValueError("Schedule time is not set in the config file.")
+        schedule.every().day.at(EXEC_TIME).do(job)
+        if two_phase():
+            schedule.every().day.at(settings.config["schedule"]["prefetch_time"]).do(
+                prefetch_job
+            )
+    if intraday_config.get("enable"):
+        # 盘中每隔 interval 分钟选股一次，时段外不运行
+        schedule.every(intraday_config.get("interval") or 10).minutes.do(intraday_job)
 
     while True:
         schedule.run_pending()
         time.sleep(1)
 else:
-    work_flow.prepare()
+    import work_flow
+
+    # crontab 分别运行 --prefetch 和选股时，预取就绪则直接选股
+    if two_phase():
+        work_flow.screen()
+    else:
+        work_flow.prepare()
@@ -0,0 +1,217 @@
+# -*- encoding: UTF-8 -*-
+
+import contextlib
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import settings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 运行指标：各阶段耗时、每次请求的延迟分布、错误数、各策略耗时和吞吐量、内存峰值。
+# 每次运行结束后写入 directory/<时间>.json（只保留最近 keep 个），以及供 node_exporter textfile collector
+# 采集的 Prometheus 文本文件，然后清空，定时任务长期运行时不会累积。指标可以在多个线程中同时记录
+#   计数器  increment(name, value, **labels)
+#   仪表    set_gauge(name, value, **labels)
+#   耗时    observe(name, seconds, **labels) 或 with timed(name, **labels)，
+#           导出为 summary（p50/p95/p99、总和、次数）
+
+QUANTILES = (0.5, 0.95, 0.99)
+# 默认保留的JSON指标文件数
+KEEP = 30
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_samples = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def counter(name, **labels):
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _samples.setdefault(key, []).append(seconds)
+
+
+@contextlib.contextmanager
+def timed(name, **labels):
+    """记录代码块的耗时；抛出异常时同时把 <name>_errors_total 加1"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        increment(name + "_errors_total", **labels)
+        raise
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _samples.clear()
+
+
+def peak_rss():
+    """进程的内存峰值（字节），不支持的平台返回None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _summary(samples):
+    values = np.asarray(samples, dtype=np.float64)
+    summary = {"count": len(values), "sum": float(values.sum())}
+    for quantile, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+        summary["p{:g}".format(quantile * 100)] = float(value)
+    summary["max"] = float(values.max())
+    return summary
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, _escape(v)) for k, v in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def snapshot():
+    """当前全部指标：{counters: [...], gauges: [...], summaries: [...]}"""
+    rss = peak_rss()
+    if rss is not None:
+        set_gauge("sequoia_peak_rss_bytes", rss)
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        samples = {key: list(values) for key, values in _samples.items()}
+    return {
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(counters.items())
+        ],
+        "gauges": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(gauges.items())
+        ],
+        "summaries": [
+            dict(name=name, labels=dict(labels), **_summary(values))
+            for (name, labels), values in sorted(samples.items())
+        ],
+    }
+
+
+def prometheus(data=None):
+    """Prometheus 文本格式（node_exporter textfile collector）"""
+    data = data or snapshot()
+    lines = []
+    typed = set()
+
+    def declare(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append("# TYPE {} {}".format(name, kind))
+
+    for item in data["counters"]:
+        declare(item["name"], "counter")
+        labels = _labels(sorted(item["labels"].items()))
+        lines.append("{}{} {}".format(item["name"], labels, item["value"]))
+    for item in data["gauges"]:
+        declare(item["name"], "gauge")
+        labels = _labels(sorted(item["labels"].items()))
+        lines.append("{}{} {}".format(item["name"], labels, item["value"]))
+    for item in data["summaries"]:
+        name = item["name"]
+        declare(name, "summary")
+        for quantile in QUANTILES:
+            labels = sorted(item["labels"].items()) + [("quantile", quantile)]
+            value = item["p{:g}".format(quantile * 100)]
+            lines.append("{}{} {}".format(name, _labels(labels), value))
+        labels = _labels(sorted(item["labels"].items()))
+        lines.append("{}_sum{} {}".format(name, labels, item["sum"]))
+        lines.append("{}_count{} {}".format(name, labels, item["count"]))
+    return "\n".join(lines) + "\n"
+
+
+def directory():
+    """指标文件目录，相对路径以项目根目录为基准"""
+    path = (settings.config.get("metrics") or {}).get("directory") or "metrics"
+    if not os.path.isabs(path):
+        project_dir = os.path.dirname(os.path.abspath(__file__))
+        path = os.path.join(project_dir, path)
+    return path
+
+
+def write(path=None, textfile=None):
+    """写入本次运行的JSON指标文件和Prometheus文本文件，返回JSON文件路径"""
+    config = settings.config.get("metrics") or {}
+    path = path or directory()
+    os.makedirs(path, exist_ok=True)
+    data = snapshot()
+    data["time"] = datetime.datetime.now().isoformat(timespec="seconds")
+
+    json_file = os.path.join(
+        path, datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    with open(json_file, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+    _rotate(path, config.get("keep") or KEEP)
+
+    # textfile collector 可能在任意时刻读取，先写临时文件再替换
+    textfile = textfile or config.get("textfile") or os.path.join(path, "sequoia.prom")
+    os.makedirs(os.path.dirname(os.path.abspath(textfile)), exist_ok=True)
+    with open(textfile + ".tmp", "w", encoding="utf-8") as file:
+        file.write(prometheus(data))
+    os.replace(textfile + ".tmp", textfile)
+    logging.info("运行指标已写入 {} 和 {}".format(json_file, textfile))
+    return json_file
+
+
+def _rotate(path, keep):
+    """只保留最近keep个JSON指标文件（文件名按时间排序）"""
+    files = sorted(name for name in os.listdir(path) if name.endswith(".json"))
+    for name in files[:-keep]:
+        os.remove(os.path.join(path, name))
+
+
+def finish():
+    """一次运行结束：开启了 metrics.enable 时写入指标文件，然后清空全部指标"""
+    try:
+        if (settings.config.get("metrics") or {}).get("enable"):
+            write()
+    finally:
+        reset()
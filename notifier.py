@@ -0,0 +1,330 @@
+# -*- encoding: UTF-8 -*-
+
+import atexit
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+
+import settings
+import store
+import utils
+
+wxpusher = utils.lazy_import("wxpusher")
+
+# 推送队列：选股只把消息放入有界队列，由后台线程发送，不等待推送完成。
+#   - 后台线程收到消息后再等待 linger 秒，把这段时间内的消息合并为尽量少的几条（每条不超过通道的长度上限）；
+#   - 同一通道两次发送至少间隔 min_interval 秒；
+#   - 发送失败时按 backoff、2*backoff…秒的间隔重试 retries 次；
+#   - 重试后仍失败的消息、队列满时放不下的消息以及退出时还没有发送的消息保存在 spool 文件中，
+#     下次启动时重新发送；正常退出（atexit）和收到 SIGTERM 时都会先等待发送，超时后保存
+# 通道：wxpusher（微信推送）或 mock（只记录在内存中，用于测试和离线运行）
+
+SEPARATOR = "\n"
+# 退出时等待发送完成的默认秒数
+STOP_TIMEOUT = 30
+
+
+class WxPusherChannel:
+    name = "wxpusher"
+    # WxPusher 单条消息内容的长度上限
+    max_length = 40000
+
+    def __init__(self, token, topic_id):
+        self.token = token
+        self.topic_id = topic_id
+
+    def send(self, message):
+        response = wxpusher.WxPusher.send_message(
+            message, topic_ids=[self.topic_id], token=self.token
+        )
+        if isinstance(response, dict) and not response.get("success", True):
+            raise RuntimeError("WxPusher 推送失败: {}".format(response.get("msg")))
+        return response
+
+
+class MockChannel:
+    name = "mock"
+
+    def __init__(self, max_length=40000, failures=0):
+        self.max_length = max_length
+        # 前 failures 次发送失败，用于测试重试
+        self.failures = failures
+        self.messages = []
+        self.sent_at = []
+
+    def send(self, message):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("模拟推送失败")
+        self.messages.append(message)
+        self.sent_at.append(time.monotonic())
+
+
+def coalesce(messages, max_length):
+    """把多条消息依次合并为不超过 max_length 的若干条，单条过长的消息按长度拆开"""
+    batches = []
+    current = ""
+    for message in messages:
+        while len(message) > max_length:
+            if current:
+                batches.append(current)
+                current = ""
+            batches.append(message[:max_length])
+            message = message[max_length:]
+        if not current:
+            current = message
+        elif len(current) + len(SEPARATOR) + len(message) <= max_length:
+            current += SEPARATOR + message
+        else:
+            batches.append(current)
+            current = message
+    if current:
+        batches.append(current)
+    return batches
+
+
+class Notifier:
+    def __init__(
+        self,
+        channel,
+        spool=None,
+        queue_size=1000,
+        min_interval=2.0,
+        retries=3,
+        backoff=1.0,
+        linger=1.0,
+    ):
+        self.channel = channel
+        self.spool = spool
+        self.min_interval = min_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.linger = linger
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._spool_lock = threading.Lock()
+        self._last_sent = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台发送线程，先重新提交上次没有送达的消息"""
+        for message in self._take_spool():
+            self.submit(message)
+        self._thread = threading.Thread(
+            target=self._run, name="push-notifier", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def submit(self, message):
+        """提交消息，不等待发送；队列满时保存到 spool 文件"""
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            logging.error("推送队列已满，消息保存到 {}".format(self.spool))
+            self._save_spool([message])
+
+    def pending(self):
+        """还没有发送完成的消息数"""
+        return self._queue.unfinished_tasks
+
+    def flush(self, timeout=None):
+        """等待队列中的消息发送完成，返回是否全部完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending() > 0:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout=None):
+        """等待发送完成后停止；超时时把还没有发送的消息保存到 spool 文件"""
+        if self._thread is None:
+            return
+        self.flush(timeout)
+        self._stopped.set()
+        self._thread.join(timeout)
+        self._thread = None
+        remaining = []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if remaining:
+            logging.warning(
+                "还有 {} 条消息没有发送，保存到 spool 文件".format(len(remaining))
+            )
+            self._save_spool(remaining)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            # 等待 linger 秒，把同一时间提交的消息合并发送
+            deadline = time.monotonic() + self.linger
+            while not self._stopped.is_set():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=min(timeout, 0.1)))
+                except queue.Empty:
+                    continue
+            if self._stopped.is_set():
+                # 停止时还在等待合并的消息不再发送，保存到 spool 文件
+                self._save_spool(batch)
+                for _ in batch:
+                    self._queue.task_done()
+                break
+            try:
+                # 发送前先写入 spool 文件，发送成功后再移除：
+                # stop 等待超时时正在发送的消息也不会丢失，下次启动时重新发送
+                messages = coalesce(batch, self.channel.max_length)
+                self._save_spool(messages)
+                for message in messages:
+                    if self._deliver(message):
+                        self._unspool(message)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver(self, message):
+        for attempt in range(self.retries + 1):
+            if self._last_sent is not None:
+                wait = self._last_sent + self.min_interval - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            try:
+                self.channel.send(message)
+                self._last_sent = time.monotonic()
+                return True
+            except Exception as exc:
+                self._last_sent = time.monotonic()
+                logging.warning("推送失败（第{}次）: {}".format(attempt + 1, exc))
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2**attempt)
+        logging.error("推送重试后仍失败，消息保留在 spool 文件中")
+        return False
+
+    def _save_spool(self, messages):
+        if not self.spool:
+            return
+        with self._spool_lock:
+            saved = self._read_spool()
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool)), exist_ok=True)
+            with open(self.spool + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(saved + list(messages), file, ensure_ascii=False)
+            os.replace(self.spool + ".tmp", self.spool)
+
+    def _unspool(self, message):
+        if not self.spool:
+            return
+        with self._spool_lock:
+            saved = self._read_spool()
+            if message not in saved:
+                return
+            saved.remove(message)
+            if not saved:
+                os.remove(self.spool)
+                return
+            with open(self.spool + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(saved, file, ensure_ascii=False)
+            os.replace(self.spool + ".tmp", self.spool)
+
+    def _take_spool(self):
+        if not self.spool:
+            return []
+        with self._spool_lock:
+            messages = self._read_spool()
+            if os.path.exists(self.spool):
+                os.remove(self.spool)
+        if messages:
+            logging.info("重新发送上次没有送达的 {} 条消息".format(len(messages)))
+        return messages
+
+    def _read_spool(self):
+        if not os.path.exists(self.spool):
+            return []
+        with open(self.spool, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+
+def spool_file(config=None):
+    """spool 文件路径，相对路径以 data_dir 为基准"""
+    path = (config or {}).get("spool") or "push_spool.json"
+    if not os.path.isabs(path):
+        path = os.path.join(store.root(), path)
+    return path
+
+
+def create(config=None):
+    config = config or {}
+    channel = config.get("channel") or "wxpusher"
+    if channel == "wxpusher":
+        channel = WxPusherChannel(config.get("wxpusher_token"), config.get("topic_id"))
+    elif channel == "mock":
+        channel = MockChannel()
+    else:
+        raise ValueError("未知的推送通道: {}".format(channel))
+    if config.get("max_length"):
+        channel.max_length = int(config["max_length"])
+    return Notifier(
+        channel,
+        spool=spool_file(config),
+        queue_size=config.get("queue_size") or 1000,
+        min_interval=config.get("min_interval", 2.0),
+        retries=config.get("retries", 3),
+        backoff=config.get("backoff", 1.0),
+        linger=config.get("linger", 1.0),
+    )
+
+
+_notifier = None
+# SIGTERM 可能在主线程持有锁时到达，处理函数中再次加锁
+_lock = threading.RLock()
+
+
+def get():
+    """按配置创建并启动的推送队列，进程退出（包括收到 SIGTERM）前等待发送完成"""
+    global _notifier
+    with _lock:
+        if _notifier is None:
+            config = settings.config.get("push") or {}
+            _notifier = create(config).start()
+            timeout = config.get("stop_timeout", STOP_TIMEOUT)
+            atexit.register(stop, timeout)
+            _handle_sigterm(timeout)
+        return _notifier
+
+
+def _handle_sigterm(timeout):
+    """定时任务通常用 SIGTERM 停止，不会执行 atexit，收到时先停止推送队列再退出"""
+    # 只有主线程可以设置信号处理函数
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handler(signum, frame):
+        stop(timeout)
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            raise SystemExit(128 + signum)
+
+    signal.signal(signal.SIGTERM, handler)
+
+
+def stop(timeout=STOP_TIMEOUT):
+    """等待队列中的消息发送完成（最多 timeout 秒）后停止"""
+    global _notifier
+    with _lock:
+        notifier, _notifier = _notifier, None
+    if notifier is not None:
+        notifier.stop(timeout)
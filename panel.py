@@ -0,0 +1,162 @@
+# -*- encoding: UTF-8 -*-
+
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import bars
+import store
+import utils
+
+# 全市场行情面板：股票 × 交易日 × 字段 的 float32 数组，停牌日为NaN
+# 保存为 .npy 文件后以内存映射方式打开，多个进程可以零拷贝共享同一份数据
+
+FIELDS = ["开盘", "收盘", "最高", "最低", "成交量", "p_change"]
+
+
+class Panel:
+    def __init__(self, stocks, dates, values):
+        self.stocks = stocks  # [(代码, 名称), ...]
+        self.dates = dates  # datetime64[D]，升序
+        self.values = values  # shape: (len(stocks), len(dates), len(FIELDS))
+        self._index = {stock[0]: i for i, stock in enumerate(stocks)}
+        self._order = None
+        self._counts = None
+        self._packed = {}
+
+    def __len__(self):
+        return len(self.stocks)
+
+    def field(self, name):
+        """某个字段的 股票 × 交易日 二维视图"""
+        return self.values[:, :, FIELDS.index(name)]
+
+    def date_index(self, end_date=None):
+        """end_date（含）之前最后一个交易日在日期轴上的位置，没有时返回-1"""
+        if end_date is None:
+            return len(self.dates) - 1
+        end = np.datetime64(pd.Timestamp(end_date).date(), "D")
+        return int(np.searchsorted(self.dates, end, side="right")) - 1
+
+    def _pack(self):
+        """每只股票的有效K线（非停牌日）在日期轴上的位置顺序，以及截至每天的K线数"""
+        if self._order is None:
+            valid = ~np.isnan(self.field("收盘"))
+            self._order = np.argsort(~valid, axis=1, kind="stable")
+            self._counts = np.cumsum(valid, axis=1, dtype=np.int32)
+        return self._order, self._counts
+
+    def bar_count(self, end_index=None):
+        """截至end_index（含）每只股票的K线数，相当于逐只股票按end_date截取后的len(data)"""
+        if end_index is None:
+            end_index = len(self.dates) - 1
+        if end_index < 0:
+            return np.zeros(len(self.stocks), dtype=np.int32)
+        return self._pack()[1][:, end_index]
+
+    def tail(self, name, n, end_index=None):
+        """
+        每只股票截至end_index的最后n根K线（跳过停牌日），相当于逐只股票的data.tail(n)，
+        K线不足n根时左侧补NaN，返回 股票 × n 的float64数组
+        """
+        positions = self.bar_count(end_index)[:, None] - n + np.arange(n)
+        return self._take(name, positions, positions < 0)
+
+    def ahead(self, name, n, end_index):
+        """每只股票end_index之后的n根K线（跳过停牌日），用于计算回测的未来收益，不足时右侧补NaN"""
+        positions = self.bar_count(end_index)[:, None] + np.arange(n)
+        return self._take(name, positions, positions >= self.bar_count()[:, None])
+
+    def _take(self, name, positions, missing):
+        order = self._pack()[0]
+        if name not in self._packed:
+            self._packed[name] = np.take_along_axis(self.field(name), order, axis=1)
+        positions = np.clip(positions, 0, max(len(self.dates) - 1, 0))
+        values = np.take_along_axis(self._packed[name], positions, axis=1)
+        values = values.astype(np.float64)
+        values[missing] = np.nan
+        return values
+
+    def frame(self, code):
+        """还原单只股票的DataFrame（去掉停牌日），供逐只股票的策略使用"""
+        values = self.values[self._index[code]]
+        valid = ~np.isnan(values[:, FIELDS.index("收盘")])
+        data = pd.DataFrame(values[valid].astype(np.float64), columns=FIELDS)
+        data.insert(0, "日期", pd.to_datetime(self.dates[valid]).date)
+        return bars.freeze(utils.index_by_date(data))
+
+
+def moving_average(values, period):
+    """按行计算简单移动平均，与 talib.MA 一致，前 period-1 个位置为NaN"""
+    result = np.full(values.shape, np.nan)
+    if values.shape[1] < period:
+        return result
+    windows = np.lib.stride_tricks.sliding_window_view(values, period, axis=1)
+    result[:, period - 1 :] = windows.mean(axis=2)
+    return result
+
+
+def build(stocks_data):
+    """把 {(代码, 名称): DataFrame} 打包成以全部交易日为轴的面板"""
+    stocks = list(stocks_data.keys())
+    stock_dates = {
+        stock: utils.to_datetime64(data["日期"]) for stock, data in stocks_data.items()
+    }
+    if stock_dates:
+        dates = np.unique(np.concatenate(list(stock_dates.values())))
+    else:
+        dates = np.array([], dtype="datetime64[D]")
+
+    values = np.full((len(stocks), len(dates), len(FIELDS)), np.nan, dtype=np.float32)
+    for i, stock in enumerate(stocks):
+        positions = np.searchsorted(dates, stock_dates[stock])
+        values[i, positions, :] = stocks_data[stock][FIELDS].to_numpy(dtype=np.float32)
+
+    return Panel(stocks, dates, values)
+
+
+def directory():
+    return os.path.join(store.root(), "panel")
+
+
+def save(panel, path=None):
+    """写入 values.npy / dates.npy / stocks.json，先写临时文件再替换"""
+    path = path or directory()
+    os.makedirs(path, exist_ok=True)
+
+    values_file = os.path.join(path, "values.npy.tmp")
+    values = np.lib.format.open_memmap(
+        values_file, mode="w+", dtype=np.float32, shape=panel.values.shape
+    )
+    values[:] = panel.values
+    values.flush()
+    del values
+
+    with open(os.path.join(path, "dates.npy.tmp"), "wb") as file:
+        np.save(file, panel.dates)
+    with open(os.path.join(path, "stocks.json.tmp"), "w", encoding="utf-8") as file:
+        json.dump([list(stock) for stock in panel.stocks], file, ensure_ascii=False)
+
+    for name in ("values.npy", "dates.npy", "stocks.json"):
+        os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+    logging.info(
+        "行情面板已保存: {} 只股票 × {} 个交易日".format(
+            len(panel.stocks), len(panel.dates)
+        )
+    )
+
+
+def load(path=None, mmap_mode="r"):
+    """以内存映射方式打开面板，不存在时返回None"""
+    path = path or directory()
+    values_file = os.path.join(path, "values.npy")
+    if not os.path.exists(values_file):
+        return None
+    values = np.load(values_file, mmap_mode=mmap_mode)
+    dates = np.load(os.path.join(path, "dates.npy"))
+    with open(os.path.join(path, "stocks.json"), "r", encoding="utf-8") as file:
+        stocks = [tuple(stock) for stock in json.load(file)]
+    return Panel(stocks, dates, values)
@@ -0,0 +1,116 @@
+# -*- encoding: UTF-8 -*-
+
+import concurrent.futures
+import logging
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import bars
+import settings
+import utils
+from strategy import registry
+
+# 多进程选股：行情按行拼接成一块 float64 共享内存，子进程按偏移量直接读取，
+# 不需要把几千个DataFrame序列化后传给子进程
+
+COLUMNS = ["日期", "开盘", "收盘", "最高", "最低", "成交量", "p_change"]
+
+_shm = None
+_block = None
+_offsets = None
+
+
+def pack(stocks_data):
+    """把 {(代码, 名称): DataFrame} 写入共享内存，返回 (共享内存, 形状, {代码: (起始行, 结束行)})"""
+    offsets = {}
+    total = 0
+    for stock, data in stocks_data.items():
+        offsets[stock[0]] = (total, total + len(data))
+        total += len(data)
+
+    shape = (total, len(COLUMNS))
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1) * len(COLUMNS) * 8)
+    block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    for stock, data in stocks_data.items():
+        start, end = offsets[stock[0]]
+        # 日期保存为1970-01-01起的天数
+        block[start:end, 0] = utils.day_numbers(data["日期"])
+        block[start:end, 1:] = data[COLUMNS[1:]].to_numpy(dtype=np.float64)
+    del block
+    return shm, shape, offsets
+
+
+def _init_worker(name, shape, offsets, config, top_list):
+    global _shm, _block, _offsets
+    settings.config = config
+    if top_list is not None:
+        settings.top_list = top_list
+    _shm = shared_memory.SharedMemory(name=name)
+    _block = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+    _offsets = offsets
+
+
+def _frame(code):
+    start, end = _offsets[code]
+    values = _block[start:end]
+    data = pd.DataFrame(values[:, 1:], columns=COLUMNS[1:])
+    data.insert(0, "日期", pd.to_datetime(values[:, 0], unit="D").date)
+    return bars.freeze(utils.index_by_date(data))
+
+
+def _evaluate_shard(stocks, strategies, end_date):
+    import work_flow
+
+    results = {strategy: [] for strategy in strategies}
+    filters = work_flow.stock_filters(strategies, end_date)
+    for stock in stocks:
+        for strategy in work_flow.evaluate_stock(stock, _frame(stock[0]), filters):
+            results[strategy].append(stock)
+    return results
+
+
+def evaluate(stocks, stocks_data, strategies, workers):
+    """
+    把stocks分片交给workers个子进程执行各策略，
+    按分片顺序合并结果，与单进程逐只股票判断的顺序一致
+    """
+    shm, shape, offsets = pack(stocks_data)
+    try:
+        chunk = max(1, -(-len(stocks) // (workers * 4)))
+        shards = [stocks[i : i + chunk] for i in range(0, len(stocks), chunk)]
+        end_date = settings.config["end_date"]
+        # 只有用到龙虎榜的策略启用时才获取
+        top_list = settings.top_list if registry.needs_top_list(strategies) else None
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(
+                shm.name,
+                shape,
+                offsets,
+                settings.config,
+                top_list,
+            ),
+        ) as executor:
+            shard_results = executor.map(
+                _evaluate_shard,
+                shards,
+                [strategies] * len(shards),
+                [end_date] * len(shards),
+            )
+            results = {strategy: [] for strategy in strategies}
+            for shard_result in shard_results:
+                for strategy, selected in shard_result.items():
+                    results[strategy].extend(selected)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    logging.info(
+        "多进程选股完成: {} 只股票, {} 个进程, {} 个分片".format(
+            len(stocks), workers, len(shards)
+        )
+    )
+    return results
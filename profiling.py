@@ -0,0 +1,294 @@
+# -*- encoding: UTF-8 -*-
+
+import ast
+import collections
+import contextlib
+import cProfile
+import datetime
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+
+import pandas as pd
+
+import settings
+
+# 性能分析模式（python main.py --profile 或配置 profile.enable）：
+#   - 每个策略单独用 cProfile 分析，sample 小于1时只分析一部分股票，全市场分析的开销也不大；
+#   - 后台线程每隔 interval 秒采样一次正在执行策略的线程的调用栈，生成火焰图用的折叠栈文件；
+#   - 在热点中查找已知的 pandas 低效写法（iterrows、逐个读取标量、复制DataFrame等）。
+# 结果写入 directory/<时间>/：<策略>.txt（热点和低效写法）、<策略>.prof（pstats）、
+# <策略>.folded（可用 flamegraph.pl 或 speedscope 打开）。
+# cProfile 同一时间只能分析一个调用，多线程选股时被分析的调用会依次执行；多进程选股时不分析
+
+# 已知的低效写法：(pandas 中的函数路径, 每只股票调用次数超过多少次时提示, 说明, 调用处的源码特征)。
+# 其中有 pandas 的内部类，分析时才查找，找不到（pandas 版本不同）的略过。
+# 只统计项目代码直接发起的调用，pandas 内部的调用（如 tail() 里的 copy）不算
+ANTI_PATTERNS = [
+    (
+        "DataFrame.iterrows",
+        0,
+        "iterrows 逐行遍历，改用列的 NumPy 数组",
+        r"\.iterrows\(",
+    ),
+    (
+        "core.indexing._LocationIndexer.__getitem__",
+        3,
+        ".loc/.iloc 逐个读取，改用 to_numpy() 后按位置取值",
+        r"\.i?loc\[",
+    ),
+    (
+        "core.indexing._ScalarAccessIndexer.__getitem__",
+        3,
+        ".at/.iat 逐个读取标量",
+        r"\.i?at\[",
+    ),
+    ("DataFrame.copy", 0, "DataFrame.copy 复制数据，K线只读，不需要复制", r"\.copy\("),
+    ("DataFrame.apply", 0, "DataFrame.apply 逐行调用 Python 函数", r"\.apply\("),
+]
+
+# 低效写法累计耗时占策略耗时的比例超过该值时才提示
+HOT_SHARE = 0.02
+TOP = 30
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# 只读包装，查找调用位置时跳过
+WRAPPERS = {os.path.join(PROJECT_DIR, "bars.py")}
+
+_profiler = None
+
+
+def _label(code):
+    return "{}:{}".format(
+        os.path.basename(code.co_filename), getattr(code, "co_qualname", code.co_name)
+    )
+
+
+class Profiler:
+    def __init__(self, sample=1.0, interval=0.005):
+        # sample为0时不用cProfile分析，只采样调用栈
+        self.every = max(1, round(1 / sample)) if sample > 0 else 0
+        self.interval = interval
+        self.calls = collections.Counter()
+        self.profiled = collections.Counter()
+        self.profiles = {}
+        self.stacks = collections.defaultdict(collections.Counter)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        self._sampler = threading.Thread(
+            target=self._sample, name="profiling-sampler", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def call(self, strategy, func, *args, **kwargs):
+        with self._lock:
+            self.calls[strategy] += 1
+            # 每 every 次调用分析一次，从第一次开始
+            profile = self.every and (self.calls[strategy] - 1) % self.every == 0
+        thread = threading.get_ident()
+        self._active[thread] = strategy
+        try:
+            if not profile:
+                return func(*args, **kwargs)
+            with self._profile_lock:
+                self.profiled[strategy] += 1
+                if strategy not in self.profiles:
+                    self.profiles[strategy] = cProfile.Profile()
+                return self.profiles[strategy].runcall(func, *args, **kwargs)
+        finally:
+            del self._active[thread]
+
+    def _sample(self):
+        """采样正在执行策略的线程的调用栈，只保留 call 以内的部分"""
+        boundary = Profiler.call.__code__
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for thread, strategy in list(self._active.items()):
+                frame = frames.get(thread)
+                stack = []
+                while frame is not None and frame.f_code is not boundary:
+                    if frame.f_code.co_filename != cProfile.__file__:
+                        stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                if frame is not None and stack:
+                    self.stacks[strategy][";".join(reversed(stack))] += 1
+
+    def report(self, strategy):
+        """热点报告：低效写法，以及按自身耗时和累计耗时排序的函数"""
+        stats = pstats.Stats(self.profiles[strategy])
+        output = io.StringIO()
+        output.write(
+            "策略: {}  判断股票数: {}  cProfile分析: {}\n\n".format(
+                strategy, self.calls[strategy], self.profiled[strategy]
+            )
+        )
+        findings = anti_patterns(stats, self.profiled[strategy])
+        output.write("低效写法:\n")
+        for finding in findings or ["无"]:
+            output.write("  {}\n".format(finding))
+        for sort in ("tottime", "cumulative"):
+            output.write("\n按 {} 排序:\n".format(sort))
+            stats.stream = output
+            stats.sort_stats(sort).print_stats(TOP)
+        return output.getvalue(), findings
+
+    def write(self, path):
+        os.makedirs(path, exist_ok=True)
+        for strategy in sorted(set(self.profiles) | set(self.stacks)):
+            name = strategy.replace(os.sep, "_")
+            if strategy in self.profiles:
+                text, findings = self.report(strategy)
+                with open(
+                    os.path.join(path, name + ".txt"), "w", encoding="utf-8"
+                ) as f:
+                    f.write(text)
+                self.profiles[strategy].dump_stats(os.path.join(path, name + ".prof"))
+                for finding in findings:
+                    logging.warning("{}: {}".format(strategy, finding))
+            with open(os.path.join(path, name + ".folded"), "w", encoding="utf-8") as f:
+                for stack, count in sorted(self.stacks[strategy].items()):
+                    f.write("{} {}\n".format(stack, count))
+        logging.info("性能分析结果已写入 {}".format(path))
+
+
+def _resolve(path):
+    """按路径查找 pandas 中的函数，找不到时返回None"""
+    func = pd
+    try:
+        for name in path.split("."):
+            func = getattr(func, name)
+        return func.__code__
+    except AttributeError:
+        logging.debug("pandas 中没有 {}，不检查这种写法".format(path))
+        return None
+
+
+def anti_patterns(stats, stocks):
+    """在 pstats 结果中查找已知的低效写法，返回提示列表"""
+    total = stats.total_tt or 1e-9
+    findings = []
+    for path, per_stock, message, pattern in ANTI_PATTERNS:
+        code = _resolve(path)
+        if code is None:
+            continue
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        if key not in stats.stats:
+            continue
+        callers = _project_callers(stats, key)
+        calls = round(sum(nc for nc, _ in callers.values()))
+        cumulative = sum(ct for _, ct in callers.values())
+        if calls <= per_stock * max(stocks, 1) or cumulative / total < HOT_SHARE:
+            continue
+        sites = sorted(
+            "{}:{}({})".format(os.path.relpath(file, PROJECT_DIR), line, name)
+            for file, first, name in callers
+            for line in _call_lines(file, first, pattern)
+        )
+        findings.append(
+            "{}：调用{}次，累计{:.3f}秒（占{:.0%}），位置: {}".format(
+                message, calls, cumulative, cumulative / total, ", ".join(sites) or "-"
+            )
+        )
+    return findings
+
+
+def _project_callers(stats, key):
+    """直接调用 key 的项目代码及其(调用次数, 累计耗时)。
+
+    经过只读包装（WRAPPERS）的调用按包装被各处调用的次数分摊给调用包装的项目代码，
+    pandas 内部发起的调用不计入
+    """
+    found = collections.defaultdict(lambda: [0.0, 0.0])
+    pending = [(key, None, {key})]
+    while pending:
+        callee, amount, path = pending.pop()
+        callers = stats.stats.get(callee, (None,) * 5)[4] or {}
+        for caller, (_, nc, _, ct) in callers.items():
+            if amount is not None:
+                share = nc / (stats.stats[callee][1] or 1)
+                nc, ct = amount[0] * share, amount[1] * share
+            file = os.path.abspath(caller[0])
+            if file in WRAPPERS:
+                if caller not in path:
+                    pending.append((caller, (nc, ct), path | {caller}))
+            elif file.startswith(PROJECT_DIR):
+                found[caller][0] += nc
+                found[caller][1] += ct
+    return {caller: tuple(value) for caller, value in found.items()}
+
+
+def _call_lines(file, first, pattern):
+    """函数（从 first 行开始）中符合 pattern 的行号，找不到时返回函数定义行"""
+    try:
+        with open(file, encoding="utf-8") as f:
+            source = f.read()
+        tree = ast.parse(source)
+    except (OSError, SyntaxError, ValueError):
+        return [first]
+    last = first
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            decorators = getattr(node, "decorator_list", [])
+            if first in [node.lineno] + [d.lineno for d in decorators]:
+                last = max(last, node.end_lineno)
+    regex = re.compile(pattern)
+    lines = source.splitlines()[first - 1 : last]
+    return [first + i for i, text in enumerate(lines) if regex.search(text)] or [first]
+
+
+def directory():
+    """性能分析结果目录，相对路径以项目根目录为基准"""
+    path = (settings.config.get("profile") or {}).get("directory") or "profile"
+    if not os.path.isabs(path):
+        path = os.path.join(PROJECT_DIR, path)
+    return path
+
+
+def enabled():
+    return bool((settings.config.get("profile") or {}).get("enable"))
+
+
+@contextlib.contextmanager
+def session(path=None):
+    """在 with 块内分析各策略，结束后写入报告；没有启用性能分析时什么也不做"""
+    global _profiler
+    if not enabled():
+        yield None
+        return
+    config = settings.config.get("profile") or {}
+    _profiler = Profiler(config.get("sample", 1.0), config.get("interval", 0.005))
+    _profiler.start()
+    start = time.perf_counter()
+    try:
+        yield _profiler
+    finally:
+        _profiler.stop()
+        profiler, _profiler = _profiler, None
+        logging.info("性能分析耗时 {:.1f} 秒".format(time.perf_counter() - start))
+        path = path or os.path.join(
+            directory(), datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        )
+        profiler.write(path)
+
+
+def call(strategy, func, *args, **kwargs):
+    """调用策略；性能分析期间经过 Profiler 记录"""
+    profiler = _profiler
+    if profiler is None:
+        return func(*args, **kwargs)
+    return profiler.call(strategy, func, *args, **kwargs)
@@ -2,19 +2,14 @@
 
 import logging
 
-from wxpusher import WxPusher
-
+import notifier
 import settings
 
 
 def push(msg):
+    # 只放入推送队列，由后台线程合并、限速后发送，不等待发送完成
     if settings.config["push"]["enable"]:
-        response = WxPusher.send_message(
-            msg,
-            topic_ids=[settings.config["push"]["topic_id"]],
-            token=settings.config["push"]["wxpusher_token"],
-        )
-        print(response)
+        notifier.get().submit(msg)
     logging.info(msg)
 
 
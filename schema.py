@@ -0,0 +1,58 @@
+# -*- encoding: UTF-8 -*-
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+# 行情数据的紧凑格式：只保留策略读取的列，价格和涨跌幅为float32，
+# 日期为1970-01-01起的int32天数，成交量（手）为int64。
+# 复权和涨跌幅在压缩之前按float64计算，指标计算时再转回float64
+
+COLUMNS = {
+    "日期": np.int32,
+    "开盘": np.float32,
+    "收盘": np.float32,
+    "最高": np.float32,
+    "最低": np.float32,
+    "成交量": np.int64,
+    "p_change": np.float32,
+}
+
+
+def compact(data):
+    """转换为紧凑格式，返回新的DataFrame"""
+    result = pd.DataFrame(
+        {
+            column: data[column].to_numpy(dtype=dtype)
+            for column, dtype in COLUMNS.items()
+            if column != "日期"
+        },
+        index=data.index,
+    )
+    result.insert(0, "日期", utils.day_numbers(data["日期"]))
+    return result
+
+
+def nbytes(data):
+    """DataFrame占用的内存（含索引和Python对象）"""
+    return int(data.memory_usage(index=True, deep=True).sum())
+
+
+def memory_report(stocks_data, compacted):
+    """
+    压缩前后的内存占用：stocks_data 与 compacted 为同一批股票压缩前后的
+    {(代码, 名称): DataFrame}，返回每只股票平均字节数和全部股票的字节数
+    """
+    before = sum(nbytes(data) for data in stocks_data.values())
+    after = sum(nbytes(data) for data in compacted.values())
+    count = len(stocks_data)
+    return {
+        "stocks": count,
+        "bars": sum(len(data) for data in stocks_data.values()),
+        "before_bytes": before,
+        "after_bytes": after,
+        "before_bytes_per_stock": before / count if count else 0.0,
+        "after_bytes_per_stock": after / count if count else 0.0,
+        "ratio": after / before if before else 0.0,
+    }
@@ -1,22 +1,67 @@
 # -*- encoding: UTF-8 -*-
+import datetime
+import json
+import logging
 import os
+import threading
 
-import akshare as ak
 import yaml
 
+# 龙虎榜（top_list）只有部分策略使用，第一次访问 settings.top_list 时才获取，
+# 当天的结果保存在 data_dir/top_list.json，同一天内再次启动不再访问网络。
+# 各模块都会导入 settings，所以 datasource、store 在用到时才导入，导入 settings 本身很快
+_top_list = None
+_top_list_lock = threading.Lock()
+
 
 def init():
     global config
-    global top_list
     root_dir = os.path.dirname(os.path.abspath(__file__))  # This is your Project Root
     config_file = os.path.join(root_dir, "config.yaml")
     with open(config_file, "r") as file:
         config = yaml.safe_load(file)
-    df = ak.stock_lhb_stock_statistic_em(symbol="近三月")
-    mask = df["买方机构次数"] > 1  # 机构买入次数大于1
-    df = df.loc[mask]
-    top_list = df["代码"].tolist()
 
 
 def config():
     return config
+
+
+def __getattr__(name):
+    if name == "top_list":
+        return load_top_list()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def top_list_file():
+    import store
+
+    return os.path.join(store.root(), "top_list.json")
+
+
+def load_top_list(today=None):
+    """当天的龙虎榜股票代码：先读内存，再读本地文件，都不是当天的才重新获取"""
+    import datasource
+
+    global _top_list
+    today = (today or datetime.date.today()).isoformat()
+    with _top_list_lock:
+        if _top_list is not None and _top_list[0] == today:
+            return _top_list[1]
+
+        path = top_list_file()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                cached = json.load(file)
+            if cached.get("date") == today:
+                _top_list = (today, cached["codes"])
+                return _top_list[1]
+
+        df = datasource.call("stock_lhb_stock_statistic_em", symbol="近三月")
+        mask = df["买方机构次数"] > 1  # 机构买入次数大于1
+        codes = df.loc[mask, "代码"].tolist()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"date": today, "codes": codes}, file, ensure_ascii=False)
+        logging.info("龙虎榜已更新: {} 只股票".format(len(codes)))
+        _top_list = (today, codes)
+        return codes
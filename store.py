@@ -0,0 +1,203 @@
+# -*- encoding: UTF-8 -*-
+
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import settings
+
+# 本地行情库：按代码分区存放在 data_dir 下
+#   raw/<code>.parquet      不复权日线
+#   factors/<code>.parquet  后复权因子（日期, hfq_factor），自该日期起生效
+#   names.json              代码 -> 股票名称，每日选股时按快照更新
+#   requested.json          代码 -> 下载过的最早起始日期（YYYYMMDD），上市晚于该日期的股票本地历史已经完整
+# 前复权、后复权价格都在读取时由不复权价格乘以复权因子得到，
+# 除权除息只需要刷新很小的因子表，不需要重新下载全部历史行情
+
+PRICE_COLUMNS = ["开盘", "收盘", "最高", "最低"]
+
+# 同一只股票的读改写和写入按代码加锁：超时的下载线程可能与后来的下载同时写同一个文件
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _lock(code, kind):
+    with _locks_lock:
+        return _locks.setdefault((kind, code), threading.RLock())
+
+
+def root():
+    """本地数据目录，相对路径以项目根目录为基准"""
+    data_dir = settings.config.get("data_dir") or "data"
+    if not os.path.isabs(data_dir):
+        project_dir = os.path.dirname(os.path.abspath(__file__))
+        data_dir = os.path.join(project_dir, data_dir)
+    return data_dir
+
+
+def path(code, kind="raw"):
+    return os.path.join(root(), kind, "{}.parquet".format(code))
+
+
+def load(code, columns=None, kind="raw"):
+    """读取本地保存的数据，没有数据时返回None"""
+    file = path(code, kind)
+    if not os.path.exists(file):
+        return None
+    try:
+        return pd.read_parquet(file, columns=columns)
+    except Exception as exc:
+        logging.error("读取本地数据{}失败: {}".format(file, exc))
+        return None
+
+
+def codes():
+    """本地库中所有股票代码"""
+    directory = os.path.join(root(), "raw")
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name[: -len(".parquet")]
+        for name in os.listdir(directory)
+        if name.endswith(".parquet")
+    )
+
+
+def last_date(code):
+    """本地最后一根K线的日期，没有数据时返回None"""
+    data = load(code, columns=["日期"])
+    if data is None or data.empty:
+        return None
+    return data["日期"].iloc[-1]
+
+
+def append(code, new_data, data=None):
+    """追加新K线，与已有数据按日期去重（以新数据为准）后原子写回"""
+    with _lock(code, "raw"):
+        if data is None:
+            data = load(code)
+        if data is not None and not data.empty:
+            data = pd.concat([data, new_data], ignore_index=True)
+            data = data.drop_duplicates(subset="日期", keep="last")
+            data = data.sort_values("日期", ignore_index=True)
+        else:
+            data = new_data.reset_index(drop=True)
+
+        write(code, data)
+    return data
+
+
+def write(code, data, kind="raw"):
+    """先写临时文件再替换，避免中断时留下损坏的数据文件；临时文件名按进程和线程区分"""
+    file = path(code, kind)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    tmp_file = "{}.{}.{}.tmp".format(file, os.getpid(), threading.get_ident())
+    with _lock(code, kind):
+        try:
+            data.to_parquet(tmp_file, index=False)
+            os.replace(tmp_file, file)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+
+def names():
+    """本地保存的 {代码: 名称}，没有时返回空字典"""
+    file = os.path.join(root(), "names.json")
+    if not os.path.exists(file):
+        return {}
+    with open(file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_names(stocks):
+    """按 [(代码, 名称), ...] 更新保存的股票名称，保留快照中没有的旧代码"""
+    saved = names()
+    saved.update((code, name) for code, name in stocks)
+    file = os.path.join(root(), "names.json")
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    tmp_file = "{}.{}.{}.tmp".format(file, os.getpid(), threading.get_ident())
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(saved, f, ensure_ascii=False)
+    os.replace(tmp_file, file)
+
+
+def requested_from(code):
+    """下载过该股票的最早起始日期（YYYYMMDD），没有记录时返回None"""
+    file = os.path.join(root(), "requested.json")
+    if not os.path.exists(file):
+        return None
+    with open(file, "r", encoding="utf-8") as f:
+        return json.load(f).get(code)
+
+
+def record_requested(code, start_date):
+    """记录从start_date起下载过该股票的历史，只保留最早的日期"""
+    file = os.path.join(root(), "requested.json")
+    with _lock("requested", "meta"):
+        requested = {}
+        if os.path.exists(file):
+            with open(file, "r", encoding="utf-8") as f:
+                requested = json.load(f)
+        if code in requested and requested[code] <= start_date:
+            return
+        requested[code] = start_date
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        tmp_file = "{}.{}.{}.tmp".format(file, os.getpid(), threading.get_ident())
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(requested, f)
+        os.replace(tmp_file, file)
+
+
+def load_factors(code):
+    return load(code, kind="factors")
+
+
+def write_factors(code, factors):
+    write(code, factors.reset_index(drop=True), kind="factors")
+
+
+def has_ex_rights(data, new_data):
+    """
+    新K线的昨收（收盘-涨跌额）与本地前一天收盘不一致，说明期间发生了除权除息
+    """
+    if data is None or data.empty or "涨跌额" not in new_data:
+        return False
+    # 补齐历史时new_data从本地最后一天之前开始，先按日期排好序；
+    # 本地最后一天及之前的除权已经反映在当时取得的复权因子中，只检查之后的K线
+    last = data["日期"].iloc[-1]
+    merged = pd.concat([data.tail(1), new_data], ignore_index=True)
+    merged = merged.drop_duplicates(subset="日期", keep="last").sort_values("日期")
+    prev_close = merged["收盘"].shift(1)
+    implied_prev_close = merged["收盘"] - merged["涨跌额"]
+    changed = (implied_prev_close - prev_close).abs() > 0.011
+    return bool((changed & (merged["日期"] > last)).any())
+
+
+def adjust(data, factors, method="qfq"):
+    """
+    按复权因子计算复权价格：后复权为不复权价格乘以当日因子，
+    前复权再除以最后一根K线的因子
+    """
+    if method not in ("qfq", "hfq") or factors is None or factors.empty:
+        return data
+
+    factor_dates = pd.to_datetime(factors["日期"]).values
+    factor_values = factors["hfq_factor"].to_numpy(dtype=np.float64)
+    index = np.searchsorted(
+        factor_dates, pd.to_datetime(data["日期"]).values, side="right"
+    )
+    # 早于第一条因子记录的K线使用第一条因子
+    factor = factor_values[np.clip(index - 1, 0, None)]
+    if method == "qfq":
+        factor = factor / factor[-1]
+
+    data = data.copy()
+    data[PRICE_COLUMNS] = (
+        data[PRICE_COLUMNS].to_numpy(dtype=np.float64) * factor[:, None]
+    )
+    return data
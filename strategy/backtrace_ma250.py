@@ -3,9 +3,7 @@
 import logging
 from datetime import timedelta
 
-import pandas as pd
-import talib as tl
-
+import indicators
 import utils
 
 # 使用示例：result = backtrace_ma250.check(code_name, data, end_date=end_date)
@@ -19,59 +17,47 @@ def check(code_name, data, end_date=None, threshold=60):
     if len(data) < 250:
         logging.debug("{0}:样本小于250天...\n".format(code_name))
         return
-    data["ma250"] = pd.Series(tl.MA(data["收盘"].values, 250), index=data.index.values)
-
-    begin_date = data.iloc[0].日期
-    if end_date is not None:
-        if end_date < begin_date:  # 该股票在end_date时还未上市
-            logging.debug("{}在{}时还未上市".format(code_name, end_date))
-            return False
+    ma250 = indicators.ma(code_name, data, "收盘", 250)
 
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    data = utils.truncate_to(data, end_date)
+    if data.empty:  # 该股票在end_date时还未上市
+        logging.debug("{}在{}时还未上市".format(code_name, end_date))
+        return False
 
+    end = len(data)
     data = data.tail(n=threshold)
+    ma250 = ma250[end - len(data) : end]
+    close = data["收盘"].to_numpy()
 
-    last_close = data.iloc[-1]["收盘"]
-
-    # 区间最低点
-    lowest_row = data.iloc[-1]
-    # 区间最高点
-    highest_row = data.iloc[-1]
-
-    # 近期低点
-    recent_lowest_row = data.iloc[-1]
+    # 区间最低点、最高点、近期低点在窗口中的位置
+    lowest = highest = recent_lowest = len(data) - 1
 
     # 计算区间最高、最低价格
-    for index, row in data.iterrows():
-        if row["收盘"] > highest_row["收盘"]:
-            highest_row = row
-        elif row["收盘"] < lowest_row["收盘"]:
-            lowest_row = row
-
+    for position in range(len(data)):
+        if close[position] > close[highest]:
+            highest = position
+        elif close[position] < close[lowest]:
+            lowest = position
+
+    lowest_row = data.iloc[lowest]
+    highest_row = data.iloc[highest]
     if lowest_row["成交量"] == 0 or highest_row["成交量"] == 0:
         return False
 
-    data_front = data.loc[(data["日期"] < highest_row["日期"])]
-    data_end = data.loc[(data["日期"] >= highest_row["日期"])]
-
-    if data_front.empty:
+    # 以最高点分为前后两段
+    if highest == 0:
         return False
     # 前半段由年线以下向上突破
-    if not (
-        data_front.iloc[0]["收盘"] < data_front.iloc[0]["ma250"]
-        and data_front.iloc[-1]["收盘"] > data_front.iloc[-1]["ma250"]
-    ):
+    if not (close[0] < ma250[0] and close[highest - 1] > ma250[highest - 1]):
         return False
 
-    if not data_end.empty:
-        # 后半段必须在年线以上运行（回踩年线）
-        for index, row in data_end.iterrows():
-            if row["收盘"] < row["ma250"]:
-                return False
-            if row["收盘"] < recent_lowest_row["收盘"]:
-                recent_lowest_row = row
+    # 后半段必须在年线以上运行（回踩年线）
+    for position in range(highest, len(data)):
+        if close[position] < ma250[position]:
+            return False
+        if close[position] < close[recent_lowest]:
+            recent_lowest = position
+    recent_lowest_row = data.iloc[recent_lowest]
 
     date_diff = utils.ensure_date(recent_lowest_row["日期"]) - utils.ensure_date(
         highest_row["日期"]
@@ -2,41 +2,51 @@
 
 import logging
 
-import pandas as pd
-import talib as tl
+import numpy as np
 
+import indicators
+import utils
 from strategy import enter
 
 
 # 平台突破策略
 def check(code_name, data, end_date=None, threshold=60):
-    origin_data = data
     if len(data) < threshold:
         logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
         return
-    data["ma60"] = pd.Series(tl.MA(data["收盘"].values, 60), index=data.index.values)
 
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
-
-    data = data.tail(n=threshold)
-
-    breakthrough_row = None
-
-    for index, row in data.iterrows():
-        if row["开盘"] < row["ma60"] <= row["收盘"]:
-            if enter.check_volume(code_name, origin_data, row["日期"], threshold):
-                breakthrough_row = row
-
-    if breakthrough_row is None:
-        return False
-
-    data_front = data.loc[(data["日期"] < breakthrough_row["日期"])]
-    data_end = data.loc[(data["日期"] >= breakthrough_row["日期"])]
-
-    for index, row in data_front.iterrows():
-        if not (-0.05 < (row["ma60"] - row["收盘"]) / row["ma60"] < 0.2):
-            return False
-
-    return True
+    return utils.signal_at(data, check_series(code_name, data, threshold), end_date)
+
+
+def check_series(code_name, data, threshold=60):
+    """
+    check 在每个交易日的结果，返回与data等长的布尔数组：
+    最近threshold天内最后一次放量上穿MA60之前，收盘价都在MA60的-20%到5%之间
+    """
+
+    def compute():
+        if len(data) < threshold:
+            return np.zeros(len(data), dtype=bool)
+        ma60 = indicators.ma(code_name, data, "收盘", 60)
+        open_ = data["开盘"].to_numpy(dtype=np.float64)
+        close = data["收盘"].to_numpy(dtype=np.float64)
+        index = np.arange(len(data))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cross = (open_ < ma60) & (ma60 <= close)
+            cross &= enter.check_volume_series(code_name, data, threshold)
+            deviation = (ma60 - close) / ma60
+            platform = (-0.05 < deviation) & (deviation < 0.2)
+
+        # 截至每天最后一次突破的位置，以及窗口起点
+        last_cross = np.maximum.accumulate(np.where(cross, index, -1))
+        start = np.maximum(index - threshold + 1, 0)
+        found = last_cross >= start
+        # 窗口起点到突破日之前不在平台内的天数
+        outside = np.concatenate(([0], np.cumsum(~platform)))
+        breakthrough = np.where(found, last_cross, start)
+        return found & (outside[breakthrough] == outside[start])
+
+    return indicators.get(
+        code_name, "breakthrough_platform.check", (threshold,), data, compute
+    )
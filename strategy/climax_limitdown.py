@@ -2,8 +2,11 @@
 
 import logging
 
-import pandas as pd
-import talib as tl
+import numpy as np
+
+import indicators
+import utils
+from strategy import enter
 
 
 def check(code_name, data, end_date=None, threshold=60):
@@ -11,43 +14,66 @@ def check(code_name, data, end_date=None, threshold=60):
         logging.debug("{0}:样本小于250天...\n".format(code_name))
         return False
 
-    data["vol_ma5"] = pd.Series(
-        tl.MA(data["成交量"].values, 5), index=data.index.values
+    end = utils.end_index(data, end_date)
+    if not utils.signal_at(data, check_series(code_name, data, threshold), end_date):
+        return False
+    last = data.iloc[end - 1]
+    vol_ratio = last["成交量"] / indicators.ma(code_name, data, "成交量", 5)[end - 2]
+    msg = "*{0}\n量比：{1:.2f}\t跌幅：{2}%\n".format(
+        code_name, vol_ratio, last["p_change"]
     )
+    logging.debug(msg)
+    return True
 
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
-    if data.empty:
-        return False
-    p_change = data.iloc[-1]["p_change"]
-    if p_change > -9.5:
-        return False
 
-    data = data.tail(n=threshold + 1)
-    if len(data) < threshold + 1:
-        logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
-        return False
+def check_series(code_name, data, threshold=60):
+    """
+    check 在每个交易日的结果，返回与data等长的布尔数组：
+    跌幅不小于9.5%、成交额不低于2亿，且成交量不低于前一天5日均量的4倍
+    """
 
-    # 最后一天收盘价
-    last_close = data.iloc[-1]["收盘"]
-    # 最后一天成交量
-    last_vol = data.iloc[-1]["成交量"]
+    def compute():
+        if len(data) < threshold:
+            return np.zeros(len(data), dtype=bool)
+        last_vol, prev_vol_ma5 = enter.volume_ratio_inputs(code_name, data)
+        close = data["收盘"].to_numpy(dtype=np.float64)
+        p_change = data["p_change"].to_numpy(dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (
+                (np.arange(len(data)) >= threshold)
+                & ~(p_change > -9.5)
+                & ~(close * last_vol * 100 < 200000000)
+                & (last_vol / prev_vol_ma5 >= 4)
+            )
 
-    amount = last_close * last_vol * 100
+    return indicators.get(
+        code_name, "climax_limitdown.check", (threshold,), data, compute
+    )
 
-    # 成交额不低于2亿
-    if amount < 200000000:
-        return False
 
-    data = data.head(n=threshold)
+def check_panel(market, end_date=None, threshold=60):
+    """check 的面板版本，一次判断全部股票，返回布尔数组"""
+    end_index = market.date_index(end_date)
+    count = market.bar_count(end_index)
+    p_change = market.tail("p_change", 1, end_index)[:, -1]
+    close = market.tail("收盘", 1, end_index)[:, -1]
+    # 最后一天之前的5日均量
+    volume = market.tail("成交量", 6, end_index)
+    last_vol = volume[:, -1]
+    mean_vol = volume[:, :-1].mean(axis=1)
 
-    mean_vol = data.iloc[-1]["vol_ma5"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (
+            (market.bar_count() >= threshold)
+            & (count >= threshold + 1)
+            & ~(p_change > -9.5)
+            & ~(close * last_vol * 100 < 200000000)
+            & (last_vol / mean_vol >= 4)
+        )
 
-    vol_ratio = last_vol / mean_vol
-    if vol_ratio >= 4:
-        msg = "*{0}\n量比：{1:.2f}\t跌幅：{2}%\n".format(code_name, vol_ratio, p_change)
-        logging.debug(msg)
-        return True
-    else:
-        return False
+
+def check_snapshot(spot):
+    """check 在全市场快照上的必要条件：当天跌幅不小于9.5%、成交额不低于2亿"""
+    return ~(spot["涨跌幅"] > -9.5 + enter.SNAPSHOT_SLACK) & ~(
+        spot["最新价"] * spot["成交量"] * 100 < 200000000
+    )
@@ -2,17 +2,20 @@
 
 import logging
 
-import pandas as pd
-import talib as tl
+import numpy as np
+
+import indicators
+import utils
+
+# 快照的涨跌幅按四舍五入后的价格计算，与K线算出的p_change有细微差别
+SNAPSHOT_SLACK = 0.1
 
 
 # TODO 真实波动幅度（ATR）放大
 # 最后一个交易日收市价从下向上突破指定区间内最高价
 def check_breakthrough(code_name, data, end_date=None, threshold=30):
     max_price = 0
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    data = utils.truncate_to(data, end_date)
     data = data.tail(n=threshold + 1)
     if len(data) < threshold + 1:
         logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
@@ -45,17 +48,10 @@ def check_ma(code_name, data, end_date=None, ma_days=250):
         logging.debug("{0}:样本小于{1}天...\n".format(code_name, ma_days))
         return False
 
-    ma_tag = "ma" + str(ma_days)
-    data[ma_tag] = pd.Series(
-        tl.MA(data["收盘"].values, ma_days), index=data.index.values
-    )
-
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    end = utils.end_index(data, end_date)
 
-    last_close = data.iloc[-1]["收盘"]
-    last_ma = data.iloc[-1][ma_tag]
+    last_close = data.iloc[end - 1]["收盘"]
+    last_ma = indicators.ma(code_name, data, "收盘", ma_days)[end - 1]
     if last_close > last_ma:
         return True
     else:
@@ -79,48 +75,82 @@ def check_new(code_name, data, end_date=None, threshold=60):
 #   2019-01-29 新城控股
 #   2017-11-16 保利地产
 def check_volume(code_name, data, end_date=None, threshold=60):
-    if len(data) < threshold:
-        logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
+    end = utils.end_index(data, end_date)
+    if not utils.signal_at(
+        data, check_volume_series(code_name, data, threshold), end_date
+    ):
         return False
-    data["vol_ma5"] = pd.Series(
-        tl.MA(data["成交量"].values, 5), index=data.index.values
+    last = data.iloc[end - 1]
+    vol_ratio = last["成交量"] / indicators.ma(code_name, data, "成交量", 5)[end - 2]
+    msg = "*{0}\n量比：{1:.2f}\t涨幅：{2}%\n".format(
+        code_name, vol_ratio, last["p_change"]
     )
+    logging.debug(msg)
+    return True
 
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
-    if data.empty:
-        return False
-    p_change = data.iloc[-1]["p_change"]
-    if p_change < 2 or data.iloc[-1]["收盘"] < data.iloc[-1]["开盘"]:
-        return False
-    data = data.tail(n=threshold + 1)
-    if len(data) < threshold + 1:
-        logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
-        return False
-
-    # 最后一天收盘价
-    last_close = data.iloc[-1]["收盘"]
-    # 最后一天成交量
-    last_vol = data.iloc[-1]["成交量"]
-
-    amount = last_close * last_vol * 100
-
-    # 成交额不低于2亿
-    if amount < 200000000:
-        return False
 
-    data = data.head(n=threshold)
+def check_volume_series(code_name, data, threshold=60):
+    """
+    check_volume 在每个交易日的结果，返回与data等长的布尔数组：
+    涨幅不低于2%、收阳、成交额不低于2亿，且成交量不低于前一天5日均量的2倍
+    """
+
+    def compute():
+        if len(data) < threshold:
+            return np.zeros(len(data), dtype=bool)
+        last_vol, prev_vol_ma5 = volume_ratio_inputs(code_name, data)
+        close = data["收盘"].to_numpy(dtype=np.float64)
+        open_ = data["开盘"].to_numpy(dtype=np.float64)
+        p_change = data["p_change"].to_numpy(dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (
+                (np.arange(len(data)) >= threshold)
+                & ~(p_change < 2)
+                & ~(close < open_)
+                & ~(close * last_vol * 100 < 200000000)
+                & (last_vol / prev_vol_ma5 >= 2)
+            )
+
+    return indicators.get(code_name, "enter.check_volume", (threshold,), data, compute)
+
+
+def volume_ratio_inputs(code_name, data):
+    """当天成交量，以及前一天的5日均量（量比的分母）"""
+    vol_ma5 = indicators.ma(code_name, data, "成交量", 5)
+    prev_vol_ma5 = np.concatenate(([np.nan], vol_ma5[:-1]))
+    return data["成交量"].to_numpy(dtype=np.float64), prev_vol_ma5
+
+
+def check_volume_panel(market, end_date=None, threshold=60):
+    """check_volume 的面板版本，一次判断全部股票，返回布尔数组"""
+    end_index = market.date_index(end_date)
+    count = market.bar_count(end_index)
+    p_change = market.tail("p_change", 1, end_index)[:, -1]
+    open_ = market.tail("开盘", 1, end_index)[:, -1]
+    close = market.tail("收盘", 1, end_index)[:, -1]
+    # 最后一天之前的5日均量
+    volume = market.tail("成交量", 6, end_index)
+    last_vol = volume[:, -1]
+    mean_vol = volume[:, :-1].mean(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (
+            (market.bar_count() >= threshold)
+            & (count >= threshold + 1)
+            & ~(p_change < 2)
+            & ~(close < open_)
+            & ~(close * last_vol * 100 < 200000000)
+            & (last_vol / mean_vol >= 2)
+        )
 
-    mean_vol = data.iloc[-1]["vol_ma5"]
 
-    vol_ratio = last_vol / mean_vol
-    if vol_ratio >= 2:
-        msg = "*{0}\n量比：{1:.2f}\t涨幅：{2}%\n".format(code_name, vol_ratio, p_change)
-        logging.debug(msg)
-        return True
-    else:
-        return False
+def check_volume_snapshot(spot):
+    """check_volume 在全市场快照上的必要条件：当天涨幅不低于2%、收阳、成交额不低于2亿"""
+    return (
+        ~(spot["涨跌幅"] < 2 - SNAPSHOT_SLACK)
+        & ~(spot["最新价"] < spot["今开"])
+        & ~(spot["最新价"] * spot["成交量"] * 100 < 200000000)
+    )
 
 
 # 量比大于3.0
@@ -129,12 +159,9 @@ def check_continuous_volume(
 ):
     stock = code_name[0]
     name = code_name[1]
-    data["vol_ma5"] = pd.Series(
-        tl.MA(data["成交量"].values, 5), index=data.index.values
-    )
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    vol_ma5 = indicators.ma(code_name, data, "成交量", 5)
+    data = utils.truncate_to(data, end_date)
+    end = len(data)
     data = data.tail(n=threshold + window_size)
     if len(data) < threshold + window_size:
         logging.debug(
@@ -150,7 +177,7 @@ def check_continuous_volume(
     data_front = data.head(n=threshold)
     data_end = data.tail(n=window_size)
 
-    mean_vol = data_front.iloc[-1]["vol_ma5"]
+    mean_vol = vol_ma5[end - window_size - 1]
 
     for index, row in data_end.iterrows():
         if float(row["成交量"]) / mean_vol < 3.0:
@@ -2,6 +2,7 @@
 import logging
 
 import settings
+import utils
 
 
 # 高而窄的旗形
@@ -10,9 +11,7 @@ def check(code_name, data, end_date=None, threshold=60):
     if code_name[0] not in settings.top_list:
         return False
 
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    data = utils.truncate_to(data, end_date)
     data = data.tail(n=threshold)
 
     if len(data) < threshold:
@@ -37,3 +36,8 @@ def check(code_name, data, end_date=None, threshold=60):
             previous_p_change = 0.0
 
     return False
+
+
+def check_snapshot(spot):
+    """check 在全市场快照上的必要条件：龙虎榜上有机构买入"""
+    return spot["代码"].isin(settings.top_list)
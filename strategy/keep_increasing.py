@@ -2,8 +2,11 @@
 
 import logging
 
-import pandas as pd
-import talib as tl
+import numpy as np
+
+import indicators
+import panel
+import utils
 
 
 # 持续上涨（MA30向上）
@@ -11,24 +14,53 @@ def check(code_name, data, end_date=None, threshold=30):
     if len(data) < threshold:
         logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
         return
-    data["ma30"] = pd.Series(tl.MA(data["收盘"].values, 30), index=data.index.values)
 
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    return utils.signal_at(data, check_series(code_name, data, threshold), end_date)
+
+
+def check_series(code_name, data, threshold=30):
+    """check 在每个交易日的结果，返回与data等长的布尔数组"""
+
+    def compute():
+        series = np.zeros(len(data), dtype=bool)
+        if len(data) < threshold:
+            return series
+        ma30 = indicators.ma(code_name, data, "收盘", 30)
+        step1 = round(threshold / 3)
+        step2 = round(threshold * 2 / 3)
+        # 每个交易日往前threshold天窗口的起点
+        first = np.arange(len(data) - threshold + 1)
+        start = ma30[first]
+        last = ma30[first + threshold - 1]
+        with np.errstate(invalid="ignore"):
+            series[threshold - 1 :] = (
+                (start < ma30[first + step1])
+                & (ma30[first + step1] < ma30[first + step2])
+                & (ma30[first + step2] < last)
+                & (last > 1.2 * start)
+            )
+        return series
+
+    return indicators.get(
+        code_name, "keep_increasing.check", (threshold,), data, compute
+    )
+
 
-    data = data.tail(n=threshold)
+def check_panel(market, end_date=None, threshold=30):
+    """check 的面板版本，一次判断全部股票，返回布尔数组"""
+    end_index = market.date_index(end_date)
+    # 最后threshold天的MA30需要再往前29天的收盘价
+    close = market.tail("收盘", threshold + 29, end_index)
+    ma30 = panel.moving_average(close, 30)[:, 29:]
 
     step1 = round(threshold / 3)
     step2 = round(threshold * 2 / 3)
 
-    if (
-        data.iloc[0]["ma30"]
-        < data.iloc[step1]["ma30"]
-        < data.iloc[step2]["ma30"]
-        < data.iloc[-1]["ma30"]
-        and data.iloc[-1]["ma30"] > 1.2 * data.iloc[0]["ma30"]
-    ):
-        return True
-    else:
-        return False
+    with np.errstate(invalid="ignore"):
+        return (
+            (market.bar_count() >= threshold)
+            & (ma30[:, 0] < ma30[:, step1])
+            & (ma30[:, step1] < ma30[:, step2])
+            & (ma30[:, step2] < ma30[:, -1])
+            & (ma30[:, -1] > 1.2 * ma30[:, 0])
+        )
@@ -1,8 +1,7 @@
 # -*- encoding: UTF-8 -*-
 import logging
 
-import pandas as pd
-import talib as tl
+import utils
 
 
 # 低ATR成长策略
@@ -15,16 +14,7 @@ def check_low_increase(
         logging.debug("{0}:样本小于{1}天...\n".format(code_name, ma_long))
         return False
 
-    data["ma_short"] = pd.Series(
-        tl.MA(data["收盘"].values, ma_short), index=data.index.values
-    )
-    data["ma_long"] = pd.Series(
-        tl.MA(data["收盘"].values, ma_long), index=data.index.values
-    )
-
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    data = utils.truncate_to(data, end_date)
     data = data.tail(n=threshold)
     inc_days = 0
     dec_days = 0
@@ -70,8 +60,8 @@ def check_low_increase(
             "股票：{0}（{1}）  最低:{2}, 最高:{3}, 涨跌比率:{4}       上涨天数:{5}， 下跌天数:{6}".format(
                 name,
                 stock,
-                lowest_row["日期"],
-                highest_row["日期"],
+                utils.ensure_date(lowest_row["日期"]),
+                utils.ensure_date(highest_row["日期"]),
                 ratio,
                 inc_days,
                 dec_days,
@@ -1,12 +1,12 @@
 # -*- encoding: UTF-8 -*-
 import logging
 
+import utils
+
 
 # 低回撤稳步上涨策略
 def check(code_name, data, end_date=None, threshold=60):
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    data = utils.truncate_to(data, end_date)
     data = data.tail(n=threshold)
 
     if len(data) < threshold:
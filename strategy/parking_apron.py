@@ -2,71 +2,78 @@
 
 import logging
 
+import numpy as np
+
+import indicators
+import utils
 from strategy import turtle_trade
 
 
 # “停机坪”策略
 def check(code_name, data, end_date=None, threshold=15):
-    origin_data = data
-
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
-
-    if len(data) < threshold:
+    end = utils.end_index(data, end_date)
+    if end < threshold:
         logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
         return
 
-    data = data.tail(n=threshold)
-
-    flag = False
-
-    # 找出涨停日
-    for index, row in data.iterrows():
-        try:
-            if float(row["p_change"]) > 9.5:
-                if turtle_trade.check_enter(
-                    code_name, origin_data, row["日期"], threshold
-                ):
-                    if check_internal(code_name, data, row):
-                        flag = True
-        except KeyError as error:
-            logging.debug("{}处理异常：{}".format(code_name, error))
-
-    return flag
-
-
-def check_internal(code_name, data, limitup_row):
-    limitup_price = limitup_row["收盘"]
-    limitup_end = data.loc[(data["日期"] > limitup_row["日期"])]
-    limitup_end = limitup_end.head(n=3)
-    if len(limitup_end.index) < 3:
-        return False
-
-    consolidation_day1 = limitup_end.iloc[0]
-    consolidation_day23 = limitup_end = limitup_end.tail(n=2)
-
-    if not (
-        consolidation_day1["收盘"] > limitup_price
-        and consolidation_day1["开盘"] > limitup_price
-        and 0.97 < consolidation_day1["收盘"] / consolidation_day1["开盘"] < 1.03
-    ):
+    if not utils.signal_at(data, check_series(code_name, data, threshold), end_date):
         return False
 
-    threshold_price = limitup_end.iloc[-1]["收盘"]
-
-    for index, row in consolidation_day23.iterrows():
-        try:
-            if not (
-                0.97 < (row["收盘"] / row["开盘"]) < 1.03
-                and -5 < row["p_change"] < 5
-                and row["收盘"] > limitup_price
-                and row["开盘"] > limitup_price
-            ):
-                return False
-        except KeyError as error:
-            logging.debug("{}处理异常：{}".format(code_name, error))
+    limitup = limitup_days(code_name, data, threshold)[end - threshold : end - 3]
+    for index in np.flatnonzero(limitup) + end - threshold:
+        logging.debug(
+            "股票{0} 涨停日期：{1}".format(
+                code_name, utils.ensure_date(data["日期"].iloc[index])
+            )
+        )
+    return True
 
-    logging.debug("股票{0} 涨停日期：{1}".format(code_name, limitup_row["日期"]))
 
-    return True
+def check_series(code_name, data, threshold=15):
+    """
+    check 在每个交易日的结果，返回与data等长的布尔数组：
+    最近threshold天内有满足条件的涨停日，且其后3天都在窗口内
+    """
+
+    def compute():
+        series = np.zeros(len(data), dtype=bool)
+        if len(data) < threshold:
+            return series
+        # 第i天之前（不含）满足条件的涨停日个数
+        count = np.concatenate(
+            ([0], np.cumsum(limitup_days(code_name, data, threshold)))
+        )
+        end = np.arange(threshold, len(data) + 1)
+        series[threshold - 1 :] = count[end - 3] - count[end - threshold] > 0
+        return series
+
+    return indicators.get(code_name, "parking_apron.check", (threshold,), data, compute)
+
+
+def limitup_days(code_name, data, threshold=15):
+    """
+    每根K线是否为满足条件的涨停日：涨停、收盘为前threshold天最高价，
+    之后3天在涨停价之上窄幅整理
+    """
+    close = data["收盘"].to_numpy(dtype=np.float64)
+    open_ = data["开盘"].to_numpy(dtype=np.float64)
+    p_change = data["p_change"].to_numpy(dtype=np.float64)
+
+    def ahead(values, days):
+        """days天之后的值，超出末尾的部分为NaN"""
+        return np.concatenate((values[days:], np.full(days, np.nan)))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = close / open_
+        result = (p_change > 9.5) & turtle_trade.check_enter_series(
+            code_name, data, threshold
+        )
+        # 之后3天开盘、收盘都在涨停价之上且窄幅波动，第2、3天涨跌幅在±5%以内
+        for days in (1, 2, 3):
+            next_ratio = ahead(ratio, days)
+            result &= (0.97 < next_ratio) & (next_ratio < 1.03)
+            result &= (ahead(close, days) > close) & (ahead(open_, days) > close)
+            if days > 1:
+                next_change = ahead(p_change, days)
+                result &= (-5 < next_change) & (next_change < 5)
+    return result
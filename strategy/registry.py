@@ -0,0 +1,214 @@
+# -*- encoding: UTF-8 -*-
+
+import dataclasses
+import functools
+import importlib
+from typing import Optional
+
+# 策略登记表：每个策略声明需要的历史K线数、是否依赖龙虎榜，
+# 以及可选的面板实现和快照必要条件。下载和读取行情时只取启用策略需要的最长窗口。
+# 函数以 "模块.函数" 登记，第一次使用时才导入 strategy 下的模块，只加载启用的策略
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve(target):
+    if target is None:
+        return None
+    module_name, func_name = target.rsplit(".", 1)
+    module = importlib.import_module("strategy." + module_name)
+    return getattr(module, func_name)
+
+
+def _target(func):
+    """函数对应的 "模块.函数"，不在 strategy 包中的函数返回None"""
+    module = getattr(func, "__module__", None) or ""
+    if not module.startswith("strategy."):
+        return None
+    return "{}.{}".format(module[len("strategy.") :], func.__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class Strategy:
+    name: str
+    target: str
+    # 判断最后一天需要的K线数（含指标的预热期）
+    lookback: int
+    # 是否依赖 settings.top_list（龙虎榜）
+    needs_top_list: bool = False
+    panel_target: Optional[str] = None
+    snapshot_target: Optional[str] = None
+    # 信号序列：一次计算每个交易日的结果，返回与data等长的布尔数组
+    series_target: Optional[str] = None
+    # config.yaml 没有配置 strategies 时是否默认启用
+    enabled: bool = False
+
+    @property
+    def func(self):
+        return _resolve(self.target)
+
+    @property
+    def panel(self):
+        return _resolve(self.panel_target)
+
+    @property
+    def snapshot(self):
+        return _resolve(self.snapshot_target)
+
+    @property
+    def series(self):
+        return _resolve(self.series_target)
+
+
+STRATEGIES = [
+    Strategy(
+        "放量上涨",
+        "enter.check_volume",
+        lookback=61,
+        panel_target="enter.check_volume_panel",
+        snapshot_target="enter.check_volume_snapshot",
+        series_target="enter.check_volume_series",
+    ),
+    Strategy(
+        "均线多头",
+        "keep_increasing.check",
+        lookback=59,
+        panel_target="keep_increasing.check_panel",
+        series_target="keep_increasing.check_series",
+    ),
+    Strategy(
+        "海龟交易法则",
+        "turtle_trade.check_enter",
+        lookback=60,
+        panel_target="turtle_trade.check_enter_panel",
+        series_target="turtle_trade.check_enter_series",
+    ),
+    Strategy(
+        "停机坪",
+        "parking_apron.check",
+        # 窗口内每个涨停日再向前看15天
+        lookback=30,
+        series_target="parking_apron.check_series",
+    ),
+    Strategy(
+        "回踩年线",
+        "backtrace_ma250.check",
+        lookback=310,
+    ),
+    Strategy(
+        "无大幅回撤",
+        "low_backtrace_increase.check",
+        lookback=60,
+    ),
+    Strategy(
+        "突破平台",
+        "breakthrough_platform.check",
+        lookback=121,
+        series_target="breakthrough_platform.check_series",
+    ),
+    Strategy(
+        "高而窄的旗形",
+        "high_tight_flag.check",
+        lookback=60,
+        needs_top_list=True,
+        snapshot_target="high_tight_flag.check_snapshot",
+    ),
+    Strategy(
+        "放量跌停",
+        "climax_limitdown.check",
+        lookback=61,
+        panel_target="climax_limitdown.check_panel",
+        snapshot_target="climax_limitdown.check_snapshot",
+        series_target="climax_limitdown.check_series",
+    ),
+    # 威克夫策略
+    Strategy(
+        "威克夫-弹簧",
+        "wyckoff_spring.check",
+        lookback=60,
+        series_target="wyckoff_spring.check_series",
+        enabled=True,
+    ),
+    Strategy(
+        "威克夫-缩量不跌",
+        "wyckoff_divergence.check",
+        lookback=60,
+        panel_target="wyckoff_divergence.check_panel",
+        snapshot_target="wyckoff_divergence.check_snapshot",
+        enabled=True,
+    ),
+    Strategy(
+        "威克夫-SC反弹",
+        "wyckoff_selling_climax.check",
+        lookback=60,
+        snapshot_target="wyckoff_selling_climax.check_snapshot",
+        series_target="wyckoff_selling_climax.check_series",
+        enabled=True,
+    ),
+    Strategy(
+        "威克夫-吸筹完成",
+        "wyckoff_accumulation.check",
+        lookback=90,
+        panel_target="wyckoff_accumulation.check_panel",
+        snapshot_target="wyckoff_accumulation.check_snapshot",
+        enabled=True,
+    ),
+]
+
+# 流动性筛选读取最近10天的收盘价和成交量
+LIQUIDITY_LOOKBACK = 10
+
+_by_name = {strategy.name: strategy for strategy in STRATEGIES}
+_by_target = {strategy.target: strategy for strategy in STRATEGIES}
+
+
+def get(name):
+    return _by_name[name]
+
+
+def find(func):
+    """按check函数查找登记的策略，没有登记时返回None；不会导入其他策略模块"""
+    return _by_target.get(_target(func))
+
+
+def panel_func(func):
+    """面板实现：用一组NumPy运算判断全部股票，没有时返回None"""
+    strategy = find(func)
+    return None if strategy is None else strategy.panel
+
+
+def snapshot_filter(func):
+    """快照必要条件：快照不满足的股票一定不会被该策略选中，没有时返回None"""
+    strategy = find(func)
+    return None if strategy is None else strategy.snapshot
+
+
+def signal_series(func):
+    """信号序列实现，没有时返回None"""
+    strategy = find(func)
+    return None if strategy is None else strategy.series
+
+
+def enabled(names=None):
+    """返回 {策略名: check函数}，names为空时使用默认启用的策略"""
+    if names is None:
+        return {s.name: s.func for s in STRATEGIES if s.enabled}
+    return {name: get(name).func for name in names}
+
+
+def lookback(strategies):
+    """启用策略需要的最长K线数，没有登记的策略无法确定窗口，返回None表示需要全部历史"""
+    bars = LIQUIDITY_LOOKBACK
+    for strategy_func in strategies.values():
+        strategy = find(strategy_func)
+        if strategy is None:
+            return None
+        bars = max(bars, strategy.lookback)
+    # 第一根K线的涨跌幅需要前一天的收盘价
+    return bars + 1
+
+
+def needs_top_list(strategies):
+    return any(
+        strategy is None or strategy.needs_top_list
+        for strategy in map(find, strategies.values())
+    )
@@ -1,27 +1,45 @@
 # -*- coding: UTF-8 -*-
 
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import indicators
+import utils
+
 # 总市值
 BALANCE = 200000
 
 
 # 最后一个交易日收市价为指定区间内最高价
 def check_enter(code_name, data, end_date=None, threshold=60):
-    max_price = 0
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
-    if data is None:
-        return False
-    data = data.tail(n=threshold)
-    if len(data) < threshold:
-        return False
-    for index, row in data.iterrows():
-        if row["收盘"] > max_price:
-            max_price = float(row["收盘"])
-
-    last_close = data.iloc[-1]["收盘"]
-
-    if last_close >= max_price:
-        return True
-
-    return False
+    return utils.signal_at(
+        data, check_enter_series(code_name, data, threshold), end_date
+    )
+
+
+def check_enter_series(code_name, data, threshold=60):
+    """check_enter 在每个交易日的结果，返回与data等长的布尔数组"""
+
+    def compute():
+        close = data["收盘"].to_numpy(dtype=np.float64)
+        series = np.zeros(len(close), dtype=bool)
+        if len(close) >= threshold:
+            windows = sliding_window_view(close, threshold)
+            series[threshold - 1 :] = close[threshold - 1 :] >= np.fmax.reduce(
+                windows, axis=1
+            )
+        return series
+
+    return indicators.get(
+        code_name, "turtle_trade.check_enter", (threshold,), data, compute
+    )
+
+
+def check_enter_panel(market, end_date=None, threshold=60):
+    """check_enter 的面板版本，一次判断全部股票，返回布尔数组"""
+    end_index = market.date_index(end_date)
+    close = market.tail("收盘", threshold, end_index)
+    # K线不足threshold根的股票窗口内有NaN，比较结果为False
+    return (market.bar_count(end_index) >= threshold) & (
+        close[:, -1] >= np.max(close, axis=1)
+    )
@@ -3,8 +3,9 @@
 import logging
 
 import numpy as np
-import pandas as pd
-import talib as tl
+
+import utils
+from strategy import enter
 
 
 def check(code_name, data, end_date=None, threshold=90):
@@ -34,9 +35,7 @@ def check(code_name, data, end_date=None, threshold=90):
         logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
         return False
     
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    data = utils.truncate_to(data, end_date)
     
     if data.empty or len(data) < threshold:
         return False
@@ -45,7 +44,7 @@ def check(code_name, data, end_date=None, threshold=90):
     if len(data) < 63:
         return False
     
-    consolidation_period = data.tail(63).head(60).copy()  # 第-63到-3天
+    consolidation_period = data.tail(63).head(60)  # 第-63到-3天
     recent_3 = data.tail(3)  # 最近3天
     
     # 1. 检查横盘特征
@@ -58,9 +57,6 @@ def check(code_name, data, end_date=None, threshold=90):
         return False
     
     # 2. 检查成交量萎缩
-    consolidation_period = consolidation_period.copy()
-    consolidation_period['vol_ma5'] = tl.MA(consolidation_period['成交量'].values, 5)
-    
     first_20_avg_vol = consolidation_period.head(20)['成交量'].mean()
     last_20_avg_vol = consolidation_period.tail(20)['成交量'].mean()
     
@@ -93,3 +89,38 @@ def check(code_name, data, end_date=None, threshold=90):
     return False
 
 
+def check_panel(market, end_date=None, threshold=90):
+    """check 的面板版本，一次判断全部股票，返回布尔数组"""
+    end_index = market.date_index(end_date)
+    count = market.bar_count(end_index)
+    # 第-63到-4天为横盘区间，最后一天为突破日
+    high = market.tail("最高", 63, end_index)[:, :60]
+    low = market.tail("最低", 63, end_index)[:, :60]
+    volume = market.tail("成交量", 63, end_index)
+    consolidation_vol = volume[:, :60]
+    close = market.tail("收盘", 1, end_index)[:, -1]
+    p_change = market.tail("p_change", 1, end_index)[:, -1]
+
+    high_price = high.max(axis=1)
+    low_price = low.min(axis=1)
+    first_20_avg_vol = consolidation_vol[:, :20].mean(axis=1)
+    last_20_avg_vol = consolidation_vol[:, -20:].mean(axis=1)
+    avg_vol_60 = consolidation_vol.mean(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_range = (high_price - low_price) / low_price
+        return (
+            (market.bar_count() >= threshold)
+            & (count >= threshold)
+            & ~(price_range < 0.10)
+            & ~(price_range > 0.25)
+            & ~(last_20_avg_vol > first_20_avg_vol * 0.7)
+            & (close > high_price)
+            & (p_change > 3)
+            & (volume[:, -1] > avg_vol_60 * 1.5)
+        )
+
+
+def check_snapshot(spot):
+    """check 在全市场快照上的必要条件：当天涨幅大于3%"""
+    return ~(spot["涨跌幅"] <= 3 - enter.SNAPSHOT_SLACK)
@@ -2,8 +2,11 @@
 
 import logging
 
-import pandas as pd
-import talib as tl
+import numpy as np
+
+import indicators
+import panel
+import utils
 
 
 def check(code_name, data, end_date=None, threshold=60):
@@ -36,19 +39,15 @@ def check(code_name, data, end_date=None, threshold=60):
         logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
         return False
     
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    origin_data = data
+    data = utils.truncate_to(data, end_date)
     
     if data.empty or len(data) < threshold:
         return False
     
-    data = data.copy()
-    
-    # 计算成交量均线
-    data['vol_ma20'] = tl.MA(data['成交量'].values, 20)
-    data['vol_ma5'] = tl.MA(data['成交量'].values, 5)
-    data['ma20'] = tl.MA(data['收盘'].values, 20)
+    # 计算成交量均线（截取后的数据是完整数据的前缀，直接使用完整数据上缓存的均线）
+    vol_ma20 = indicators.ma(code_name, origin_data, '成交量', 20)[: len(data)]
+    ma20 = indicators.ma(code_name, origin_data, '收盘', 20)[: len(data)]
     
     # 取最近20天
     recent = data.tail(20)
@@ -64,7 +63,7 @@ def check(code_name, data, end_date=None, threshold=60):
         day = recent.iloc[i]
         
         # 成交量萎缩（小于20日均量的80%）
-        if day['成交量'] < day['vol_ma20'] * 0.8:
+        if day['成交量'] < vol_ma20[i] * 0.8:
             shrink_days += 1
         
         # 价格稳定（涨跌幅在±3%之内）
@@ -76,12 +75,12 @@ def check(code_name, data, end_date=None, threshold=60):
         last_day = recent.iloc[-1]
         
         # 确保不是在下跌趋势中
-        if last_day['收盘'] < last_day['ma20']:
+        if last_day['收盘'] < ma20[-1]:
             return False
         
         # 最后一天应该有向上的意愿
         if last_day['收盘'] >= last_day['开盘']:
-            vol_ratio = last_day['成交量'] / last_day['vol_ma20']
+            vol_ratio = last_day['成交量'] / vol_ma20[-1]
             msg = "**威克夫缩量不跌** {0}\n缩量天数:{1} 稳定天数:{2}\n量比:{3:.2f} 最新价:{4:.2f}\n".format(
                 code_name, shrink_days, stable_days, vol_ratio, last_day['收盘']
             )
@@ -91,6 +90,35 @@ def check(code_name, data, end_date=None, threshold=60):
     return False
 
 
+def check_panel(market, end_date=None, threshold=60):
+    """check 的面板版本，一次判断全部股票，返回布尔数组"""
+    end_index = market.date_index(end_date)
+    count = market.bar_count(end_index)
+    # 最近5天的20日均量需要最近24天的成交量
+    volume = market.tail("成交量", 24, end_index)
+    vol_ma20 = panel.moving_average(volume, 20)[:, -5:]
+    close = market.tail("收盘", 20, end_index)
+    p_change = market.tail("p_change", 5, end_index)
+    open_ = market.tail("开盘", 1, end_index)[:, -1]
+
+    with np.errstate(invalid="ignore"):
+        shrink_days = (volume[:, -5:] < vol_ma20 * 0.8).sum(axis=1)
+        stable_days = (np.abs(p_change) < 3).sum(axis=1)
+        return (
+            (market.bar_count() >= threshold)
+            & (count >= threshold)
+            & (shrink_days >= 3)
+            & (stable_days >= 4)
+            & ~(close[:, -1] < close.mean(axis=1))
+            & (close[:, -1] >= open_)
+        )
+
+
+def check_snapshot(spot):
+    """check 在全市场快照上的必要条件：当天收盘价不低于开盘价"""
+    return ~(spot["最新价"] < spot["今开"])
+
+
 def check_volume_no_rise(code_name, data, end_date=None):
     """
     识别"放量不涨"作为卖出预警（辅助功能）
@@ -112,12 +140,10 @@ def check_volume_no_rise(code_name, data, end_date=None):
     if len(data) < 30:
         return False
     
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
+    origin_data = data
+    data = utils.truncate_to(data, end_date)
     
-    data = data.copy()
-    data['vol_ma20'] = tl.MA(data['成交量'].values, 20)
+    vol_ma20 = indicators.ma(code_name, origin_data, '成交量', 20)[: len(data)]
     
     recent = data.tail(10)
     
@@ -128,7 +154,7 @@ def check_volume_no_rise(code_name, data, end_date=None):
         day = recent.iloc[i]
         
         # 成交量放大1.5倍以上
-        if day['成交量'] > day['vol_ma20'] * 1.5:
+        if day['成交量'] > vol_ma20[i] * 1.5:
             # 但涨幅不到3%（或收阴线）
             if day['p_change'] < 3 or day['收盘'] < day['开盘']:
                 danger_signal += 1
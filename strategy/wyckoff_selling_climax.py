@@ -2,8 +2,11 @@
 
 import logging
 
-import pandas as pd
-import talib as tl
+import numpy as np
+
+import indicators
+import utils
+from strategy import enter
 
 
 def check(code_name, data, end_date=None, threshold=60):
@@ -38,81 +41,68 @@ def check(code_name, data, end_date=None, threshold=60):
     if len(data) < threshold:
         logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
         return False
-    
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
-    
-    if data.empty or len(data) < threshold:
-        return False
-    
-    data = data.copy()
-    data['vol_ma20'] = tl.MA(data['成交量'].values, 20)
-    
-    # 寻找最近30天的SC
-    recent_30 = data.tail(30)
-    
-    if len(recent_30) < 30:
-        return False
-    
-    for i in range(len(recent_30) - 5):
-        sc_day = recent_30.iloc[i]  # 潜在的SC日
-        
-        # SC特征：大跌+放量
-        if (sc_day['p_change'] < -7 and 
-            sc_day['成交量'] > sc_day['vol_ma20'] * 2):
-            
-            # 检查后续是否有AR（自动反弹）
-            next_days = recent_30.iloc[i+1:i+4]
-            
-            if len(next_days) == 0:
-                continue
-            
-            # 寻找反弹日
-            ar_found = False
-            ar_high = 0
-            for j, ar_day in next_days.iterrows():
-                if ar_day['p_change'] > 5:
-                    ar_found = True
-                    ar_high = ar_day['最高']
-                    break
-            
-            if not ar_found:
-                continue
-            
-            # 检查是否有二次测试ST
-            st_days = recent_30.iloc[i+3:min(i+10, len(recent_30))]
-            if len(st_days) < 3:
-                continue
-            
-            st_found = False
-            for j, st_day in st_days.iterrows():
-                # ST特征：接近SC低点但成交量缩小
-                if (st_day['最低'] <= sc_day['最低'] * 1.05 and
-                    st_day['成交量'] < sc_day['成交量'] * 0.6):
-                    st_found = True
-                    break
-            
-            if not st_found:
-                continue
-            
-            # 检查最近是否开始向上
-            last_3 = recent_30.tail(3)
-            if len(last_3) < 3:
-                continue
-                
-            if (last_3.iloc[-1]['收盘'] > last_3.iloc[-1]['开盘'] and
-                last_3.iloc[-1]['p_change'] > 2):
-                
-                # 确保当前价格已经脱离底部
-                if last_3.iloc[-1]['收盘'] > sc_day['收盘'] * 1.05:
-                    msg = "**威克夫SC反弹** {0}\nSC日期:{1} 跌幅:{2:.2f}%\nSC成交量:{3:.0f}万 当前涨幅:{4:.2f}%\n".format(
-                        code_name, sc_day['日期'], sc_day['p_change'],
-                        sc_day['成交量'] / 10000, last_3.iloc[-1]['p_change']
+
+    selected = utils.signal_at(data, check_series(code_name, data, threshold), end_date)
+    if selected:
+        end = utils.end_index(data, end_date)
+        logging.info(
+            "**威克夫SC反弹** {0}\n日期:{1} 当前涨幅:{2:.2f}%\n".format(
+                code_name,
+                utils.ensure_date(data["日期"].iloc[end - 1]),
+                data["p_change"].iloc[end - 1],
+            )
+        )
+    return selected
+
+
+def check_series(code_name, data, threshold=60):
+    """
+    check 在每个交易日的结果，返回与data等长的布尔数组：
+    最近30天内有放量大跌的SC日，之后3天内有涨幅大于5%的AR，再之后有缩量接近SC低点的ST，
+    当天收阳、涨幅大于2%且收盘高出SC日收盘5%以上
+    """
+
+    def compute():
+        series = np.zeros(len(data), dtype=bool)
+        if len(data) < threshold:
+            return series
+        # 与按行读取时相同，都按float64比较
+        open_ = data["开盘"].to_numpy(dtype=np.float64)
+        close = data["收盘"].to_numpy(dtype=np.float64)
+        low = data["最低"].to_numpy(dtype=np.float64)
+        volume = data["成交量"].to_numpy(dtype=np.float64)
+        p_change = data["p_change"].to_numpy(dtype=np.float64)
+        vol_ma20 = indicators.ma(code_name, data, "成交量", 20)
+
+        ends = np.arange(threshold - 1, len(data))
+        found = np.zeros(len(ends), dtype=bool)
+        with np.errstate(invalid="ignore"):
+            # SC日为最近30天中的第i天（最后5天除外）
+            for i in range(25):
+                sc = ends - 29 + i
+                hit = (p_change[sc] < -7) & (volume[sc] > vol_ma20[sc] * 2)
+                # AR：之后3天内有一天涨幅大于5%
+                rally = np.zeros(len(ends), dtype=bool)
+                for days in (1, 2, 3):
+                    rally |= p_change[sc + days] > 5
+                # ST：SC日之后第3天起（最多到第9天，不超过当天）接近SC低点且缩量
+                test = np.zeros(len(ends), dtype=bool)
+                for days in range(3, min(i + 10, 30) - i):
+                    test |= (low[sc + days] <= low[sc] * 1.05) & (
+                        volume[sc + days] < volume[sc] * 0.6
                     )
-                    logging.info(msg)
-                    return True
-    
-    return False
+                found |= hit & rally & test & (close[ends] > close[sc] * 1.05)
+            found &= (close[ends] > open_[ends]) & (p_change[ends] > 2)
+        series[ends] = found
+        return series
+
+    return indicators.get(
+        code_name, "wyckoff_selling_climax.check", (threshold,), data, compute
+    )
 
 
+def check_snapshot(spot):
+    """check 在全市场快照上的必要条件：当天收阳且涨幅大于2%"""
+    return ~(spot["最新价"] <= spot["今开"]) & ~(
+        spot["涨跌幅"] <= 2 - enter.SNAPSHOT_SLACK
+    )
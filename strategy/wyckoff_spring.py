@@ -2,8 +2,11 @@
 
 import logging
 
-import pandas as pd
-import talib as tl
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import indicators
+import utils
 
 
 def check(code_name, data, end_date=None, threshold=60):
@@ -31,68 +34,68 @@ def check(code_name, data, end_date=None, threshold=60):
     if len(data) < threshold:
         logging.debug("{0}:样本小于{1}天...\n".format(code_name, threshold))
         return False
-    
-    if end_date is not None:
-        mask = data["日期"] <= end_date
-        data = data.loc[mask]
-    
-    if data.empty or len(data) < threshold:
-        return False
-    
-    data = data.tail(n=threshold).copy()
-    
-    # 计算均线和波动率
-    data['ma20'] = tl.MA(data['收盘'].values, 20)
-    data['vol_ma20'] = tl.MA(data['成交量'].values, 20)
-    
-    # 寻找最近30天的横盘区间
-    recent_30 = data.tail(30)
-    if len(recent_30) < 30:
-        return False
-    
-    # 识别横盘：最高价和最低价波动小于15%
-    box_high = recent_30['最高'].max()
-    box_low = recent_30['最低'].min()
-    box_range = (box_high - box_low) / box_low
-    
-    if box_range > 0.15:  # 波动超过15%不算横盘
-        return False
-    
-    if box_range < 0.05:  # 波动太小说明没有吸筹
-        return False
-    
-    # 寻找弹簧形态：最近5天内
-    recent_5 = data.tail(5)
-    
-    for i in range(len(recent_5) - 2):
-        day_break = recent_5.iloc[i]  # 假突破日
-        day_spring = recent_5.iloc[i + 1]  # 弹回日
-        day_confirm = recent_5.iloc[i + 2]  # 确认日
-        
-        # 条件1: 假突破日跌破箱体低点
-        if day_break['收盘'] > box_low * 0.98:
-            continue
-        
-        # 条件2: 假突破日成交量不能太大（不是真恐慌）
-        if day_break['成交量'] > day_break['vol_ma20'] * 1.5:
-            continue
-        
-        # 条件3: 弹回日快速收复
-        if day_spring['收盘'] < box_low:
-            continue
-        
-        # 条件4: 确认日放量上涨
-        if (day_confirm['收盘'] > day_confirm['开盘'] and 
-            day_confirm['p_change'] > 2 and
-            day_confirm['成交量'] > day_confirm['vol_ma20'] * 1.3):
-            
-            msg = "**威克夫弹簧** {0}\n突破日:{1} 涨幅:{2:.2f}%\n箱体区间:[{3:.2f}, {4:.2f}] 波动:{5:.1f}%\n".format(
-                code_name, day_confirm['日期'], day_confirm['p_change'], 
-                box_low, box_high, box_range * 100
+
+    selected = utils.signal_at(data, check_series(code_name, data, threshold), end_date)
+    if selected:
+        end = utils.end_index(data, end_date)
+        box_high = data["最高"].iloc[end - 30 : end].max()
+        box_low = data["最低"].iloc[end - 30 : end].min()
+        logging.info(
+            "**威克夫弹簧** {0}\n日期:{1}\n箱体区间:[{2:.2f}, {3:.2f}] 波动:{4:.1f}%\n".format(
+                code_name,
+                utils.ensure_date(data["日期"].iloc[end - 1]),
+                box_low,
+                box_high,
+                (box_high - box_low) / box_low * 100,
             )
-            logging.info(msg)
-            return True
-    
-    return False
+        )
+    return selected
+
+
+def check_series(code_name, data, threshold=60):
+    """
+    check 在每个交易日的结果，返回与data等长的布尔数组：
+    最近30天波动在5%~15%之间的箱体，最近5天内依次出现缩量跌破箱体低点、次日收回、第三天放量上涨
+    """
+
+    def compute():
+        series = np.zeros(len(data), dtype=bool)
+        if len(data) < threshold:
+            return series
+        # 箱体的最高、最低价保持原来的精度，逐日比较的值与按行读取时相同，为float64
+        high = data["最高"].to_numpy()
+        low = data["最低"].to_numpy()
+        open_ = data["开盘"].to_numpy(dtype=np.float64)
+        close = data["收盘"].to_numpy(dtype=np.float64)
+        volume = data["成交量"].to_numpy(dtype=np.float64)
+        p_change = data["p_change"].to_numpy(dtype=np.float64)
+        vol_ma20 = indicators.ma(code_name, data, "成交量", 20)
+
+        # 每个交易日及其最近30天的箱体（与 Series.max/min 一样忽略NaN）
+        ends = np.arange(threshold - 1, len(data))
+        box_high = np.fmax.reduce(sliding_window_view(high, 30)[ends - 29], axis=1)
+        box_low = np.fmin.reduce(sliding_window_view(low, 30)[ends - 29], axis=1)
 
+        with np.errstate(divide="ignore", invalid="ignore"):
+            box_range = (box_high - box_low) / box_low
+            boxed = ~(box_range > 0.15) & ~(box_range < 0.05)
+            found = np.zeros(len(ends), dtype=bool)
+            # 假突破日在最近5天的前3天，之后依次为弹回日、确认日
+            for i in range(3):
+                day_break = ends - 4 + i
+                day_spring = day_break + 1
+                day_confirm = day_break + 2
+                found |= (
+                    ~(close[day_break] > box_low * 0.98)
+                    & ~(volume[day_break] > vol_ma20[day_break] * 1.5)
+                    & ~(close[day_spring] < box_low)
+                    & (close[day_confirm] > open_[day_confirm])
+                    & (p_change[day_confirm] > 2)
+                    & (volume[day_confirm] > vol_ma20[day_confirm] * 1.3)
+                )
+        series[ends] = boxed & found
+        return series
 
+    return indicators.get(
+        code_name, "wyckoff_spring.check", (threshold,), data, compute
+    )
@@ -0,0 +1,116 @@
+# -*- encoding: UTF-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+import talib as tl
+
+import settings
+import trade_calendar
+
+
+def make_bars(n=300, start="2022-01-04", seed=0, code="000001"):
+    """生成与 ak.stock_zh_a_hist 列名一致的模拟日线数据"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start=start, periods=n)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_ = close * (1 + rng.normal(0, 0.01, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volume = rng.integers(100000, 2000000, n).astype(float)
+    return pd.DataFrame(
+        {
+            "日期": [d.date() for d in dates],
+            "股票代码": code,
+            "开盘": open_.round(2),
+            "收盘": close.round(2),
+            "最高": high.round(2),
+            "最低": low.round(2),
+            "成交量": volume,
+            "成交额": (volume * close * 100).round(2),
+            "涨跌额": np.diff(close.round(2), prepend=close[0].round(2)).round(2),
+        }
+    )
+
+
+def make_universe(n_stocks=40, n_days=260, seed=0):
+    """
+    生成一组带有不同走势阶段的模拟股票：上涨、缩量横盘、放量突破、放量跌停等，
+    部分股票有停牌或较晚上市，返回 {(代码, 名称): DataFrame}
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start="2022-01-04", periods=n_days)
+    universe = {}
+    for i in range(n_stocks):
+        change = rng.normal(0, 0.015, n_days)
+        volume = np.full(n_days, float(rng.integers(20000, 2000000)))
+        day = 0
+        while day < n_days:
+            length = int(rng.integers(5, 40))
+            regime = rng.choice(["trend", "flat", "breakout", "limitdown", "spike"])
+            end = min(day + length, n_days)
+            if regime == "trend":
+                change[day:end] += 0.01
+            elif regime == "flat":
+                change[day:end] *= 0.2
+                volume[day:end] *= np.linspace(1.0, 0.4, end - day)
+            elif regime == "breakout":
+                change[end - 1] = 0.06
+                volume[end - 1] *= 4
+            elif regime == "limitdown":
+                change[end - 1] = -0.1
+                volume[end - 1] *= 6
+            else:
+                change[end - 1] = 0.04
+                volume[end - 1] *= 3
+            day = end
+        volume *= rng.uniform(0.7, 1.3, n_days)
+        close = (rng.uniform(5, 50) * np.exp(np.cumsum(change))).round(2)
+        open_ = (close / (1 + change * rng.uniform(0, 1, n_days))).round(2)
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, n_days)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, n_days)))
+        data = pd.DataFrame(
+            {
+                "日期": [d.date() for d in dates],
+                "开盘": open_,
+                "收盘": close,
+                "最高": high.round(2),
+                "最低": low.round(2),
+                "成交量": volume.round(),
+            }
+        )
+        if i % 7 == 3:  # 停牌
+            data = data.drop(index=range(100, 100 + i)).reset_index(drop=True)
+        if i % 11 == 5:  # 次新股
+            data = data.iloc[80:].reset_index(drop=True)
+        data["p_change"] = tl.ROC(data["收盘"].values, 1)
+        universe[("{:06d}".format(i), "股票{}".format(i))] = data
+    return universe
+
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch):
+    """不读取config.yaml，测试需要的配置项直接写入这个字典"""
+    config = {"end_date": None}
+    monkeypatch.setattr(settings, "config", config, raising=False)
+    return config
+
+
+@pytest.fixture(autouse=True)
+def calendar(monkeypatch):
+    """不获取交易日历，按周一至周五计算，与模拟行情的日期一致"""
+    calendar = trade_calendar.weekdays()
+    monkeypatch.setattr(trade_calendar, "load", lambda today=None: calendar)
+    monkeypatch.setattr(trade_calendar, "_calendar", None)
+    return calendar
+
+
+@pytest.fixture
+def data_dir(tmp_path, config):
+    config["data_dir"] = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def bars():
+    return make_bars
@@ -0,0 +1,84 @@
+# -*- encoding: UTF-8 -*-
+import asyncio
+import threading
+import time
+
+import async_fetcher
+
+
+def test_controller_aimd():
+    controller = async_fetcher.AIMDController(initial=8, minimum=2, maximum=10)
+    for _ in range(200):
+        controller.record(0.1, True)
+    assert controller.concurrency == 10
+
+    controller.record(0.1, False)
+    assert controller.concurrency == 5
+    # 冷却时间内的连续失败只减一次
+    controller.record(0.1, False)
+    assert controller.concurrency == 5
+
+
+def test_timeouts_and_retries():
+    stocks = [("{:06d}".format(i), "股票{}".format(i)) for i in range(200)]
+    transport = async_fetcher.stub_transport(
+        latency=0.005, error_rate=0.2, hang_rate=0.02, seed=1
+    )
+    fetcher = async_fetcher.Fetcher(
+        transport,
+        timeout=0.2,
+        retries=3,
+        backoff=0.001,
+        controller=async_fetcher.AIMDController(initial=4, maximum=16),
+    )
+
+    stocks_data = asyncio.run(fetcher.run(stocks))
+
+    assert list(stocks_data.keys()) == stocks
+    assert fetcher.errors > 0
+
+
+def test_failed_stocks_are_dropped():
+    attempts = {}
+
+    def transport(code_name):
+        attempts[code_name] = attempts.get(code_name, 0) + 1
+        if code_name[0] == "000002":
+            raise ConnectionError("down")
+        return code_name[0]
+
+    stocks = [("000001", "甲"), ("000002", "乙")]
+    failed = []
+    stocks_data = async_fetcher.run(
+        stocks, transport, {"retries": 1, "timeout": 1}, failed
+    )
+
+    assert stocks_data == {("000001", "甲"): "000001"}
+    assert failed == [("000002", "乙")]
+    # 第一轮2次，最后的重试轮再2次
+    assert attempts[("000002", "乙")] == 4
+
+
+def test_timed_out_thread_is_not_fetched_again():
+    running = {}
+    lock = threading.Lock()
+    overlaps = []
+
+    def transport(code_name):
+        with lock:
+            if running.get(code_name):
+                overlaps.append(code_name)
+            running[code_name] = True
+        # 第一次请求超过超时时间，重试时仍在执行
+        time.sleep(0.3)
+        with lock:
+            running[code_name] = False
+        return code_name[0]
+
+    fetcher = async_fetcher.Fetcher(transport, timeout=0.1, retries=3, backoff=0.01)
+    stocks_data = asyncio.run(fetcher.run([("000001", "甲")]))
+
+    assert not overlaps
+    # 重试等到了第一次请求的结果
+    assert stocks_data == {("000001", "甲"): "000001"}
+    assert fetcher.errors > 0
@@ -0,0 +1,75 @@
+# -*- encoding: UTF-8 -*-
+import numpy as np
+import pytest
+from conftest import make_universe
+
+import backtest
+import panel
+import store
+from strategy import breakthrough_platform, turtle_trade, wyckoff_spring
+
+
+@pytest.fixture(scope="module")
+def market():
+    return panel.build(make_universe(n_stocks=20, n_days=200))
+
+
+def test_backtest_panel_strategy(market):
+    result, stats = backtest.backtest(
+        turtle_trade.check_enter, "2022-06-01", "2022-08-31", market=market
+    )
+
+    assert stats["信号数"] == len(result) > 0
+    assert stats["交易日数"] == 66
+    row = result.iloc[0]
+    data = market.frame(row["代码"])
+    position = np.flatnonzero(data["日期"] == row["日期"])[0]
+    assert row["ret_5"] == pytest.approx(
+        data["收盘"].iloc[position + 5] / data["收盘"].iloc[position] - 1
+    )
+    low = data["最低"].iloc[position + 1 : position + 21].min()
+    assert row["max_drawdown"] == pytest.approx(min(low / row["收盘"] - 1, 0))
+    assert 0 <= stats["5日胜率"] <= 1
+
+
+def test_backtest_falls_back_to_check(market):
+    days, selected = backtest.signals(
+        market, wyckoff_spring.check, "2022-09-01", "2022-09-30", liquid_only=False
+    )
+
+    assert len(days) == selected.shape[1] == 22
+    end_date = market.dates[days[-1]].astype(object)
+    expected = [
+        bool(wyckoff_spring.check(stock, market.frame(stock[0]), end_date))
+        for stock in market.stocks
+    ]
+    np.testing.assert_array_equal(selected[:, -1], expected)
+
+
+def test_backtest_signal_series(market):
+    days, selected = backtest.signals(
+        market,
+        breakthrough_platform.check,
+        "2022-06-01",
+        "2022-09-30",
+        liquid_only=False,
+    )
+    for j in range(0, len(days), 5):
+        end_date = market.dates[days[j]].astype(object)
+        expected = [
+            bool(breakthrough_platform.check(stock, market.frame(stock[0]), end_date))
+            and not np.isnan(market.field("收盘")[i, days[j]])
+            for i, stock in enumerate(market.stocks)
+        ]
+        np.testing.assert_array_equal(selected[:, j], expected)
+    assert selected.any()
+
+
+def test_load_market_from_store_keeps_names(data_dir, bars):
+    store.write("000001", bars(60, code="000001"))
+    store.write("000002", bars(60, code="000002"))
+    store.write_names([("000001", "平安银行")])
+
+    market = backtest.load_market()
+
+    assert market.stocks == [("000001", "平安银行"), ("000002", "000002")]
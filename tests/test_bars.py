@@ -0,0 +1,71 @@
+# -*- encoding: UTF-8 -*-
+import numpy as np
+import pytest
+from conftest import make_bars, make_universe
+
+import bars
+import settings
+import utils
+import work_flow
+from strategy import registry
+
+MUTATIONS = {
+    "setitem": lambda data: data.__setitem__("ma5", 1.0),
+    "loc": lambda data: data.loc.__setitem__((data.index[0], "收盘"), 1.0),
+    "iloc": lambda data: data.iloc.__setitem__((0, 2), 1.0),
+    "at": lambda data: data.at.__setitem__((data.index[0], "收盘"), 1.0),
+    "attribute": lambda data: setattr(data, "收盘", 1.0),
+    "index": lambda data: setattr(data, "index", range(len(data))),
+    "inplace": lambda data: data.sort_values("收盘", inplace=True),
+    "delitem": lambda data: data.__delitem__("收盘"),
+}
+
+
+@pytest.mark.parametrize("mutation", MUTATIONS.values(), ids=MUTATIONS.keys())
+def test_frozen_rejects_mutation(mutation):
+    data = utils.index_by_date(make_bars(30))
+    frozen = bars.freeze(data)
+
+    with pytest.raises(TypeError):
+        mutation(frozen)
+    assert list(frozen.columns) == list(data.columns)
+
+
+def test_frozen_is_a_view():
+    data = utils.index_by_date(make_bars(30))
+    frozen = bars.freeze(data)
+
+    assert bars.freeze(frozen) is frozen
+    assert np.shares_memory(frozen["收盘"].to_numpy(), data["收盘"].to_numpy())
+    # 切片得到普通DataFrame，修改它不影响共享的数据
+    window = frozen.tail(5)
+    window["ma5"] = 1.0
+    assert "ma5" not in frozen.columns
+    close = frozen["收盘"].iat[-1]
+    window = frozen.iloc[-5:]
+    window.iloc[-1, window.columns.get_loc("收盘")] = -1.0
+    assert frozen["收盘"].iat[-1] == close == data["收盘"].iat[-1]
+
+
+def test_strategies_do_not_mutate(monkeypatch):
+    universe = make_universe(n_stocks=10, n_days=320)
+    codes = [stock[0] for stock in universe]
+    monkeypatch.setattr(settings, "load_top_list", lambda today=None: codes)
+    for strategy in registry.STRATEGIES:
+        for stock, data in universe.items():
+            frozen = bars.freeze(utils.index_by_date(data))
+            for end_date in frozen["日期"].iloc[100::40]:
+                strategy.func(stock, frozen, end_date)
+
+
+def test_threaded_matches_sequential(config):
+    universe = {
+        stock: bars.freeze(data)
+        for stock, data in make_universe(n_stocks=30, n_days=200).items()
+    }
+    strategies = registry.enabled(["海龟交易法则", "均线多头", "威克夫-缩量不跌"])
+
+    expected = work_flow.evaluate(universe, strategies)
+    assert any(expected.values())
+    config["threads"] = 4
+    assert work_flow.evaluate(universe, strategies) == expected
@@ -0,0 +1,101 @@
+# -*- encoding: UTF-8 -*-
+import pandas as pd
+import pytest
+
+import data_fetcher
+import datasource
+
+
+class FakeLive:
+    """模拟 akshare：日线按 start_date 返回，没有复权因子时抛出ValueError"""
+
+    def __init__(self, history):
+        self.history = history
+        self.calls = []
+
+    def call(self, endpoint, **kwargs):
+        self.calls.append((endpoint, kwargs))
+        if endpoint == "stock_zh_a_daily":
+            raise ValueError("没有复权因子")
+        dates = self.history["日期"].map(lambda d: d.strftime("%Y%m%d"))
+        return self.history.loc[dates >= kwargs["start_date"]].reset_index(drop=True)
+
+
+def test_record_and_replay(tmp_path, bars):
+    history = bars(30)
+    recorder = datasource.Recorder(str(tmp_path), FakeLive(history))
+    start = history["日期"].iloc[10].strftime("%Y%m%d")
+    recorder.call("stock_zh_a_hist", symbol="000001", start_date=start, adjust="")
+    recorder.call("stock_zh_a_hist", symbol="000001", start_date="20000101", adjust="")
+    with pytest.raises(ValueError):
+        recorder.call("stock_zh_a_daily", symbol="sz000001", adjust="hfq-factor")
+
+    replayer = datasource.Replayer(str(tmp_path))
+    # 同一代码的多次录制合并保存，回放时按起始日期筛选
+    replayed = replayer.call(
+        "stock_zh_a_hist", symbol="000001", start_date=start, adjust=""
+    )
+    pd.testing.assert_frame_equal(replayed, history.iloc[10:].reset_index(drop=True))
+    assert len(
+        replayer.call(
+            "stock_zh_a_hist", symbol="000001", start_date="20000101", adjust=""
+        )
+    ) == len(history)
+    with pytest.raises(ValueError, match="没有复权因子"):
+        replayer.call("stock_zh_a_daily", symbol="sz000001", adjust="hfq-factor")
+    with pytest.raises(LookupError):
+        replayer.call("stock_zh_a_hist", symbol="000002", start_date=start, adjust="")
+
+
+def test_network_errors_are_not_recorded(tmp_path):
+    class Offline:
+        def call(self, endpoint, **kwargs):
+            raise ConnectionResetError("连接被重置")
+
+    recorder = datasource.Recorder(str(tmp_path), Offline())
+    with pytest.raises(ConnectionResetError):
+        recorder.call("stock_zh_a_daily", symbol="sz000001", adjust="hfq-factor")
+
+    assert not list(tmp_path.rglob("*.error.json"))
+
+
+def test_replay_injects_latency_and_errors(tmp_path, bars, monkeypatch):
+    recorder = datasource.Recorder(str(tmp_path), FakeLive(bars(5)))
+    recorder.call("stock_zh_a_hist", symbol="000001", start_date="20000101")
+    sleeps = []
+    monkeypatch.setattr(datasource.time, "sleep", sleeps.append)
+
+    replayer = datasource.Replayer(str(tmp_path), latency=0.2, jitter=0.1, seed=1)
+    replayer.call("stock_zh_a_hist", symbol="000001", start_date="20000101")
+    assert 0.2 <= sleeps[0] <= 0.3
+
+    replayer = datasource.Replayer(str(tmp_path), error_rate=1.0)
+    with pytest.raises(ConnectionError):
+        replayer.call("stock_zh_a_hist", symbol="000001", start_date="20000101")
+
+    failed = 0
+    replayer = datasource.Replayer(str(tmp_path), error_rate=0.3, seed=0)
+    for _ in range(200):
+        try:
+            replayer.call("stock_zh_a_hist", symbol="000001", start_date="20000101")
+        except ConnectionError:
+            failed += 1
+    assert 30 < failed < 90
+
+
+def test_fetch_replays_offline(config, data_dir, bars, tmp_path, monkeypatch):
+    fixtures = tmp_path / "fixtures"
+    live = FakeLive(bars(30))
+    monkeypatch.setattr(datasource, "Live", lambda: live)
+    config["datasource"] = {"mode": "record", "directory": str(fixtures)}
+    recorded = data_fetcher.fetch(("000001", "平安银行"))
+
+    def offline(*args, **kwargs):
+        raise AssertionError("回放时不应访问网络")
+
+    monkeypatch.setattr(live, "call", offline)
+    for path in (data_dir / "raw").iterdir():
+        path.unlink()
+    config["datasource"] = {"mode": "replay", "directory": str(fixtures)}
+    replayed = data_fetcher.fetch(("000001", "平安银行"))
+    pd.testing.assert_frame_equal(replayed, recorded)
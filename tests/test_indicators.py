@@ -0,0 +1,67 @@
+# -*- encoding: UTF-8 -*-
+import numpy as np
+import pytest
+import talib as tl
+
+import indicators
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    indicators.clear()
+    yield
+    indicators.clear()
+
+
+def test_ma_is_computed_once(bars):
+    data = bars(100)
+    first = indicators.ma(("000001", "平安银行"), data, "收盘", 20)
+    second = indicators.ma(("000001", "平安银行"), data, "收盘", 20)
+
+    assert second is first
+    assert not first.flags.writeable
+    np.testing.assert_allclose(first, tl.MA(data["收盘"].values, 20))
+    assert indicators.stats()["hits"] == 1
+    assert indicators.stats()["misses"] == 1
+
+
+def test_new_bar_changes_version(bars):
+    data = bars(100)
+    indicators.ma("000001", data.head(99), "收盘", 5)
+    indicators.ma("000001", data, "收盘", 5)
+
+    assert indicators.stats()["misses"] == 2
+
+
+def test_prepared_computes_version_once(bars, monkeypatch):
+    data = bars(100)
+    calls = []
+    version = indicators.version
+    monkeypatch.setattr(
+        indicators, "version", lambda data: calls.append(1) or version(data)
+    )
+
+    with indicators.prepared(data):
+        for period in (5, 10, 20):
+            indicators.ma("000001", data, "收盘", period)
+        # 其他数据对象照常计算版本
+        indicators.ma("000001", data.head(99), "收盘", 5)
+    indicators.ma("000001", data, "收盘", 5)
+
+    assert len(calls) == 3
+    assert indicators.stats()["hits"] == 1
+
+
+def test_lru_eviction(bars, monkeypatch):
+    data = bars(1000)
+    # 每个指标 8000 字节，上限只够放两个
+    monkeypatch.setattr(indicators, "max_bytes", lambda: 16000)
+    for period in (5, 10, 20):
+        indicators.ma("000001", data, "收盘", period)
+    indicators.ma("000001", data, "收盘", 20)
+    indicators.ma("000001", data, "收盘", 5)
+
+    stats = indicators.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 16000
+    assert (stats["hits"], stats["misses"]) == (1, 4)
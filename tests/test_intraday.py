@@ -0,0 +1,156 @@
+# -*- encoding: UTF-8 -*-
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_fetcher
+import datasource
+import intraday
+import push
+import store
+import utils
+
+TODAY = datetime.date(2023, 3, 1)
+# 历史K线截至上一个交易日（2月28日）
+START = pd.bdate_range(end="2023-02-28", periods=250)[0]
+
+
+@pytest.fixture
+def market(data_dir, bars, monkeypatch):
+    """本地库中有三只股票截至昨天的历史，000001 还保存了一根过期的当天K线"""
+    monkeypatch.setattr(intraday, "_day", None)
+    monkeypatch.setattr(intraday, "_history", {})
+    monkeypatch.setattr(intraday, "_pushed", {})
+    for i, code in enumerate(["000001", "000002", "000003"]):
+        history = bars(250, start=START, seed=i, code=code)
+        if code == "000001":
+            stale = history.tail(1).assign(日期=TODAY, 收盘=1.0)
+            history = pd.concat([history, stale], ignore_index=True)
+        store.write(code, history)
+
+    spot = pd.DataFrame(
+        {
+            "代码": ["000001", "000002", "000003", "000004"],
+            "名称": ["甲", "乙", "停牌", "没有历史"],
+            "最新价": [200.0, 10.0, np.nan, 300.0],
+            "今开": [190.0, 10.0, np.nan, 300.0],
+            "最高": [210.0, 10.5, np.nan, 300.0],
+            "最低": [185.0, 9.5, np.nan, 300.0],
+            "成交量": [1000000.0, 1000000.0, np.nan, 1000000.0],
+            "涨跌幅": [5.0, 0.0, np.nan, 0.0],
+        }
+    )
+    calls = []
+
+    def call(endpoint, **kwargs):
+        calls.append(endpoint)
+        return spot
+
+    monkeypatch.setattr(datasource, "call", call)
+    pushed = []
+    monkeypatch.setattr(push, "strategy", pushed.append)
+    return calls, pushed
+
+
+def above_100(code_name, data, end_date=None):
+    return data["收盘"].iat[-1] > 100
+
+
+def test_today_bars_skip_suspended():
+    spot = pd.DataFrame(
+        {
+            "代码": ["000001", "000002"],
+            "名称": ["甲", "停牌"],
+            "最新价": [10.5, np.nan],
+            "今开": [10.0, np.nan],
+            "最高": [11.0, np.nan],
+            "最低": [9.8, np.nan],
+            "成交量": [1000.0, 0.0],
+        }
+    )
+
+    bars = intraday.today_bars(spot, TODAY)
+
+    assert list(bars.index) == ["000001"]
+    assert bars.loc["000001", "日期"] == TODAY
+    assert bars.loc["000001", "开盘"] == 10.0
+    assert bars.loc["000001", "收盘"] == 10.5
+
+
+def test_screen_appends_provisional_bar(market):
+    calls, _ = market
+    seen = {}
+
+    def record(code_name, data, end_date=None):
+        seen[code_name[0]] = data
+        return False
+
+    intraday.screen({"记录": record}, today=TODAY)
+
+    assert calls == ["stock_zh_a_spot_em"]
+    assert set(seen) <= {"000001", "000002"}
+    data = seen["000001"]
+    # 过期的当天K线被快照合成的K线替换
+    assert utils.ensure_date(data["日期"].iat[-1]) == TODAY
+    assert utils.ensure_date(data["日期"].iat[-2]) < TODAY
+    assert data["收盘"].iat[-1] == 200.0
+
+    # 与把当天K线写入本地库后按每日选股的方式读取相同
+    raw = store.load("000001").iloc[:-1]
+    bar = raw.tail(1).assign(日期=TODAY, 开盘=190.0, 收盘=200.0, 最高=210.0, 最低=185.0)
+    bar = bar.assign(成交量=1000000.0)
+    raw = pd.concat([raw, bar], ignore_index=True)
+    expected = data_fetcher.finish(raw, None)
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(data), pd.DataFrame(expected), check_index_type=False
+    )
+
+
+def test_run_pushes_new_stocks_once(market, monkeypatch):
+    calls, pushed = market
+    loads = []
+    load = store.load
+    monkeypatch.setattr(
+        store, "load", lambda code, **kw: loads.append((code, kw)) or load(code, **kw)
+    )
+
+    first = intraday.run({"高价": above_100}, today=TODAY)
+    second = intraday.run({"高价": above_100}, today=TODAY)
+
+    assert first == second == {"高价": [("000001", "甲")]}
+    assert calls == ["stock_zh_a_spot_em"] * 2
+    # 本地历史只在当天第一次读取，同一只股票只推送一次
+    assert loads.count(("000001", {})) == 1
+    assert len(pushed) == 1 and "000001" in pushed[0]
+
+
+@pytest.mark.parametrize("fetch_fails", [True, False])
+def test_stale_history_is_fetched_first(market, monkeypatch, fetch_fails):
+    # 000002 的本地历史截至两个交易日之前
+    full = store.load("000002")
+    store.write("000002", full.iloc[:-1])
+    fetched = []
+
+    def fetch(code_name, lookback=None):
+        fetched.append(code_name[0])
+        if fetch_fails:
+            raise ConnectionError("离线")
+        store.write(code_name[0], full)
+
+    monkeypatch.setattr(data_fetcher, "fetch", fetch)
+    seen = {}
+
+    def record(code_name, data, end_date=None):
+        seen[code_name[0]] = data
+        return False
+
+    intraday.screen({"记录": record}, today=TODAY)
+
+    assert fetched == ["000002"]
+    if fetch_fails:
+        assert "000002" not in seen
+    else:
+        data = seen["000002"]
+        assert utils.ensure_date(data["日期"].iat[-2]) == datetime.date(2023, 2, 28)
@@ -0,0 +1,96 @@
+# -*- encoding: UTF-8 -*-
+import json
+import os
+
+import pytest
+from conftest import make_universe
+
+import metrics
+import work_flow
+from strategy import registry
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_summary_and_errors():
+    for i in range(1, 101):
+        metrics.observe("sequoia_request_seconds", i / 100, endpoint="hist")
+    with pytest.raises(ValueError):
+        with metrics.timed("sequoia_request_seconds", endpoint="hist"):
+            raise ValueError
+    metrics.increment("sequoia_strategy_stocks_total", 3, strategy="a")
+    metrics.increment("sequoia_strategy_stocks_total", 2, strategy="a")
+
+    data = metrics.snapshot()
+    summary = data["summaries"][0]
+    assert summary["count"] == 101
+    assert summary["p50"] == pytest.approx(0.5, abs=0.01)
+    assert summary["p99"] == pytest.approx(0.99, abs=0.01)
+    assert metrics.counter("sequoia_request_seconds_errors_total", endpoint="hist") == 1
+    assert metrics.counter("sequoia_strategy_stocks_total", strategy="a") == 5
+    assert any(item["name"] == "sequoia_peak_rss_bytes" for item in data["gauges"])
+
+
+def test_prometheus_text():
+    metrics.observe("sequoia_stage_seconds", 1.5, stage="spot")
+    metrics.increment("sequoia_strategy_selected_total", strategy='引号"')
+    text = metrics.prometheus()
+
+    assert "# TYPE sequoia_stage_seconds summary" in text
+    assert 'sequoia_stage_seconds{stage="spot",quantile="0.95"} 1.5' in text
+    assert 'sequoia_stage_seconds_count{stage="spot"} 1' in text
+    assert 'sequoia_strategy_selected_total{strategy="引号\\""} 1' in text
+    assert text.endswith("\n")
+
+
+def test_write(tmp_path):
+    metrics.observe("sequoia_fetch_seconds", 0.1)
+    json_file = metrics.write(str(tmp_path))
+
+    with open(json_file, encoding="utf-8") as file:
+        assert json.load(file)["summaries"][0]["name"] == "sequoia_fetch_seconds"
+    assert "sequoia_fetch_seconds_count 1" in (tmp_path / "sequoia.prom").read_text()
+
+
+def test_write_keeps_latest_files(tmp_path, config, monkeypatch):
+    config["metrics"] = {"keep": 2}
+    for i in range(4):
+        (tmp_path / "20240101-00000{}.json".format(i)).write_text("{}")
+
+    json_file = metrics.write(str(tmp_path))
+
+    assert sorted(path.name for path in tmp_path.glob("*.json")) == [
+        "20240101-000003.json",
+        os.path.basename(json_file),
+    ]
+
+
+def test_finish_resets_when_disabled(config):
+    config["metrics"] = {"enable": False}
+    metrics.observe("sequoia_fetch_seconds", 0.1)
+
+    metrics.finish()
+
+    assert metrics.snapshot()["summaries"] == []
+
+
+def test_evaluate_records_strategies(config):
+    universe = make_universe(n_stocks=20, n_days=200)
+    strategies = registry.enabled(["海龟交易法则", "均线多头"])
+    results = work_flow.evaluate(universe, strategies)
+
+    liquid = sum(work_flow.is_liquid_enough(*item) for item in universe.items())
+    for strategy in strategies:
+        assert (
+            metrics.counter("sequoia_strategy_stocks_total", strategy=strategy)
+            == liquid
+        )
+        assert metrics.counter(
+            "sequoia_strategy_selected_total", strategy=strategy
+        ) == len(results[strategy])
+        assert metrics.counter("sequoia_strategy_seconds_total", strategy=strategy) > 0
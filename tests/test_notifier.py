@@ -0,0 +1,152 @@
+# -*- encoding: UTF-8 -*-
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+import notifier
+import push
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return str(tmp_path / "spool.json")
+
+
+def test_coalesce():
+    assert notifier.coalesce(["a", "b", "c"], 10) == ["a\nb\nc"]
+    assert notifier.coalesce(["aaaa", "bbbb", "cc"], 9) == ["aaaa\nbbbb", "cc"]
+    assert notifier.coalesce(["a", "0123456789xy"], 5) == ["a", "01234", "56789", "xy"]
+
+
+def test_submit_does_not_wait_and_coalesces(spool):
+    channel = notifier.MockChannel()
+    queue = notifier.Notifier(channel, spool, min_interval=0, linger=0.2).start()
+
+    start = time.monotonic()
+    for message in ("策略1", "策略2", "策略3"):
+        queue.submit(message)
+    assert time.monotonic() - start < 0.1
+
+    assert queue.flush(5)
+    assert channel.messages == ["策略1\n策略2\n策略3"]
+    queue.stop(1)
+
+
+def test_rate_limit(spool):
+    channel = notifier.MockChannel(max_length=5)
+    queue = notifier.Notifier(channel, spool, min_interval=0.1, linger=0.05).start()
+    for message in ("aaaa", "bbbb", "cccc"):
+        queue.submit(message)
+
+    assert queue.flush(5)
+    assert channel.messages == ["aaaa", "bbbb", "cccc"]
+    gaps = [b - a for a, b in zip(channel.sent_at, channel.sent_at[1:])]
+    assert min(gaps) >= 0.1
+    queue.stop(1)
+
+
+def test_retry(spool):
+    channel = notifier.MockChannel(failures=2)
+    queue = notifier.Notifier(
+        channel, spool, min_interval=0, retries=3, backoff=0.01, linger=0
+    ).start()
+    queue.submit("消息")
+
+    assert queue.flush(5)
+    assert channel.messages == ["消息"]
+    queue.stop(1)
+
+
+def test_failed_messages_are_resent_after_restart(spool):
+    failing = notifier.MockChannel(failures=10)
+    queue = notifier.Notifier(
+        failing, spool, min_interval=0, retries=1, backoff=0.01, linger=0
+    ).start()
+    queue.submit("消息")
+    assert queue.flush(5)
+    queue.stop(1)
+    with open(spool, encoding="utf-8") as file:
+        assert json.load(file) == ["消息"]
+
+    channel = notifier.MockChannel()
+    queue = notifier.Notifier(channel, spool, min_interval=0, linger=0).start()
+    assert queue.flush(5)
+    assert channel.messages == ["消息"]
+    queue.stop(1)
+
+
+def test_stop_spools_message_being_sent(spool):
+    class SlowChannel(notifier.MockChannel):
+        def __init__(self):
+            super().__init__()
+            self.sending = threading.Event()
+            self.release = threading.Event()
+
+        def send(self, message):
+            self.sending.set()
+            self.release.wait(5)
+            super().send(message)
+
+    channel = SlowChannel()
+    queue = notifier.Notifier(channel, spool, min_interval=0, linger=0).start()
+    queue.submit("消息")
+    assert channel.sending.wait(5)
+    queue.stop(0.1)
+    with open(spool, encoding="utf-8") as file:
+        assert json.load(file) == ["消息"]
+
+    # 停止后发送完成的消息从 spool 文件中移除
+    channel.release.set()
+    deadline = time.monotonic() + 5
+    while os.path.exists(spool) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert channel.messages == ["消息"]
+    assert not os.path.exists(spool)
+
+
+def test_full_queue_spills_to_spool(spool):
+    queue = notifier.Notifier(notifier.MockChannel(), spool, queue_size=1)
+    queue.submit("1")
+    queue.submit("2")
+
+    with open(spool, encoding="utf-8") as file:
+        assert json.load(file) == ["2"]
+
+
+def test_push_uses_queue(config, data_dir, monkeypatch):
+    config["push"] = {"enable": True, "channel": "mock", "linger": 0.1}
+    monkeypatch.setattr(notifier, "_notifier", None)
+
+    push.strategy("选股结果")
+    push.statistics("涨停数")
+
+    queue = notifier.get()
+    assert queue.flush(5)
+    assert queue.channel.messages == ["选股结果\n涨停数"]
+    notifier.stop(1)
+
+
+def test_sigterm_spools_pending_messages(config, data_dir, monkeypatch):
+    config["push"] = {
+        "enable": True,
+        "channel": "mock",
+        "linger": 5,
+        "stop_timeout": 0.2,
+    }
+    monkeypatch.setattr(notifier, "_notifier", None)
+    previous = signal.getsignal(signal.SIGTERM)
+    try:
+        push.strategy("选股结果")
+        queue = notifier.get()
+        with pytest.raises(SystemExit):
+            signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+    assert queue.channel.messages == []
+    with open(notifier.spool_file(config["push"]), encoding="utf-8") as file:
+        assert json.load(file) == ["选股结果"]
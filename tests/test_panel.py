@@ -0,0 +1,47 @@
+# -*- encoding: UTF-8 -*-
+import numpy as np
+import talib as tl
+
+import panel
+
+
+def _stocks_data(bars):
+    first = bars(40, seed=1)
+    second = bars(40, seed=2).drop(index=[10, 11]).reset_index(drop=True)  # 停牌两天
+    third = bars(20, start="2022-02-01", seed=3)
+    stocks_data = {}
+    for stock, data in (
+        (("000001", "甲"), first),
+        (("000002", "乙"), second),
+        (("000003", "丙"), third),
+    ):
+        data["p_change"] = tl.ROC(data["收盘"].values, 1)
+        stocks_data[stock] = data
+    return stocks_data
+
+
+def test_build_aligns_dates(bars):
+    stocks_data = _stocks_data(bars)
+    market = panel.build(stocks_data)
+
+    assert market.values.shape == (3, 40, len(panel.FIELDS))
+    assert market.values.dtype == np.float32
+    close = market.field("收盘")
+    assert np.isnan(close[1, 10:12]).all()
+    assert np.isnan(close[2, : market.date_index("2022-01-31") + 1]).all()
+    np.testing.assert_allclose(
+        close[0], stocks_data[("000001", "甲")]["收盘"].values, rtol=1e-6
+    )
+
+
+def test_save_and_load(data_dir, bars):
+    stocks_data = _stocks_data(bars)
+    panel.save(panel.build(stocks_data))
+    market = panel.load()
+
+    assert isinstance(market.values, np.memmap)
+    assert market.stocks == list(stocks_data.keys())
+    data = market.frame("000002")
+    expected = stocks_data[("000002", "乙")]
+    assert data["日期"].tolist() == expected["日期"].tolist()
+    np.testing.assert_allclose(data["收盘"], expected["收盘"], rtol=1e-6)
@@ -0,0 +1,63 @@
+# -*- encoding: UTF-8 -*-
+import logging
+
+import numpy as np
+import pytest
+from conftest import make_universe
+
+import panel
+import work_flow
+from strategy import (
+    climax_limitdown,
+    enter,
+    keep_increasing,
+    turtle_trade,
+    wyckoff_accumulation,
+    wyckoff_divergence,
+)
+
+# 面板实现与逐只股票的check在每个截止日期上的结果必须一致
+STRATEGIES = [
+    (wyckoff_divergence.check, wyckoff_divergence.check_panel),
+    (wyckoff_accumulation.check, wyckoff_accumulation.check_panel),
+    (keep_increasing.check, keep_increasing.check_panel),
+    (enter.check_volume, enter.check_volume_panel),
+    (climax_limitdown.check, climax_limitdown.check_panel),
+    (turtle_trade.check_enter, turtle_trade.check_enter_panel),
+]
+
+
+@pytest.fixture(scope="module")
+def market():
+    logging.disable(logging.INFO)
+    yield panel.build(make_universe(n_stocks=50, n_days=260))
+    logging.disable(logging.NOTSET)
+
+
+@pytest.mark.parametrize(
+    "check, check_panel", STRATEGIES, ids=lambda f: f.__module__ + "." + f.__name__
+)
+def test_panel_matches_check(market, check, check_panel):
+    # 面板中的价格为float32，逐只股票的数据也从面板还原，保证两边输入完全相同
+    frames = {stock: market.frame(stock[0]) for stock in market.stocks}
+    hits = 0
+    for end_date in market.dates[100::4]:
+        end_date = end_date.astype(object)
+        expected = np.array(
+            [
+                bool(work_flow.check_enter(end_date, check)((stock, frames[stock])))
+                for stock in market.stocks
+            ]
+        )
+        actual = check_panel(market, end_date=end_date)
+        np.testing.assert_array_equal(actual, expected, err_msg=str(end_date))
+        hits += expected.sum()
+    assert hits > 0
+
+
+def test_liquidity_panel(market):
+    expected = [
+        work_flow.is_liquid_enough(stock, market.frame(stock[0]))
+        for stock in market.stocks
+    ]
+    np.testing.assert_array_equal(work_flow.is_liquid_enough_panel(market), expected)
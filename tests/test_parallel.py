@@ -0,0 +1,37 @@
+# -*- encoding: UTF-8 -*-
+import pytest
+from conftest import make_universe
+
+import work_flow
+from strategy import keep_increasing, turtle_trade, wyckoff_divergence
+
+STRATEGIES = {
+    "海龟交易法则": turtle_trade.check_enter,
+    "均线多头": keep_increasing.check,
+    "威克夫-缩量不跌": wyckoff_divergence.check,
+}
+
+
+def test_parallel_matches_serial(config):
+    stocks_data = make_universe(n_stocks=30, n_days=200)
+    expected = work_flow.evaluate(stocks_data, STRATEGIES)
+
+    config["workers"] = 3
+    actual = work_flow.evaluate(stocks_data, STRATEGIES)
+
+    assert actual == expected
+    assert sum(len(selected) for selected in expected.values()) > 0
+
+
+@pytest.mark.parametrize("end_date", [None, "2022-08-31"])
+def test_fused_matches_strategy_major(config, end_date):
+    config["end_date"] = end_date
+    stocks_data = make_universe(n_stocks=30, n_days=200)
+    expected = {}
+    for strategy, strategy_func in STRATEGIES.items():
+        m_filter = work_flow.check_enter(end_date=end_date, strategy_fun=strategy_func)
+        expected[strategy] = [
+            stock for stock in stocks_data if m_filter((stock, stocks_data[stock]))
+        ]
+
+    assert work_flow.evaluate_fused(stocks_data, STRATEGIES) == expected
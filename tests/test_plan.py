@@ -0,0 +1,86 @@
+# -*- encoding: UTF-8 -*-
+import numpy as np
+import pandas as pd
+
+import work_flow
+from strategy import (
+    climax_limitdown,
+    enter,
+    registry,
+    wyckoff_divergence,
+    wyckoff_spring,
+)
+
+SPOT = pd.DataFrame(
+    {
+        "代码": ["000001", "000002", "000003", "000004", "000005"],
+        "名称": ["涨", "跌停", "小涨", "停牌", "阴线"],
+        "最新价": [11.0, 9.0, 10.1, np.nan, 10.5],
+        "今开": [10.2, 9.8, 10.0, np.nan, 10.8],
+        "涨跌幅": [10.0, -10.0, 1.0, np.nan, 5.0],
+        "成交量": [500000.0, 800000.0, 10.0, np.nan, 500000.0],
+    }
+)
+STOCKS = [tuple(x) for x in SPOT[["代码", "名称"]].values]
+
+
+def test_plan_keeps_union_of_candidates():
+    strategies = {"放量上涨": enter.check_volume, "放量跌停": climax_limitdown.check}
+
+    planned = work_flow.plan(SPOT, STOCKS, strategies)
+
+    # 停牌股票快照没有数据，无法排除
+    assert planned == [STOCKS[0], STOCKS[1], STOCKS[3]]
+
+
+def test_plan_without_snapshot_filter_keeps_all():
+    strategies = {
+        "缩量不跌": wyckoff_divergence.check,
+        "弹簧": wyckoff_spring.check,
+    }
+    assert work_flow.plan(SPOT, STOCKS, strategies) == STOCKS
+
+
+def test_plan_skipped_for_backtest(config):
+    config["end_date"] = "2024-01-02"
+    strategies = {"放量跌停": climax_limitdown.check}
+    assert work_flow.plan(SPOT, STOCKS, strategies) == STOCKS
+
+
+def test_snapshot_filters_are_necessary():
+    from conftest import make_universe
+
+    universe = make_universe(n_stocks=40, n_days=200)
+    for strategy in registry.STRATEGIES:
+        check, snapshot_filter = strategy.func, strategy.snapshot
+        if snapshot_filter is None or strategy.needs_top_list:
+            continue
+        for end in range(120, 200, 3):
+            rows = []
+            for stock, data in universe.items():
+                data = data.iloc[:end]
+                last = data.iloc[-1]
+                rows.append(
+                    {
+                        "代码": stock[0],
+                        "最新价": last["收盘"],
+                        "今开": last["开盘"],
+                        "涨跌幅": round(last["p_change"], 2),
+                        "成交量": last["成交量"],
+                        "selected": bool(check(stock, data)),
+                    }
+                )
+            spot = pd.DataFrame(rows)
+            assert snapshot_filter(spot)[spot["selected"]].all(), check.__module__
+
+
+def test_select_keeps_all_stocks_when_saving_panel(config, data_dir, monkeypatch):
+    monkeypatch.setattr(work_flow.datasource, "call", lambda endpoint, **kw: SPOT)
+    config["strategies"] = ["放量上涨"]
+
+    _, stocks, _ = work_flow.select()
+    assert len(stocks) < len(STOCKS)
+
+    config["panel"] = True
+    _, stocks, _ = work_flow.select()
+    assert stocks == STOCKS
@@ -0,0 +1,79 @@
+# -*- encoding: UTF-8 -*-
+import pstats
+
+from conftest import make_bars, make_universe
+
+import profiling
+import work_flow
+from strategy import registry
+
+
+def test_session_writes_reports(config, tmp_path):
+    config["profile"] = {"enable": True, "sample": 0.5, "interval": 0.001}
+    universe = make_universe(n_stocks=20, n_days=200)
+    strategies = registry.enabled(["海龟交易法则", "威克夫-吸筹完成"])
+
+    with profiling.session(str(tmp_path)):
+        expected = work_flow.evaluate(universe, strategies)
+    # 分析结束后不再经过 Profiler，结果与分析时一致
+    assert work_flow.evaluate(universe, strategies) == expected
+
+    for strategy in strategies:
+        report = (tmp_path / (strategy + ".txt")).read_text(encoding="utf-8")
+        assert report.startswith("策略: {}".format(strategy))
+        assert "按 tottime 排序" in report
+        assert pstats.Stats(str(tmp_path / (strategy + ".prof"))).total_calls > 0
+        assert (tmp_path / (strategy + ".folded")).exists()
+
+
+def test_anti_patterns(config, tmp_path):
+    def slow(code_name, data, end_date=None):
+        total = 0.0
+        for _, row in data.copy().iterrows():
+            total += row["收盘"]
+        return total > 0
+
+    profiler = profiling.Profiler(sample=1.0)
+    universe = make_universe(n_stocks=3, n_days=100)
+    for stock, data in universe.items():
+        profiler.call("slow", slow, stock, data)
+
+    _, findings = profiler.report("slow")
+    line = slow.__code__.co_firstlineno + 2
+    site = "tests/test_profiling.py:{}(slow)".format(line)
+    assert any(f.startswith("iterrows") and site in f for f in findings)
+    assert any(f.startswith("DataFrame.copy") and site in f for f in findings)
+
+
+def test_internal_copies_are_not_reported(config):
+    def fast(code_name, data, end_date=None):
+        return data.tail(30)["收盘"].to_numpy().mean() > 0
+
+    profiler = profiling.Profiler(sample=1.0)
+    for stock, data in make_universe(n_stocks=3, n_days=100).items():
+        for _ in range(50):
+            profiler.call("fast", fast, stock, data)
+
+    _, findings = profiler.report("fast")
+    assert not any(f.startswith("DataFrame.copy") for f in findings)
+
+
+def test_missing_pandas_internals_are_skipped(monkeypatch):
+    monkeypatch.setattr(
+        profiling,
+        "ANTI_PATTERNS",
+        [("core.indexing._Removed.__getitem__", 0, "已移除", r"\.x\[")]
+        + profiling.ANTI_PATTERNS[:1],
+    )
+    profiler = profiling.Profiler(sample=1.0)
+    data = make_bars(30)
+    profiler.call("slow", lambda: [row for _, row in data.iterrows()])
+
+    _, findings = profiler.report("slow")
+    assert len(findings) == 1 and findings[0].startswith("iterrows")
+
+
+def test_disabled_session(config):
+    with profiling.session() as profiler:
+        assert profiler is None
+        assert profiling.call("a", max, 1, 2) == 2
@@ -0,0 +1,49 @@
+# -*- encoding: UTF-8 -*-
+import numpy as np
+import pytest
+from conftest import make_universe
+
+import settings
+from strategy import registry, wyckoff_divergence, wyckoff_spring
+
+
+def test_enabled():
+    assert set(registry.enabled()) == {
+        "威克夫-弹簧",
+        "威克夫-缩量不跌",
+        "威克夫-SC反弹",
+        "威克夫-吸筹完成",
+    }
+    assert registry.enabled(["停机坪"]) == {"停机坪": registry.get("停机坪").func}
+    with pytest.raises(KeyError):
+        registry.enabled(["不存在"])
+
+
+def test_lookback():
+    strategies = {
+        "威克夫-弹簧": wyckoff_spring.check,
+        "威克夫-缩量不跌": wyckoff_divergence.check,
+    }
+    assert registry.lookback(strategies) == 61
+    assert not registry.needs_top_list(strategies)
+
+    # 没有登记的策略需要全部历史
+    strategies["自定义"] = lambda code_name, data, end_date=None: False
+    assert registry.lookback(strategies) is None
+
+
+def test_lookback_is_sufficient(monkeypatch):
+    universe = make_universe(n_stocks=30, n_days=400)
+    codes = [stock[0] for stock in universe]
+    monkeypatch.setattr(settings, "load_top_list", lambda today=None: codes)
+    for strategy in registry.STRATEGIES:
+        bars = registry.lookback({strategy.name: strategy.func})
+        for stock, data in universe.items():
+            for end in range(330, 400, 7):
+                full = data.iloc[:end]
+                # 窗口第一根K线的涨跌幅在只下载窗口时无法计算
+                window = full.tail(bars).reset_index(drop=True)
+                window.loc[0, "p_change"] = np.nan
+                assert bool(strategy.func(stock, full)) == bool(
+                    strategy.func(stock, window)
+                ), (strategy.name, stock, end)
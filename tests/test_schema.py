@@ -0,0 +1,59 @@
+# -*- encoding: UTF-8 -*-
+import datetime
+
+import numpy as np
+from conftest import make_universe
+
+import bars
+import schema
+import settings
+import utils
+import work_flow
+from strategy import registry
+
+
+def test_compact_dtypes():
+    stock, data = next(iter(make_universe(n_stocks=1, n_days=60).items()))
+    data = utils.index_by_date(data)
+    compacted = schema.compact(data)
+
+    assert dict(compacted.dtypes) == {
+        column: np.dtype(dtype) for column, dtype in schema.COLUMNS.items()
+    }
+    assert compacted.index.equals(data.index)
+    assert utils.ensure_date(compacted["日期"].iloc[0]) == data["日期"].iloc[0]
+    assert utils.ensure_date(compacted.iloc[0]["日期"]) == data["日期"].iloc[0]
+    assert utils.end_index(compacted, datetime.date(2022, 1, 5)) == 2
+
+
+def test_memory_report():
+    universe = {
+        stock: utils.index_by_date(data)
+        for stock, data in make_universe(n_stocks=5, n_days=120).items()
+    }
+    compacted = {stock: schema.compact(data) for stock, data in universe.items()}
+    report = schema.memory_report(universe, compacted)
+
+    assert report["stocks"] == 5
+    assert report["bars"] == sum(len(data) for data in universe.values())
+    assert report["after_bytes"] < report["before_bytes"] / 2
+    assert report["ratio"] == report["after_bytes"] / report["before_bytes"]
+
+
+def test_strategies_match_on_compact_bars(config, monkeypatch):
+    universe = {
+        stock: utils.index_by_date(data)
+        for stock, data in make_universe(n_stocks=30, n_days=320).items()
+    }
+    codes = [stock[0] for stock in universe]
+    monkeypatch.setattr(settings, "load_top_list", lambda today=None: codes)
+    plain = {stock: bars.freeze(data) for stock, data in universe.items()}
+    compacted = {
+        stock: bars.freeze(schema.compact(data)) for stock, data in universe.items()
+    }
+
+    strategies = registry.enabled([strategy.name for strategy in registry.STRATEGIES])
+
+    expected = work_flow.evaluate(plain, strategies)
+    assert any(expected.values())
+    assert work_flow.evaluate(compacted, strategies) == expected
@@ -0,0 +1,272 @@
+# -*- encoding: UTF-8 -*-
+import pytest
+import talib as tl
+from conftest import make_universe
+
+from strategy import (
+    breakthrough_platform,
+    climax_limitdown,
+    enter,
+    keep_increasing,
+    parking_apron,
+    turtle_trade,
+    wyckoff_selling_climax,
+    wyckoff_spring,
+)
+
+# 改为信号序列之前逐行扫描的实现，新的check在每个截止日期上的结果必须与之一致
+
+
+def ref_check_enter(data, end_date, threshold=60):
+    data = data.loc[data["日期"] <= end_date].tail(threshold)
+    if len(data) < threshold:
+        return False
+    return data["收盘"].iloc[-1] >= max(0, data["收盘"].max())
+
+
+def ref_volume_ratio(data, end_date, threshold, accept):
+    if len(data) < threshold:
+        return False
+    data = data.assign(vol_ma5=tl.MA(data["成交量"].to_numpy(dtype=float), 5))
+    data = data.loc[data["日期"] <= end_date]
+    if data.empty or not accept(data.iloc[-1]):
+        return False
+    data = data.tail(threshold + 1)
+    if len(data) < threshold + 1:
+        return False
+    last = data.iloc[-1]
+    if last["收盘"] * last["成交量"] * 100 < 200000000:
+        return False
+    return last["成交量"] / data.iloc[-2]["vol_ma5"]
+
+
+def ref_check_volume(data, end_date, threshold=60):
+    ratio = ref_volume_ratio(
+        data,
+        end_date,
+        threshold,
+        lambda last: not (last["p_change"] < 2 or last["收盘"] < last["开盘"]),
+    )
+    return ratio is not False and ratio >= 2
+
+
+def ref_climax(data, end_date, threshold=60):
+    ratio = ref_volume_ratio(
+        data, end_date, threshold, lambda last: not last["p_change"] > -9.5
+    )
+    return ratio is not False and ratio >= 4
+
+
+def ref_keep_increasing(data, end_date, threshold=30):
+    ma30 = tl.MA(data["收盘"].to_numpy(dtype=float), 30)
+    ma30 = ma30[: int((data["日期"] <= end_date).sum())][-threshold:]
+    if len(ma30) < threshold:
+        return False
+    step1, step2 = round(threshold / 3), round(threshold * 2 / 3)
+    return ma30[0] < ma30[step1] < ma30[step2] < ma30[-1] and ma30[-1] > 1.2 * ma30[0]
+
+
+def ref_parking_apron(data, end_date, threshold=15):
+    window = data.loc[data["日期"] <= end_date]
+    if len(window) < threshold:
+        return False
+    window = window.tail(threshold)
+    flag = False
+    for _, row in window.iterrows():
+        if row["p_change"] > 9.5 and ref_check_enter(data, row["日期"], threshold):
+            after = window.loc[window["日期"] > row["日期"]].head(3)
+            if len(after) < 3:
+                continue
+            ok = all(
+                0.97 < day["收盘"] / day["开盘"] < 1.03
+                and day["收盘"] > row["收盘"]
+                and day["开盘"] > row["收盘"]
+                for _, day in after.iterrows()
+            )
+            ok &= all(-5 < day["p_change"] < 5 for _, day in after.tail(2).iterrows())
+            flag |= ok
+    return flag
+
+
+def ref_breakthrough(data, end_date, threshold=60):
+    if len(data) < threshold:
+        return False
+    data = data.assign(ma60=tl.MA(data["收盘"].to_numpy(dtype=float), 60))
+    window = data.loc[data["日期"] <= end_date].tail(threshold)
+    breakthrough = None
+    for _, row in window.iterrows():
+        if row["开盘"] < row["ma60"] <= row["收盘"]:
+            if ref_check_volume(data, row["日期"], threshold):
+                breakthrough = row
+    if breakthrough is None:
+        return False
+    front = window.loc[window["日期"] < breakthrough["日期"]]
+    return all(
+        -0.05 < (row["ma60"] - row["收盘"]) / row["ma60"] < 0.2
+        for _, row in front.iterrows()
+    )
+
+
+def ref_wyckoff_spring(data, end_date, threshold=60):
+    if len(data) < threshold:
+        return False
+    data = data.assign(vol_ma20=tl.MA(data["成交量"].to_numpy(dtype=float), 20))
+    data = data.loc[data["日期"] <= end_date]
+    if len(data) < threshold:
+        return False
+    recent_30 = data.tail(30)
+    box_high = recent_30["最高"].max()
+    box_low = recent_30["最低"].min()
+    box_range = (box_high - box_low) / box_low
+    if box_range > 0.15 or box_range < 0.05:
+        return False
+    recent_5 = data.tail(5)
+    for i in range(len(recent_5) - 2):
+        day_break = recent_5.iloc[i]
+        day_spring = recent_5.iloc[i + 1]
+        day_confirm = recent_5.iloc[i + 2]
+        if day_break["收盘"] > box_low * 0.98:
+            continue
+        if day_break["成交量"] > day_break["vol_ma20"] * 1.5:
+            continue
+        if day_spring["收盘"] < box_low:
+            continue
+        if (
+            day_confirm["收盘"] > day_confirm["开盘"]
+            and day_confirm["p_change"] > 2
+            and day_confirm["成交量"] > day_confirm["vol_ma20"] * 1.3
+        ):
+            return True
+    return False
+
+
+def ref_wyckoff_selling_climax(data, end_date, threshold=60):
+    if len(data) < threshold:
+        return False
+    data = data.assign(vol_ma20=tl.MA(data["成交量"].to_numpy(dtype=float), 20))
+    data = data.loc[data["日期"] <= end_date]
+    if len(data) < threshold:
+        return False
+    recent_30 = data.tail(30)
+    for i in range(len(recent_30) - 5):
+        sc_day = recent_30.iloc[i]
+        if not (sc_day["p_change"] < -7 and sc_day["成交量"] > sc_day["vol_ma20"] * 2):
+            continue
+        next_days = recent_30.iloc[i + 1 : i + 4]
+        if not any(day["p_change"] > 5 for _, day in next_days.iterrows()):
+            continue
+        st_days = recent_30.iloc[i + 3 : min(i + 10, len(recent_30))]
+        if len(st_days) < 3:
+            continue
+        if not any(
+            day["最低"] <= sc_day["最低"] * 1.05
+            and day["成交量"] < sc_day["成交量"] * 0.6
+            for _, day in st_days.iterrows()
+        ):
+            continue
+        last = recent_30.iloc[-1]
+        if (
+            last["收盘"] > last["开盘"]
+            and last["p_change"] > 2
+            and last["收盘"] > sc_day["收盘"] * 1.05
+        ):
+            return True
+    return False
+
+
+def inject_parking_apron(data, day):
+    """在day制造一个创15日新高的涨停，之后3天在涨停价之上窄幅整理"""
+    data = data.copy()
+    limitup = max(data["收盘"].iloc[day - 15 : day].max(), data["收盘"].iloc[day - 1])
+    limitup = round(limitup * 1.1, 2)
+    data.loc[day, ["开盘", "收盘"]] = [limitup / 1.08, limitup]
+    for offset, change in enumerate((1.02, 1.03, 1.02), start=1):
+        data.loc[day + offset, ["开盘", "收盘"]] = [limitup * change, limitup * 1.03]
+    data["p_change"] = tl.ROC(data["收盘"].to_numpy(dtype=float), 1)
+    return data
+
+
+def inject_wyckoff_spring(data, day):
+    """
+    day之前30天为7%的箱体，day-2收盘跌破箱体低点（最低价仍取箱体低点，
+    收盘低于最低价的K线才能满足条件），day-1收回，day放量上涨
+    """
+    data = data.copy()
+    price = data["收盘"].iloc[day - 30]
+    volume = data["成交量"].iloc[day - 50 : day - 30].mean()
+    box = slice(day - 29, day)
+    data.loc[box, ["开盘", "收盘", "最高", "最低"]] = [
+        price,
+        price,
+        price * 1.05,
+        price * 0.98,
+    ]
+    data.loc[box, "成交量"] = volume
+    data.loc[day - 2, "收盘"] = price * 0.95
+    data.loc[day, ["收盘", "成交量"]] = [price * 1.03, volume * 2]
+    data["p_change"] = tl.ROC(data["收盘"].to_numpy(dtype=float), 1)
+    return data
+
+
+def inject_wyckoff_selling_climax(data, day):
+    """day-20放量大跌（SC），次日反弹7%（AR），day-16缩量回到SC低点（ST），day放量上涨"""
+    data = data.copy()
+    sc = day - 20
+    volume = data["成交量"].iloc[sc - 20 : sc].mean()
+    close = data["收盘"].iloc[sc - 1] * 0.9
+    data.loc[sc, ["收盘", "最低", "成交量"]] = [close, close * 0.99, volume * 5]
+    data.loc[sc + 1, "收盘"] = close * 1.07
+    data.loc[sc + 4, ["最低", "成交量"]] = [close * 0.99, volume]
+    last = max(data["收盘"].iloc[day - 1] * 1.03, close * 1.1)
+    data.loc[day, ["开盘", "收盘"]] = [data["收盘"].iloc[day - 1], last]
+    data["p_change"] = tl.ROC(data["收盘"].to_numpy(dtype=float), 1)
+    return data
+
+
+@pytest.fixture(scope="module")
+def universe():
+    universe = make_universe(n_stocks=24, n_days=220, seed=3)
+    for i, stock in enumerate(list(universe)):
+        data = universe[stock]
+        if i < 12:
+            universe[stock] = inject_parking_apron(data, len(data) - 70 + i * 5)
+        elif i < 18:
+            universe[stock] = inject_wyckoff_spring(data, len(data) - 60 + i)
+        else:
+            universe[stock] = inject_wyckoff_selling_climax(data, len(data) - 60 + i)
+    return universe
+
+
+CASES = [
+    (turtle_trade.check_enter, turtle_trade.check_enter_series, ref_check_enter),
+    (enter.check_volume, enter.check_volume_series, ref_check_volume),
+    (climax_limitdown.check, climax_limitdown.check_series, ref_climax),
+    (keep_increasing.check, keep_increasing.check_series, ref_keep_increasing),
+    (parking_apron.check, parking_apron.check_series, ref_parking_apron),
+    (breakthrough_platform.check, breakthrough_platform.check_series, ref_breakthrough),
+    (wyckoff_spring.check, wyckoff_spring.check_series, ref_wyckoff_spring),
+    (
+        wyckoff_selling_climax.check,
+        wyckoff_selling_climax.check_series,
+        ref_wyckoff_selling_climax,
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "check, check_series, reference",
+    CASES,
+    ids=[case[1].__module__ + "." + case[1].__name__ for case in CASES],
+)
+def test_series_matches_reference(universe, check, check_series, reference):
+    hits = 0
+    for stock, data in universe.items():
+        series = check_series(stock, data)
+        assert len(series) == len(data)
+        for i in range(40, len(data), 3):
+            end_date = data["日期"].iloc[i]
+            expected = bool(reference(data, end_date))
+            assert bool(series[i]) == expected, (stock, end_date)
+            assert bool(check(stock, data, end_date)) == expected
+            hits += expected
+    assert hits > 0
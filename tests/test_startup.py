@@ -0,0 +1,58 @@
+# -*- encoding: UTF-8 -*-
+import datetime
+import json
+import subprocess
+import sys
+
+import pandas as pd
+
+import datasource
+import settings
+
+
+def test_top_list_is_fetched_once_a_day(data_dir, monkeypatch):
+    calls = []
+
+    def fetch(endpoint, **kwargs):
+        calls.append(endpoint)
+        return pd.DataFrame({"代码": ["000001", "000002"], "买方机构次数": [2, 1]})
+
+    monkeypatch.setattr(datasource, "call", fetch)
+    monkeypatch.setattr(settings, "_top_list", None)
+    today = datetime.date(2024, 6, 3)
+
+    assert settings.load_top_list(today) == ["000001"]
+    assert settings.load_top_list(today) == ["000001"]
+    # 重新启动后读取当天保存的文件
+    monkeypatch.setattr(settings, "_top_list", None)
+    assert settings.load_top_list(today) == ["000001"]
+    assert calls == ["stock_lhb_stock_statistic_em"]
+    with open(settings.top_list_file(), encoding="utf-8") as file:
+        assert json.load(file) == {"date": "2024-06-03", "codes": ["000001"]}
+
+    # 第二天重新获取
+    settings.load_top_list(today + datetime.timedelta(days=1))
+    assert len(calls) == 2
+
+
+def test_top_list_attribute(monkeypatch):
+    monkeypatch.setattr(settings, "load_top_list", lambda today=None: ["600000"])
+    assert settings.top_list == ["600000"]
+
+
+def test_startup_imports():
+    """导入 work_flow 和 settings 不导入 akshare、talib 和未启用的策略模块"""
+    code = (
+        "import sys, settings, work_flow\n"
+        "from strategy import registry\n"
+        "registry.enabled(['海龟交易法则'])\n"
+        "loaded = [name for name in sys.modules if name.startswith('strategy.')]\n"
+        "lazy = [type(sys.modules.get(name)).__name__ for name in ('akshare', 'talib')]\n"
+        "print(sorted(loaded), lazy)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "['strategy.registry', 'strategy.turtle_trade'] " + str(
+        ["_LazyModule", "_LazyModule"]
+    )
@@ -0,0 +1,194 @@
+# -*- encoding: UTF-8 -*-
+import concurrent.futures
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_fetcher
+import datasource
+import store
+import trade_calendar
+import utils
+
+
+def test_append_dedup_by_date(data_dir, bars):
+    history = bars(20)
+    store.append("000001", history.head(15))
+    data = store.append("000001", history.iloc[14:])
+
+    assert len(data) == 20
+    assert data["日期"].is_monotonic_increasing
+    assert store.last_date("000001") == history["日期"].iloc[-1]
+    assert not list((data_dir / "raw").glob("*.tmp"))
+
+
+def test_concurrent_writes(data_dir, bars):
+    history = bars(200)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: store.write("000001", history), range(32)))
+
+    pd.testing.assert_frame_equal(store.load("000001"), history)
+    assert not list((data_dir / "raw").glob("*.tmp"))
+
+
+def test_adjust():
+    data = pd.DataFrame(
+        {
+            "日期": [datetime.date(2023, 1, d) for d in (3, 4, 5, 6)],
+            "开盘": [10.0, 10.0, 5.0, 5.0],
+            "收盘": [10.0, 10.0, 5.0, 5.0],
+            "最高": [10.0, 10.0, 5.0, 5.0],
+            "最低": [10.0, 10.0, 5.0, 5.0],
+        }
+    )
+    factors = pd.DataFrame(
+        {
+            "日期": [datetime.date(1900, 1, 1), datetime.date(2023, 1, 5)],
+            "hfq_factor": [1.0, 2.0],
+        }
+    )
+
+    qfq = store.adjust(data, factors, "qfq")
+    hfq = store.adjust(data, factors, "hfq")
+
+    np.testing.assert_allclose(qfq["收盘"], [5.0, 5.0, 5.0, 5.0])
+    np.testing.assert_allclose(hfq["收盘"], [10.0, 10.0, 10.0, 10.0])
+    assert data["收盘"].tolist() == [10.0, 10.0, 5.0, 5.0]
+    assert store.adjust(data, factors, "") is data
+
+
+@pytest.fixture
+def remote(bars, monkeypatch):
+    """模拟东方财富不复权行情与新浪复权因子接口，记录请求"""
+    remote = {"history": bars(30), "end": None, "hist": [], "factors": []}
+    remote["factor_table"] = pd.DataFrame(
+        {"date": [datetime.date(1900, 1, 1)], "hfq_factor": ["1.0"]}
+    )
+
+    def stock_zh_a_hist(symbol, period, start_date, adjust):
+        assert adjust == ""
+        remote["hist"].append(start_date)
+        history = remote["history"]
+        dates = history["日期"].map(lambda d: d.strftime("%Y%m%d"))
+        return history.loc[(dates >= start_date) & (dates <= remote["end"])]
+
+    def stock_zh_a_daily(symbol, adjust):
+        remote["factors"].append(symbol)
+        return remote["factor_table"]
+
+    monkeypatch.setattr(datasource.ak, "stock_zh_a_hist", stock_zh_a_hist)
+    monkeypatch.setattr(datasource.ak, "stock_zh_a_daily", stock_zh_a_daily)
+    return remote
+
+
+def test_fetch_only_downloads_new_bars(data_dir, remote):
+    history = remote["history"]
+    remote["end"] = history["日期"].iloc[-2].strftime("%Y%m%d")
+    first = data_fetcher.fetch(("000001", "平安银行"))
+    remote["end"] = history["日期"].iloc[-1].strftime("%Y%m%d")
+    second = data_fetcher.fetch(("000001", "平安银行"))
+
+    assert len(first) == 29
+    assert len(second) == 30
+    assert remote["hist"] == [
+        data_fetcher.START_DATE,
+        history["日期"].iloc[-2].strftime("%Y%m%d"),
+    ]
+    # 没有除权时只在首次下载时获取复权因子
+    assert remote["factors"] == ["sz000001"]
+    assert second["p_change"].iloc[-2] == first["p_change"].iloc[-1]
+
+
+def test_fetch_skips_request_when_up_to_date(data_dir, remote, monkeypatch):
+    history = remote["history"]
+    last = history["日期"].iloc[-1]
+    remote["end"] = last.strftime("%Y%m%d")
+    close = datetime.datetime.combine(last, datetime.time(15, 0))
+    monkeypatch.setattr(trade_calendar, "last_close", lambda now=None: close)
+    first = data_fetcher.fetch(("000001", "平安银行"))
+
+    # 收盘数据稳定后写入的，不再请求
+    second = data_fetcher.fetch(("000001", "平安银行"))
+    assert len(remote["hist"]) == 1
+    pd.testing.assert_frame_equal(pd.DataFrame(first), pd.DataFrame(second))
+
+    # 盘中写入的最后一根K线需要重新下载
+    os.utime(store.path("000001"), (close.timestamp(), close.timestamp()))
+    data_fetcher.fetch(("000001", "平安银行"))
+    assert remote["hist"][-1] == last.strftime("%Y%m%d")
+    assert len(remote["hist"]) == 2
+
+
+def test_ex_rights_refreshes_factors(data_dir, remote):
+    history = remote["history"]
+    remote["end"] = history["日期"].iloc[-2].strftime("%Y%m%d")
+    data_fetcher.fetch(("000001", "平安银行"))
+
+    # 最后一天10送10：不复权价格减半，涨跌额按除权后的昨收计算
+    ex_date = history["日期"].iloc[-1]
+    prev_close = history["收盘"].iloc[-2]
+    history.loc[history.index[-1], "收盘"] = round(prev_close / 2 + 0.1, 2)
+    history.loc[history.index[-1], "涨跌额"] = 0.1
+    remote["end"] = ex_date.strftime("%Y%m%d")
+    remote["factor_table"] = pd.DataFrame(
+        {"date": [datetime.date(1900, 1, 1), ex_date], "hfq_factor": ["1.0", "2.0"]}
+    )
+    data = data_fetcher.fetch(("000001", "平安银行"))
+
+    assert remote["factors"] == ["sz000001", "sz000001"]
+    assert data["收盘"].iloc[-2] == pytest.approx(prev_close / 2)
+    assert data["p_change"].iloc[-1] == pytest.approx(0.1 / (prev_close / 2) * 100)
+
+
+def test_ex_rights_with_backfill():
+    dates = [datetime.date(2023, 1, d) for d in (2, 3, 4, 5, 6)]
+    close = [10.0, 5.0, 5.5, 5.0, 5.5]
+    change = [0.0, 0.0, 0.5, -0.5, 0.5]
+    remote = pd.DataFrame({"日期": dates, "收盘": close, "涨跌额": change})
+    stored = remote.iloc[3:4]
+
+    # 从本地第一天之前补齐历史，本地之前的除权（1月3日）已在复权因子中
+    assert not store.has_ex_rights(stored, remote)
+    assert not store.has_ex_rights(stored, remote.iloc[::-1])
+
+    remote.loc[4, ["收盘", "涨跌额"]] = [2.75, 0.25]
+    assert store.has_ex_rights(stored, remote)
+
+
+def test_fetch_lookback_window(config, data_dir, remote):
+    history = remote["history"]
+    remote["end"] = history["日期"].iloc[-1].strftime("%Y%m%d")
+    config["end_date"] = history["日期"].iloc[-1]
+
+    data = data_fetcher.fetch(("000001", "平安银行"), lookback=5)
+    assert remote["hist"] == [data_fetcher.history_start(5)]
+    assert len(data) == 5
+    assert utils.ensure_date(data["日期"].iloc[-1]) == history["日期"].iloc[-1]
+    stored = len(store.load("000001"))
+    assert 5 <= stored < len(history)
+
+    # 窗口变长后补齐本地缺少的历史
+    data = data_fetcher.fetch(("000001", "平安银行"), lookback=stored + 1)
+    assert remote["hist"][-1] == data_fetcher.history_start(stored + 1)
+    assert len(data) == stored + 1
+    assert len(store.load("000001")) > stored
+
+
+def test_full_history_after_windowed_fetch(config, data_dir, remote):
+    history = remote["history"]
+    remote["end"] = history["日期"].iloc[-1].strftime("%Y%m%d")
+    config["end_date"] = history["日期"].iloc[-1]
+    data_fetcher.fetch(("000001", "平安银行"), lookback=5)
+    assert len(store.load("000001")) < len(history)
+
+    # 需要全部历史时从START_DATE重新下载
+    data = data_fetcher.fetch(("000001", "平安银行"))
+    assert remote["hist"][-1] == data_fetcher.START_DATE
+    assert len(data) == len(history)
+
+    # 上市晚于START_DATE，之后只做增量下载
+    data_fetcher.fetch(("000001", "平安银行"))
+    assert remote["hist"][-1] == history["日期"].iloc[-1].strftime("%Y%m%d")
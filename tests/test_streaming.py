@@ -0,0 +1,64 @@
+# -*- encoding: UTF-8 -*-
+import time
+
+from conftest import make_universe
+
+import data_fetcher
+import work_flow
+from strategy import keep_increasing, turtle_trade
+
+
+def test_streaming_matches_batch(config, monkeypatch):
+    stocks_data = make_universe(n_stocks=30, n_days=200)
+    stocks = list(stocks_data.keys())
+    stocks.append(("999999", "下载失败"))
+    strategies = {
+        "海龟交易法则": turtle_trade.check_enter,
+        "均线多头": keep_increasing.check,
+    }
+
+    def fetch(stock, lookback=None):
+        if stock[0] == "999999":
+            raise ConnectionError("down")
+        time.sleep(0.001 * (int(stock[0]) % 5))
+        return stocks_data[stock].copy()
+
+    monkeypatch.setattr(data_fetcher, "fetch", fetch)
+    expected = work_flow.evaluate(stocks_data, strategies)
+
+    config["pipeline_queue_size"] = 4
+    actual = work_flow.evaluate_streaming(stocks, strategies)
+
+    assert actual == expected
+
+
+def test_stream_queue_is_bounded(monkeypatch):
+    stocks = [("{:06d}".format(i), "") for i in range(40)]
+    started = []
+
+    def fetch(stock, lookback=None):
+        started.append(stock)
+        return make_universe(n_stocks=1, n_days=5)[("000000", "股票0")]
+
+    monkeypatch.setattr(data_fetcher, "fetch", fetch)
+    stream = data_fetcher.stream(stocks, queue_size=2)
+    next(stream)
+    time.sleep(0.2)
+    # 消费者停下后，最多只有队列里的2只、每个下载线程手上的1只和已取出的1只完成下载
+    assert len(started) <= 2 + 8 + 1
+    assert len(list(stream)) == 39
+
+
+def test_stream_stops_early(monkeypatch):
+    stocks = [("{:06d}".format(i), "") for i in range(100)]
+    monkeypatch.setattr(
+        data_fetcher,
+        "fetch",
+        lambda stock, lookback=None: make_universe(n_stocks=1, n_days=5)[
+            ("000000", "股票0")
+        ],
+    )
+
+    stream = data_fetcher.stream(stocks, queue_size=1)
+    next(stream)
+    stream.close()
@@ -0,0 +1,99 @@
+# -*- encoding: UTF-8 -*-
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import datasource
+import trade_calendar
+
+# conftest 把 load 替换为周一至周五，这里保留原来的实现
+load = trade_calendar.load
+
+# 2023年春节：1月21日至27日休市，日历截至1月31日
+DAYS = [
+    datetime.date(2023, 1, 18),
+    datetime.date(2023, 1, 19),
+    datetime.date(2023, 1, 20),
+    datetime.date(2023, 1, 30),
+    datetime.date(2023, 1, 31),
+]
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    calendar = trade_calendar.Calendar(np.array(DAYS, dtype="datetime64[D]"))
+    monkeypatch.setattr(trade_calendar, "_calendar", calendar)
+    monkeypatch.setattr(trade_calendar, "_checked", datetime.date.today())
+    return calendar
+
+
+def test_holidays(calendar):
+    assert calendar.is_trading_day(datetime.date(2023, 1, 20))
+    assert not calendar.is_trading_day(datetime.date(2023, 1, 23))
+    assert calendar.previous_trading_day(datetime.date(2023, 1, 30)) == DAYS[2]
+    assert calendar.previous_trading_day(datetime.date(2023, 1, 25), 2) == DAYS[1]
+    assert calendar.next_trading_day(datetime.date(2023, 1, 20)) == DAYS[3]
+    assert calendar.next_trading_day("2023-01-18", 3) == DAYS[3]
+    assert list(calendar.trading_days_between("2023-01-19", "2023-01-30")) == [
+        np.datetime64(day) for day in DAYS[1:4]
+    ]
+
+
+def test_after_calendar_uses_weekdays(calendar):
+    assert calendar.next_trading_day(datetime.date(2023, 1, 31)) == datetime.date(
+        2023, 2, 1
+    )
+    assert calendar.next_trading_day(datetime.date(2023, 1, 30), 5) == datetime.date(
+        2023, 2, 6
+    )
+    assert not calendar.is_trading_day(datetime.date(2023, 2, 4))
+    assert calendar.previous_trading_day(datetime.date(2023, 2, 6)) == datetime.date(
+        2023, 2, 3
+    )
+    assert calendar.previous_trading_day(datetime.date(2023, 2, 2), 3) == DAYS[3]
+    assert len(calendar.trading_days_between("2023-01-30", "2023-02-05")) == 5
+    with pytest.raises(ValueError):
+        calendar.previous_trading_day(DAYS[0])
+
+
+def test_last_close(calendar):
+    close = datetime.datetime(2023, 1, 20, 15, 0)
+
+    assert trade_calendar.last_close(datetime.datetime(2023, 1, 20, 16)) == close
+    assert trade_calendar.last_close(datetime.datetime(2023, 1, 25, 12)) == close
+    assert trade_calendar.last_close(datetime.datetime(2023, 1, 30, 9)) == close
+
+
+def test_load_caches_and_works_offline(data_dir, monkeypatch):
+    calls = []
+
+    def call(endpoint, **kwargs):
+        calls.append(endpoint)
+        return pd.DataFrame({"trade_date": DAYS})
+
+    monkeypatch.setattr(datasource, "call", call)
+    today = datetime.date(2023, 1, 20)
+    assert list(load(today).days) == [np.datetime64(day) for day in DAYS]
+    assert list(load(today).days) == [np.datetime64(day) for day in DAYS]
+    assert calls == ["tool_trade_date_hist_sina"]
+
+    # 日历不再覆盖之后的交易日时重新获取，失败时使用本地文件
+    def offline(endpoint, **kwargs):
+        raise ConnectionError("离线")
+
+    monkeypatch.setattr(datasource, "call", offline)
+    calendar = load(datetime.date(2023, 2, 1))
+    assert calendar.is_trading_day(datetime.date(2023, 1, 30))
+
+
+def test_load_without_calendar_falls_back_to_weekdays(data_dir, monkeypatch):
+    def offline(endpoint, **kwargs):
+        raise ConnectionError("离线")
+
+    monkeypatch.setattr(datasource, "call", offline)
+    calendar = load(datetime.date(2023, 1, 20))
+
+    assert calendar.is_trading_day(datetime.date(2023, 1, 23))
+    assert not calendar.is_trading_day(datetime.date(2023, 1, 21))
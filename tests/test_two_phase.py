@@ -0,0 +1,138 @@
+# -*- encoding: UTF-8 -*-
+import json
+
+import pandas as pd
+import pytest
+from conftest import make_universe
+
+import data_fetcher
+import datasource
+import metrics
+import push
+import work_flow
+from strategy import registry
+
+STRATEGIES = ["海龟交易法则", "均线多头"]
+
+
+@pytest.fixture
+def market(data_dir, config, monkeypatch):
+    config.update(strategies=STRATEGIES, pushdown=False)
+    universe = {
+        stock: data_fetcher.finish(data, None)
+        for stock, data in make_universe(n_stocks=20, n_days=200).items()
+    }
+    spot = pd.DataFrame(
+        {
+            "代码": [stock[0] for stock in universe],
+            "名称": [stock[1] for stock in universe],
+            "涨跌幅": 1.0,
+        }
+    )
+    calls = []
+    monkeypatch.setattr(
+        datasource, "call", lambda endpoint, **kw: calls.append(endpoint) or spot
+    )
+    monkeypatch.setattr(
+        data_fetcher,
+        "run",
+        lambda stocks, lookback=None, failed=None: calls.append("run")
+        or {stock: universe[stock] for stock in stocks},
+    )
+    monkeypatch.setattr(work_flow, "_prefetched", None)
+    pushed = []
+    monkeypatch.setattr(push, "push", pushed.append)
+    return universe, calls, pushed
+
+
+def test_screen_uses_prefetched_data(market):
+    universe, calls, pushed = market
+    work_flow.prefetch()
+    assert calls == ["stock_zh_a_spot_em", "run"]
+    assert not pushed
+
+    work_flow.screen()
+
+    # 选股阶段不访问网络
+    assert calls == ["stock_zh_a_spot_em", "run"]
+    assert pushed[0].startswith("涨停数")
+    expected = work_flow.evaluate(universe, registry.enabled(STRATEGIES))
+    for strategy, selected in expected.items():
+        if selected:
+            assert any(strategy in msg and str(selected) in msg for msg in pushed)
+
+
+def test_screen_reads_local_store_in_another_process(market, monkeypatch):
+    universe, calls, pushed = market
+    work_flow.prefetch()
+    monkeypatch.setattr(work_flow, "_prefetched", None)
+    loaded = []
+    monkeypatch.setattr(
+        data_fetcher,
+        "load",
+        lambda stock, lookback=None: loaded.append(stock) or universe[stock],
+    )
+
+    work_flow.screen()
+
+    assert calls == ["stock_zh_a_spot_em", "run"]
+    assert sorted(loaded) == sorted(universe)
+
+
+def test_screen_falls_back_when_not_ready(market, monkeypatch):
+    _, calls, _ = market
+    work_flow.prefetch()
+    marker_file = work_flow.marker_file()
+    with open(marker_file, "r", encoding="utf-8") as file:
+        marker = json.load(file)
+    marker["time"] = "2000-01-01T16:00:00"
+    with open(marker_file, "w", encoding="utf-8") as file:
+        json.dump(marker, file)
+    prepared = []
+    monkeypatch.setattr(work_flow, "prepare", lambda: prepared.append(True))
+
+    work_flow.screen()
+
+    assert prepared == [True]
+
+
+def test_screen_retries_only_failed_stocks(market, monkeypatch):
+    universe, calls, _ = market
+    stocks = list(universe)
+    failed_stock, empty_stock = stocks[0], stocks[1]
+    retried = []
+
+    def run(stocks, lookback=None, failed=None):
+        if calls.count("run"):
+            retried.extend(stocks)
+        calls.append("run")
+        if failed is not None and failed_stock in stocks:
+            failed.append(failed_stock)
+        return {
+            stock: universe[stock]
+            for stock in stocks
+            if stock not in (failed_stock, empty_stock)
+        }
+
+    monkeypatch.setattr(data_fetcher, "run", run)
+    marker = work_flow.prefetch()
+    assert marker["failed"] == [failed_stock[0]]
+
+    work_flow.screen()
+
+    # 没有数据的股票不再下载，只补下载出错的股票
+    assert retried == [failed_stock]
+
+
+def test_prefetch_writes_metrics(market, config, tmp_path):
+    directory = tmp_path / "metrics"
+    config["metrics"] = {"enable": True, "directory": str(directory)}
+    work_flow.prefetch()
+
+    (json_file,) = directory.glob("*.json")
+    with open(json_file, encoding="utf-8") as file:
+        data = json.load(file)
+    assert any(item["name"] == "sequoia_prefetch_seconds" for item in data["gauges"])
+    assert any(item["labels"] == {"stage": "prefetch"} for item in data["summaries"])
+    # 写入后清空，不并入之后选股的指标
+    assert metrics.snapshot()["summaries"] == []
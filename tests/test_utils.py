@@ -0,0 +1,39 @@
+# -*- encoding: UTF-8 -*-
+import datetime
+
+import numpy as np
+import pytest
+
+import utils
+
+
+@pytest.fixture(params=["range", "date"])
+def data(request, bars):
+    data = bars(20)
+    if request.param == "date":
+        utils.index_by_date(data)
+    return data
+
+
+@pytest.mark.parametrize(
+    "end_date",
+    [
+        "2022-01-10",
+        datetime.date(2022, 1, 10),
+        datetime.datetime(2022, 1, 10, 15, 0),
+        np.datetime64("2022-01-10"),
+    ],
+)
+def test_truncate_to(data, end_date):
+    truncated = utils.truncate_to(data, end_date)
+
+    assert truncated["日期"].iloc[-1] == datetime.date(2022, 1, 10)
+    assert len(truncated) == 5
+    assert np.shares_memory(truncated["收盘"].to_numpy(), data["收盘"].to_numpy())
+
+
+def test_truncate_to_bounds(data):
+    assert utils.truncate_to(data, None) is data
+    assert utils.truncate_to(data, "2021-12-31").empty
+    assert len(utils.truncate_to(data, "2022-01-08")) == 4  # 周六
+    assert len(utils.truncate_to(data, "2030-01-01")) == 20
@@ -0,0 +1,191 @@
+# -*- encoding: UTF-8 -*-
+
+import datetime
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import datasource
+import store
+import utils
+
+# 交易日历：上交所、深交所的交易日（tool_trade_date_hist_sina，包含到当年年底已公布的交易日）。
+# 保存在 data_dir/trade_calendar.parquet，超过 REFRESH_DAYS 天或不再覆盖之后的交易日时才重新获取，
+# 获取失败时继续使用本地文件，可以离线使用；从来没有获取成功时退回周一至周五（不排除节假日）。
+# 日历之后的日期（下一年的交易日还没有公布）按周一至周五计算。
+# 查询都是O(1)：预先计算日历范围内每一天之前的交易日数，按1970-01-01起的天数直接取下标
+
+# 收盘时间，此后的快照和日线即为当天的最终数据
+CLOSE_TIME = datetime.time(15, 0)
+REFRESH_DAYS = 30
+FALLBACK_START = "1990-12-19"
+
+_lock = threading.Lock()
+_calendar = None
+_checked = None
+
+
+class Calendar:
+    def __init__(self, days):
+        """days 为升序的交易日（datetime64[D]）"""
+        self.days = np.asarray(days, dtype="datetime64[D]")
+        ordinals = self.days.astype(np.int64)
+        self.first = int(ordinals[0])
+        self.last = int(ordinals[-1])
+        trading = np.zeros(self.last - self.first + 1, dtype=bool)
+        trading[ordinals - self.first] = True
+        self._trading = trading
+        # _before[i] 为 first + i 之前（不含）的交易日数
+        self._before = np.zeros(len(trading) + 1, dtype=np.int64)
+        np.cumsum(trading, out=self._before[1:])
+
+    def _count_before(self, ordinal):
+        """ordinal 之前（不含）的交易日数，ordinal 不能晚于 last + 1"""
+        return int(self._before[max(ordinal - self.first, 0)])
+
+    def is_trading_day(self, day):
+        ordinal = _ordinal(day)
+        if ordinal > self.last:
+            return _is_weekday(ordinal)
+        return ordinal >= self.first and bool(self._trading[ordinal - self.first])
+
+    def previous_trading_day(self, day, n=1):
+        """day 之前（不含）的第n个交易日"""
+        ordinal = _ordinal(day)
+        while n > 0 and ordinal - 1 > self.last:
+            ordinal -= 1
+            if _is_weekday(ordinal):
+                n -= 1
+        if n == 0:
+            return _date(ordinal)
+        count = self._count_before(ordinal)
+        if count < n:
+            raise ValueError("{} 之前没有 {} 个交易日".format(_date(ordinal), n))
+        return self.days[count - n].astype(object)
+
+    def next_trading_day(self, day, n=1):
+        """day 之后（不含）的第n个交易日"""
+        ordinal = _ordinal(day)
+        if ordinal < self.last:
+            index = self._count_before(ordinal + 1) + n - 1
+            if index < len(self.days):
+                return self.days[index].astype(object)
+            n = index - len(self.days) + 1
+            ordinal = self.last
+        while n > 0:
+            ordinal += 1
+            if _is_weekday(ordinal):
+                n -= 1
+        return _date(ordinal)
+
+    def trading_days_between(self, start, end):
+        """[start, end] 内的全部交易日（datetime64[D] 数组）"""
+        start, end = _ordinal(start), _ordinal(end)
+        if end < start:
+            return np.array([], dtype="datetime64[D]")
+        first = self._count_before(min(start, self.last + 1))
+        last = self._count_before(min(end, self.last) + 1)
+        days = self.days[first:last]
+        if end > self.last:
+            after = np.arange(max(start, self.last + 1), end + 1)
+            after = after[_is_weekday(after)].astype("datetime64[D]")
+            days = np.concatenate([days, after])
+        return days
+
+
+def _ordinal(day):
+    return int(np.datetime64(utils.ensure_date(day), "D").astype(np.int64))
+
+
+def _date(ordinal):
+    return np.datetime64(int(ordinal), "D").astype(object)
+
+
+def _is_weekday(ordinal):
+    # 1970-01-01 是星期四
+    return (np.asarray(ordinal) + 3) % 7 < 5
+
+
+def weekdays(end=None):
+    """没有交易日历时使用的周一至周五"""
+    end = end or datetime.date(datetime.date.today().year + 1, 12, 31)
+    return Calendar(pd.bdate_range(FALLBACK_START, end).values)
+
+
+def calendar_file():
+    return os.path.join(store.root(), "trade_calendar.parquet")
+
+
+def _stale(path, days, today):
+    if days is None:
+        return True
+    # 日历要覆盖今天之后的下一个交易日
+    if days[-1] <= np.datetime64(today, "D"):
+        return True
+    age = time.time() - os.path.getmtime(path)
+    return age > REFRESH_DAYS * 24 * 3600
+
+
+def load(today=None):
+    """读取本地交易日历，需要时重新获取；获取失败时使用本地文件，都没有时退回周一至周五"""
+    today = today or datetime.date.today()
+    path = calendar_file()
+    days = None
+    if os.path.exists(path):
+        days = pd.read_parquet(path)["trade_date"].to_numpy(dtype="datetime64[D]")
+    if _stale(path, days, today):
+        try:
+            fetched = datasource.call("tool_trade_date_hist_sina")
+            days = np.sort(
+                pd.to_datetime(fetched["trade_date"]).to_numpy(dtype="datetime64[D]")
+            )
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pd.DataFrame({"trade_date": days}).to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+            logging.info("交易日历已更新，截至 {}".format(days[-1]))
+        except Exception as exc:
+            logging.warning("获取交易日历失败: {}".format(exc))
+    if days is None or len(days) == 0:
+        logging.warning("没有交易日历，按周一至周五计算交易日")
+        return weekdays()
+    return Calendar(days)
+
+
+def get():
+    """当前的交易日历，每天最多检查一次是否需要更新"""
+    global _calendar, _checked
+    today = datetime.date.today()
+    with _lock:
+        if _calendar is None or _checked != today:
+            _calendar = load(today)
+            _checked = today
+        return _calendar
+
+
+def is_trading_day(day=None):
+    return get().is_trading_day(day or datetime.date.today())
+
+
+def previous_trading_day(day=None, n=1):
+    return get().previous_trading_day(day or datetime.date.today(), n)
+
+
+def next_trading_day(day=None, n=1):
+    return get().next_trading_day(day or datetime.date.today(), n)
+
+
+def trading_days_between(start, end):
+    return get().trading_days_between(start, end)
+
+
+def last_close(now=None):
+    """最近一次收盘的时间"""
+    now = now or datetime.datetime.now()
+    day = now.date()
+    if not (is_trading_day(day) and now.time() >= CLOSE_TIME):
+        day = previous_trading_day(day)
+    return datetime.datetime.combine(day, CLOSE_TIME)
@@ -1,19 +1,92 @@
 # -*- coding: UTF-8 -*-
 import datetime
+import importlib.util
+import sys
 
+import numpy as np
+import pandas as pd
 
-# 是否是工作日
-def is_weekday():
-    return datetime.datetime.today().weekday() < 5
+
+def lazy_import(name):
+    """
+    延迟导入：返回的模块在第一次访问属性时才真正执行导入，
+    akshare、talib 等导入较慢的模块用它导入，只用到其他功能时不必等待
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named {!r}".format(name), name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
 
 
 def ensure_date(date_value):
     """确保日期值转换为datetime.date类型"""
     if isinstance(date_value, str):
         return datetime.datetime.strptime(date_value, "%Y-%m-%d").date()
+    elif isinstance(date_value, np.datetime64):
+        return date_value.astype("datetime64[D]").astype(object)
+    elif isinstance(date_value, (int, np.integer, float, np.floating)):
+        # 紧凑格式中1970-01-01起的天数，按行取出时会随价格列转为浮点数
+        return np.datetime64(int(date_value), "D").astype(object)
     elif isinstance(date_value, datetime.datetime):
         return date_value.date()
     elif isinstance(date_value, datetime.date):
         return date_value
     else:
         raise TypeError(f"不支持的日期类型: {type(date_value)}")
+
+
+def to_datetime64(dates):
+    """日期列转为datetime64[D]数组，日期列可以是date对象、datetime64或int32天数"""
+    values = np.asarray(dates)
+    if np.issubdtype(values.dtype, np.integer):
+        return values.astype("datetime64[D]")
+    return pd.to_datetime(values).values.astype("datetime64[D]")
+
+
+def day_numbers(dates):
+    """日期列转为1970-01-01起的int32天数"""
+    return to_datetime64(dates).astype(np.int64).astype(np.int32)
+
+
+def index_by_date(data):
+    """以日期作为有序的DatetimeIndex，truncate_to 据此二分查找，返回data本身"""
+    data.index = pd.DatetimeIndex(to_datetime64(data["日期"]))
+    return data
+
+
+def end_index(data, end_date=None):
+    """
+    截至end_date（含）的K线数，data按日期升序排列。
+    end_date 可以是字符串、date、datetime 或 numpy.datetime64
+    """
+    if end_date is None:
+        return len(data)
+    end_date = ensure_date(end_date)
+    if isinstance(data.index, pd.DatetimeIndex):
+        return int(data.index.searchsorted(pd.Timestamp(end_date), side="right"))
+    dates = data["日期"]
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        end_date = pd.Timestamp(end_date)
+    elif pd.api.types.is_integer_dtype(dates):
+        end_date = day_numbers([end_date])[0]
+    return int(dates.searchsorted(end_date, side="right"))
+
+
+def truncate_to(data, end_date=None):
+    """截至end_date（含）的K线：二分查找后按位置切片，不复制数据"""
+    if end_date is None:
+        return data
+    return data.iloc[: end_index(data, end_date)]
+
+
+def signal_at(data, series, end_date=None):
+    """信号序列在end_date（没有时为最后一根K线）当天的值"""
+    end = end_index(data, end_date)
+    return end > 0 and bool(series[end - 1])
@@ -1,120 +1,471 @@
 # -*- encoding: UTF-8 -*-
 
+import concurrent.futures
 import datetime
+import json
 import logging
+import os
 import time
 
-import akshare as ak
+import numpy as np
 
+import bars
 import data_fetcher
+import datasource
+import indicators
+import metrics
+import panel
+import parallel
 import push
 import settings
-import strategy.enter as enter
-from strategy import (
-    backtrace_ma250,
-    breakthrough_platform,
-    climax_limitdown,
-    high_tight_flag,
-    keep_increasing,
-    low_backtrace_increase,
-    parking_apron,
-    turtle_trade,
-    wyckoff_accumulation,
-    wyckoff_divergence,
-    wyckoff_selling_climax,
-    wyckoff_spring,
-)
+import store
+import trade_calendar
+import utils
+from strategy import registry
+
+profiling = utils.lazy_import("profiling")
+
+# 收盘后预取的数据：(就绪标记, {(代码, 名称): DataFrame})
+_prefetched = None
 
 
 def prepare():
     logging.info(
         "************************ process start ***************************************"
     )
-    all_data = ak.stock_zh_a_spot_em()
+    start = time.perf_counter()
+    all_data, stocks, strategies = select()
+    statistics(all_data, stocks)
+
+    process(stocks, strategies)
+
+    _finish_run(start)
+    logging.info(
+        "************************ process   end ***************************************"
+    )
+
+
+def select():
+    """获取快照，返回 (快照, 需要下载的股票, 启用的策略)"""
+    with metrics.timed("sequoia_stage_seconds", stage="spot"):
+        all_data = datasource.call("stock_zh_a_spot_em")
     subset = all_data[["代码", "名称"]]
     stocks = [tuple(x) for x in subset.values]
-    statistics(all_data, stocks)
+    # 回测从本地库构建面板时用保存的名称
+    store.write_names(stocks)
 
-    strategies = {
-        # "放量上涨": enter.check_volume,
-        # "均线多头": keep_increasing.check,
-        # "海龟交易法则": turtle_trade.check_enter,
-        # "停机坪": parking_apron.check,
-        # "回踩年线": backtrace_ma250.check,
-        # "无大幅回撤": low_backtrace_increase.check,
-        # '突破平台': breakthrough_platform.check,
-        # "高而窄的旗形": high_tight_flag.check,
-        # "放量跌停": climax_limitdown.check,
-        # 威克夫策略
-        "威克夫-弹簧": wyckoff_spring.check,
-        "威克夫-缩量不跌": wyckoff_divergence.check,
-        "威克夫-SC反弹": wyckoff_selling_climax.check,
-        "威克夫-吸筹完成": wyckoff_accumulation.check,
-    }
+    # 启用的策略见 config.yaml 的 strategies，没有配置时使用 strategy/registry.py 中默认启用的策略
+    strategies = registry.enabled(settings.config.get("strategies"))
 
     # if datetime.datetime.now().weekday() == 0:
-    #     strategies["均线多头"] = keep_increasing.check
+    #     strategies["均线多头"] = registry.get("均线多头").func
 
-    process(stocks, strategies)
+    # 保存行情面板时需要全市场的数据，否则回测只能用到被快照条件筛选过的股票
+    if settings.config.get("pushdown", True) and not settings.config.get("panel"):
+        with metrics.timed("sequoia_stage_seconds", stage="plan"):
+            stocks = plan(all_data, stocks, strategies)
+    return all_data, stocks, strategies
+
+
+def _finish_run(start):
+    metrics.set_gauge("sequoia_run_seconds", time.perf_counter() - start)
+    metrics.set_gauge("sequoia_last_run_timestamp_seconds", time.time())
+    metrics.finish()
+
+
+def prefetch():
+    """
+    两阶段定时任务的第一阶段（收盘后）：获取快照并筛选股票，下载增量行情写入本地库，
+    读取为选股用的格式保存在内存中，获取下一个交易日要用的龙虎榜，最后写入就绪标记
+    """
+    global _prefetched
+    logging.info("收盘后预取开始")
+    start = time.perf_counter()
+    with metrics.timed("sequoia_stage_seconds", stage="prefetch"):
+        all_data, stocks, strategies = select()
+        failed = []
+        stocks_data = data_fetcher.run(stocks, _lookback(strategies), failed)
+        if registry.needs_top_list(strategies):
+            settings.load_top_list(trade_calendar.next_trading_day())
+
+    marker = {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "strategies": list(strategies),
+        "stocks": stocks,
+        "fetched": sorted(stock[0] for stock in stocks_data),
+        # 下载出错的股票，开盘前重新下载；没有数据（退市、长期停牌）的股票不在其中，不再重试
+        "failed": sorted(stock[0] for stock in failed),
+        "statistics": statistics_message(all_data),
+    }
+    path = marker_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(marker, file, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+    _prefetched = (marker["time"], stocks_data)
+
+    metrics.set_gauge("sequoia_prefetch_seconds", time.perf_counter() - start)
+    logging.info(
+        "收盘后预取完成: {}/{} 只股票, 耗时 {:.1f} 秒".format(
+            len(stocks_data), len(stocks), time.perf_counter() - start
+        )
+    )
+    # 预取单独写入一份指标，不并入开盘前选股的指标
+    _finish_run(start)
+    return marker
+
+
+def marker_file():
+    return os.path.join(store.root(), "prefetch.json")
+
+
+def ready(now=None, strategies=None):
+    """
+    预取是否就绪：最近一次收盘之后预取过，且预取时启用的策略与现在相同。
+    就绪时返回就绪标记，否则返回None
+    """
+    path = marker_file()
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        marker = json.load(file)
+    if strategies is None:
+        strategies = registry.enabled(settings.config.get("strategies"))
+    if marker.get("strategies") != list(strategies):
+        logging.info("启用的策略在预取后有变化")
+        return None
+    prefetched_at = datetime.datetime.fromisoformat(marker["time"])
+    if prefetched_at < trade_calendar.last_close(now):
+        logging.info("预取数据不是最近一个交易日的: {}".format(marker["time"]))
+        return None
+    return marker
+
+
+def screen():
+    """
+    两阶段定时任务的第二阶段（开盘前）：预取就绪时直接在预取的数据上选股，
+    同一进程中预取的数据在内存中，否则不访问网络读取本地库；未就绪时退回 prepare 现在下载
+    """
+    global _prefetched
+    strategies = registry.enabled(settings.config.get("strategies"))
+    marker = ready(strategies=strategies)
+    if marker is None:
+        logging.warning("预取数据未就绪，现在下载行情")
+        return prepare()
+
+    logging.info(
+        "************************ process start ***************************************"
+    )
+    start = time.perf_counter()
+    stocks = [tuple(stock) for stock in marker["stocks"]]
+    fetched = set(marker["fetched"])
+    lookback = _lookback(strategies)
+    push.statistics(marker["statistics"])
 
+    if _prefetched is not None and _prefetched[0] == marker["time"]:
+        stocks_data = _prefetched[1]
+    else:
+        with metrics.timed("sequoia_stage_seconds", stage="load"):
+            stocks_data = {}
+            for stock in stocks:
+                data = (
+                    data_fetcher.load(stock, lookback) if stock[0] in fetched else None
+                )
+                if data is not None:
+                    stocks_data[stock] = data
+    _prefetched = None
+
+    # 预取时下载失败的股票现在补上
+    failed = set(marker.get("failed", []))
+    missing = [stock for stock in stocks if stock[0] in failed]
+    if missing:
+        logging.info("补充下载预取失败的股票: {}".format(len(missing)))
+        with metrics.timed("sequoia_stage_seconds", stage="fetch"):
+            stocks_data.update(data_fetcher.run(missing, lookback))
+
+    process(stocks, strategies, stocks_data)
+
+    _finish_run(start)
     logging.info(
         "************************ process   end ***************************************"
     )
 
 
-def process(stocks, strategies):
-    stocks_data = data_fetcher.run(stocks)
+def _lookback(strategies):
+    # 只下载和读取启用策略需要的最长K线窗口；保存面板供回测使用时保留全部历史
+    return None if settings.config.get("panel") else registry.lookback(strategies)
+
+
+def plan(all_data, stocks, strategies):
+    """
+    根据快照只保留至少可能满足一个策略的股票，减少历史行情的下载量。
+    快照是最新一天的行情，回测（设置了end_date）时不做筛选；
+    有策略没有快照条件时也需要全部股票
+    """
+    if settings.config["end_date"] is not None:
+        return stocks
+    keep = np.zeros(len(all_data), dtype=bool)
+    for strategy_func in strategies.values():
+        snapshot_filter = registry.snapshot_filter(strategy_func)
+        if snapshot_filter is None:
+            return stocks
+        keep |= snapshot_filter(all_data).to_numpy(dtype=bool)
+
+    candidates = set(all_data.loc[keep, "代码"])
+    planned = [stock for stock in stocks if stock[0] in candidates]
+    logging.info(
+        "根据快照筛选后需要下载的股票数量: {}/{}".format(len(planned), len(stocks))
+    )
+    return planned
+
+
+def process(stocks, strategies, stocks_data=None):
+    """下载（stocks_data 为已经准备好的数据时不下载）、选股并推送结果"""
+    lookback = _lookback(strategies)
+    if stocks_data is None and settings.config.get("pipeline") == "streaming":
+        with metrics.timed("sequoia_stage_seconds", stage="streaming"):
+            with profiling.session():
+                results = evaluate_streaming(stocks, strategies, lookback)
+    else:
+        if stocks_data is None:
+            with metrics.timed("sequoia_stage_seconds", stage="fetch"):
+                stocks_data = data_fetcher.run(stocks, lookback)
 
+        market = None
+        if settings.config.get("panel") or settings.config.get("engine") == "panel":
+            market = panel.build(stocks_data)
+        if settings.config.get("panel"):
+            panel.save(market)
+
+        with metrics.timed("sequoia_stage_seconds", stage="evaluate"):
+            with profiling.session():
+                if settings.config.get("engine") == "panel":
+                    results = evaluate_panel(market, stocks_data, strategies)
+                else:
+                    results = evaluate(stocks_data, strategies)
+    logging.info("指标缓存: {}".format(indicators.stats()))
+    for strategy in strategies:
+        seconds = metrics.counter("sequoia_strategy_seconds_total", strategy=strategy)
+        count = metrics.counter("sequoia_strategy_stocks_total", strategy=strategy)
+        if seconds > 0:
+            metrics.set_gauge(
+                "sequoia_strategy_stocks_per_second", count / seconds, strategy=strategy
+            )
+
+    for strategy, selected in results.items():
+        if len(selected) > 0:
+            push.strategy(
+                '**************"{0}"**************\n{1}\n**************"{0}"**************\n'.format(
+                    strategy, selected
+                )
+            )
+
+
+def evaluate(stocks_data, strategies):
+    """逐只股票调用各策略的check，返回 {策略名: [(代码, 名称), ...]}"""
     # 第一轮：筛选流动性好的股票
+    start = time.perf_counter()
     liquid_stocks = {}
     for stock, data in stocks_data.items():
         if is_liquid_enough(stock, data):
             liquid_stocks[stock] = data
+    seconds = time.perf_counter() - start
+    metrics.observe("sequoia_stage_seconds", seconds, stage="liquidity")
+    if seconds > 0:
+        metrics.set_gauge(
+            "sequoia_liquidity_stocks_per_second", len(stocks_data) / seconds
+        )
     
     logging.info(f"流动性筛选后剩余股票数量: {len(liquid_stocks)}")
 
     # 第二轮：应用各策略筛选
+    workers = settings.config.get("workers") or 0
+    if workers > 1:
+        return parallel.evaluate(
+            list(liquid_stocks.keys()), liquid_stocks, strategies, workers
+        )
+
+    threads = settings.config.get("threads") or 0
+    if threads > 1:
+        return evaluate_threaded(liquid_stocks, strategies, threads)
+
+    return evaluate_fused(liquid_stocks, strategies)
+
+
+def stock_filters(strategies, end_date=None):
+    """各策略的判断函数 {策略名: filter}，整个选股过程只创建一次"""
+    return {
+        strategy: check_enter(end_date=end_date, strategy_fun=strategy_func)
+        for strategy, strategy_func in strategies.items()
+    }
+
+
+def evaluate_stock(stock, data, filters):
+    """
+    对一只股票依次运行全部策略，返回选中它的策略名列表。
+    只读视图和指标缓存用的数据版本只准备一次，各策略共享
+    """
+    data = bars.freeze(data)
+    with indicators.prepared(data):
+        return [
+            strategy
+            for strategy, m_filter in filters.items()
+            if m_filter((stock, data))
+        ]
+
+
+def evaluate_fused(stocks_data, strategies):
+    """
+    按股票逐只判断：每只股票的数据准备一次后接着运行全部策略，
+    趁数据和指标还在缓存中时用完，最后按股票顺序汇总各策略的结果
+    """
+    filters = stock_filters(strategies, settings.config["end_date"])
+    results = {strategy: [] for strategy in strategies}
+    for stock, data in stocks_data.items():
+        for strategy in evaluate_stock(stock, data, filters):
+            results[strategy].append(stock)
+    return results
+
+
+def evaluate_threaded(stocks_data, strategies, threads):
+    """
+    多线程选股：K线数据只读、派生指标在线程安全的缓存中，
+    各线程直接共享同一份数据，不需要复制
+    """
+    filters = stock_filters(strategies, settings.config["end_date"])
+
+    results = {strategy: [] for strategy in strategies}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        # map按输入顺序返回，结果与单线程一致
+        for stock, selected in zip(
+            stocks_data,
+            executor.map(
+                lambda item: evaluate_stock(item[0], item[1], filters),
+                stocks_data.items(),
+            ),
+        ):
+            for strategy in selected:
+                results[strategy].append(stock)
+    return results
+
+
+def evaluate_streaming(stocks, strategies, lookback=None):
+    """
+    流水线选股：每只股票下载完成后立即做流动性筛选和全部策略判断，
+    判断完即释放该股票的数据，下载与计算同时进行
+    """
+    results = {strategy: [] for strategy in strategies}
+    filters = stock_filters(strategies, settings.config["end_date"])
+    queue_size = settings.config.get("pipeline_queue_size") or 64
+
+    liquid_count = 0
+    for stock, data in data_fetcher.stream(stocks, queue_size, lookback):
+        if not is_liquid_enough(stock, data):
+            continue
+        liquid_count += 1
+        for strategy in evaluate_stock(stock, data, filters):
+            results[strategy].append(stock)
+
+    logging.info(f"流动性筛选后剩余股票数量: {liquid_count}")
+    # 下载完成的先后不固定，按股票列表的顺序输出
+    order = {stock: i for i, stock in enumerate(stocks)}
+    return {
+        strategy: sorted(selected, key=order.get)
+        for strategy, selected in results.items()
+    }
+
+
+def evaluate_panel(market, stocks_data, strategies):
+    """面板引擎：有面板实现的策略一次计算全市场，其余策略退回逐只股票判断"""
+    liquid = is_liquid_enough_panel(market)
+    logging.info(f"流动性筛选后剩余股票数量: {int(liquid.sum())}")
+
+    results = {}
+    end = settings.config["end_date"]
     for strategy, strategy_func in strategies.items():
-        end = settings.config["end_date"]
-        m_filter = check_enter(end_date=end, strategy_fun=strategy_func)
-        results = dict(filter(m_filter, liquid_stocks.items()))
-        
-        if len(results) > 0:
-            push.strategy(
-                '**************"{0}"**************\n{1}\n**************"{0}"**************\n'.format(
-                    strategy, list(results.keys())
-                )
+        panel_func = registry.panel_func(strategy_func)
+        if panel_func is not None:
+            start = time.perf_counter()
+            selected = panel_func(market, end_date=end) & liquid
+            _record_strategy(
+                strategy, time.perf_counter() - start, len(market), selected.sum()
             )
-        time.sleep(2)
+        else:
+            m_filter = check_enter(end_date=end, strategy_fun=strategy_func)
+            selected = [
+                bool(liquid[i] and m_filter((stock, stocks_data[stock])))
+                for i, stock in enumerate(market.stocks)
+            ]
+        results[strategy] = [market.stocks[i] for i in np.flatnonzero(selected)]
+    return results
 
 
-def check_enter(end_date=None, strategy_fun=enter.check_volume):
+def check_enter(end_date=None, strategy_fun=None):
+    if strategy_fun is None:
+        strategy_fun = registry.get("放量上涨").func
+    # 配置中的end_date可能是字符串或date，统一为date再传给策略
+    if end_date is not None:
+        end_date = utils.ensure_date(end_date)
+
+    registered = registry.find(strategy_fun)
+    name = strategy_fun.__qualname__ if registered is None else registered.name
+
     def end_date_filter(stock_data):
-        if end_date is not None:
-            if end_date < stock_data[1].iloc[0].日期:  # 该股票在end_date时还未上市
-                logging.debug("{}在{}时还未上市".format(stock_data[0], end_date))
-                return False
-        return strategy_fun(stock_data[0], stock_data[1], end_date=end_date)
+        stock_data = (stock_data[0], bars.freeze(stock_data[1]))
+        if utils.end_index(stock_data[1], end_date) == 0:  # 该股票在end_date时还未上市
+            logging.debug("{}在{}时还未上市".format(stock_data[0], end_date))
+            return False
+        start = time.perf_counter()
+        selected = profiling.call(
+            name, strategy_fun, stock_data[0], stock_data[1], end_date=end_date
+        )
+        _record_strategy(name, time.perf_counter() - start, 1, int(bool(selected)))
+        return selected
 
     return end_date_filter
 
 
+def _record_strategy(strategy, seconds, stocks, selected):
+    """累计策略的耗时、判断的股票数和选中数，多进程选股时子进程中的记录不会汇总"""
+    metrics.increment("sequoia_strategy_seconds_total", seconds, strategy=strategy)
+    metrics.increment("sequoia_strategy_stocks_total", stocks, strategy=strategy)
+    if selected:
+        metrics.increment(
+            "sequoia_strategy_selected_total", int(selected), strategy=strategy
+        )
+
+
 # 统计数据
 def statistics(all_data, stocks):
+    push.statistics(statistics_message(all_data))
+
+
+def statistics_message(all_data):
     limitup = len(all_data.loc[(all_data["涨跌幅"] >= 9.5)])
     limitdown = len(all_data.loc[(all_data["涨跌幅"] <= -9.5)])
 
     up5 = len(all_data.loc[(all_data["涨跌幅"] >= 5)])
     down5 = len(all_data.loc[(all_data["涨跌幅"] <= -5)])
 
-    msg = "涨停数：{}   跌停数：{}\n涨幅大于5%数：{}  跌幅大于5%数：{}".format(
+    return "涨停数：{}   跌停数：{}\n涨幅大于5%数：{}  跌幅大于5%数：{}".format(
         limitup, limitdown, up5, down5
     )
-    push.statistics(msg)
+
 
 def is_liquid_enough(stock, data):
     """检查股票的流动性是否足够"""
     # 检查最近10天的平均成交额是否大于3亿
     recent_data = data.tail(10)
     avg_amount = (recent_data['收盘'] * recent_data['成交量'] * 100).mean()
-    return avg_amount > 300000000
\ No newline at end of file
+    return avg_amount > 300000000
+
+
+def is_liquid_enough_panel(market, end_index=None):
+    """is_liquid_enough 的面板版本，返回布尔数组；回测时用end_index截至当天计算"""
+    recent_amount = (
+        market.tail("收盘", 10, end_index) * market.tail("成交量", 10, end_index) * 100
+    )
+    valid = ~np.isnan(recent_amount)
+    with np.errstate(invalid="ignore"):
+        avg_amount = np.nansum(recent_amount, axis=1) / valid.sum(axis=1)
+    return avg_amount > 300000000